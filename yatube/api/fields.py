@@ -0,0 +1,71 @@
+"""Поля JSON API и их выборка из базы.
+
+Каждое поле — это путь к колонке относительно модели ленты. Клиент
+выбирает поля параметром ``fields=id,text``, и в запрос попадают
+только нужные колонки: строки читаются через values() без создания
+моделей.
+"""
+from django.db.models import F
+
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+# Колонки ключа курсора; имена не совпадают с полями моделей.
+CURSOR_DATE = 'cursor_date'
+CURSOR_ID = 'cursor_id'
+# В values() поле хранится под этим префиксом, чтобы не спорить с
+# именами полей модели.
+PREFIX = 'field_'
+
+
+def parse_fields(value, available):
+    """Список полей из параметра fields; ValueError для чужих имён."""
+    if not value:
+        return list(available)
+    fields = list(dict.fromkeys(
+        name.strip() for name in value.split(',') if name.strip()
+    ))
+    unknown = [name for name in fields if name not in available]
+    if unknown or not fields:
+        raise ValueError(
+            'Неизвестные поля: {}. Доступны: {}.'.format(
+                ', '.join(unknown) or '—', ', '.join(available)
+            )
+        )
+    return fields
+
+
+def select(queryset, fields, available, date, key, prefix=''):
+    """values() с выбранными полями и ключом курсора.
+
+    ``prefix`` — путь от модели queryset к посту, например ``post__``
+    для записей ленты подписок.
+    """
+    expressions = {
+        PREFIX + name: F(prefix + available[name]) for name in fields
+    }
+    expressions[CURSOR_DATE] = F(date)
+    expressions[CURSOR_ID] = F(key)
+    return queryset.values(**expressions)
+
+
+def serialize(row, fields, image_storage=None):
+    """Строка values() в словарь ответа в порядке полей."""
+    data = {name: row[PREFIX + name] for name in fields}
+    if 'image' in data:
+        data['image'] = (
+            image_storage.url(data['image']) if data['image'] else None
+        )
+    return data
@@ -0,0 +1,127 @@
+import json
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='-'
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author,
+                text=f'Пост {i}',
+                group=cls.group if i % 2 else None,
+            )
+            for i in range(5)
+        ]
+        cls.post = cls.posts[-1]
+        for i in range(3):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Коммент {i}'
+            )
+
+    def get_json(self, url, **params):
+        response = self.client.get(url, params)
+        if response.streaming:
+            content = b''.join(response.streaming_content)
+        else:
+            content = response.content
+        return response, json.loads(content)
+
+    def test_index_pages_with_cursor(self):
+        """Лента листается курсором до конца без повторов."""
+        url = reverse('api:index')
+        response, data = self.get_json(url, limit=2)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        ids = [row['id'] for row in data['results']]
+        while data['next']:
+            _, data = self.get_json(url, limit=2, after=data['next'])
+            ids += [row['id'] for row in data['results']]
+        self.assertEqual(ids, [post.pk for post in reversed(self.posts)])
+
+    def test_sparse_fieldsets(self):
+        """fields= выбирает поля ответа и их порядок."""
+        _, data = self.get_json(reverse('api:index'), fields='text,author')
+        self.assertEqual(
+            data['results'][0], {'text': 'Пост 4', 'author': 'author'}
+        )
+        response, data = self.get_json(reverse('api:index'), fields='secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', data['detail'])
+
+    def test_group_profile_and_detail(self):
+        """Ленты группы и автора, пост и 404 для несуществующих."""
+        _, data = self.get_json(
+            reverse('api:group_posts', kwargs={'slug': 'test-slug'}),
+            fields='id,group',
+        )
+        self.assertEqual(
+            data['results'],
+            [{'id': self.posts[3].pk, 'group': 'test-slug'},
+             {'id': self.posts[1].pk, 'group': 'test-slug'}],
+        )
+        _, data = self.get_json(
+            reverse('api:profile_posts', kwargs={'username': 'author'})
+        )
+        self.assertEqual(len(data['results']), 5)
+        _, data = self.get_json(
+            reverse('api:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertEqual(data['text'], self.post.text)
+        self.assertIsNone(data['image'])
+        for url in (
+            reverse('api:group_posts', kwargs={'slug': 'missing'}),
+            reverse('api:profile_posts', kwargs={'username': 'missing'}),
+            reverse('api:post_detail', kwargs={'post_id': 0}),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_comments_oldest_first(self):
+        url = reverse('api:post_comments', kwargs={'post_id': self.post.pk})
+        _, data = self.get_json(url, limit=2, fields='text')
+        self.assertEqual(
+            data['results'], [{'text': 'Коммент 0'}, {'text': 'Коммент 1'}]
+        )
+        _, data = self.get_json(url, after=data['next'], fields='text')
+        self.assertEqual(data, {'results': [{'text': 'Коммент 2'}],
+                                'next': None})
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_follow_feed_merges_sources(self):
+        """Лента подписок сливает записи ленты и посты «знаменитостей»."""
+        url = reverse('api:follow_posts')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        star = User.objects.create_user(username='star')
+        Follow.objects.create(user=self.author, author=star)
+        self.client.force_login(self.reader)
+        Follow.objects.create(user=self.reader, author=star)
+        Follow.objects.create(user=self.reader, author=self.author)
+        star_post = Post.objects.create(author=star, text='Звёздный пост')
+        self.assertFalse(star_post.timeline_entries.exists())
+        _, data = self.get_json(url, fields='id', limit=3)
+        self.assertEqual(
+            [row['id'] for row in data['results']],
+            [star_post.pk, self.posts[4].pk, self.posts[3].pk],
+        )
+        _, data = self.get_json(url, fields='id', after=data['next'])
+        self.assertEqual(
+            [row['id'] for row in data['results']],
+            [post.pk for post in reversed(self.posts[:3])],
+        )
+
+    def test_bad_limit_and_cursor(self):
+        for params in ({'limit': 0}, {'limit': 'x'}, {'after': '!!'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('api:index'), params)
+                self.assertEqual(response.status_code, 400)
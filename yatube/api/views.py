@@ -0,0 +1,178 @@
+"""JSON API только для чтения: ленты, пост и комментарии.
+
+Ленты листаются курсором ``?after=`` (значение ``next`` из ответа),
+размер страницы задаёт ``?limit=``. Ответ собирается по строкам прямо
+во время отдачи, так что память не зависит от размера страницы.
+"""
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_safe
+
+from core.paginator import CursorPaginator, decode_cursor
+from posts import timeline
+from posts.models import Comment, Group, Post, TimelineEntry, User
+from .fields import (
+    COMMENT_FIELDS, CURSOR_DATE, CURSOR_ID, POST_FIELDS, parse_fields,
+    select, serialize,
+)
+
+# Строки копятся в буфере и отдаются кусками примерно такого размера.
+CHUNK_SIZE = 64 * 1024
+
+IMAGE_STORAGE = Post._meta.get_field('image').storage
+
+
+def error_response(message, status=400):
+    return JsonResponse(
+        {'detail': message},
+        status=status,
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+def page_size(request):
+    value = request.GET.get('limit')
+    if value is None:
+        return settings.API_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= settings.API_MAX_PAGE_SIZE:
+        raise ValueError(
+            f'limit должен быть от 1 до {settings.API_MAX_PAGE_SIZE}.'
+        )
+    return limit
+
+
+def stream_page(rows, limit, fields, paginator):
+    """Куски JSON страницы: строки, затем курсор следующей страницы."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    buffer = ['{"results": [']
+    size = 0
+    last = None
+    has_next = False
+    for count, row in enumerate(rows):
+        if count == limit:
+            has_next = True
+            break
+        item = encoder.encode(serialize(row, fields, IMAGE_STORAGE))
+        buffer.append(',' + item if count else item)
+        size += len(item)
+        last = row
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer).encode()
+            buffer, size = [], 0
+    next_cursor = paginator.row_cursor(last) if has_next else None
+    buffer.append('], "next": {}}}'.format(json.dumps(next_cursor)))
+    yield ''.join(buffer).encode()
+
+
+def feed_response(request, build, available=POST_FIELDS, descending=True):
+    """Потоковая страница ленты.
+
+    ``build(fields)`` возвращает querysets из fields.select(); их
+    строки сливаются по ключу курсора.
+    """
+    try:
+        fields = parse_fields(request.GET.get('fields'), available)
+        limit = page_size(request)
+    except ValueError as error:
+        return error_response(str(error))
+    after = request.GET.get('after')
+    if after and decode_cursor(after) is None:
+        return error_response('Испорченный курсор.')
+    paginator = CursorPaginator(
+        build(fields), limit,
+        date_field=CURSOR_DATE, key_field=CURSOR_ID, descending=descending,
+    )
+    # Лишняя строка показывает, есть ли следующая страница.
+    rows = paginator.iterate(after, limit + 1)
+    return StreamingHttpResponse(
+        stream_page(rows, limit, fields, paginator),
+        content_type='application/json',
+    )
+
+
+def posts_feed(request, queryset):
+    return feed_response(request, lambda fields: [
+        select(queryset, fields, POST_FIELDS, 'pub_date', 'id')
+    ])
+
+
+@require_safe
+def index(request):
+    return posts_feed(request, Post.objects.all())
+
+
+@require_safe
+def group_posts(request, slug):
+    if not Group.objects.filter(slug=slug).exists():
+        return error_response('Группа не найдена.', 404)
+    return posts_feed(request, Post.objects.filter(group__slug=slug))
+
+
+@require_safe
+def profile_posts(request, username):
+    if not User.objects.filter(username=username).exists():
+        return error_response('Автор не найден.', 404)
+    return posts_feed(
+        request, Post.objects.filter(author__username=username)
+    )
+
+
+@require_safe
+def follow_posts(request):
+    if not request.user.is_authenticated:
+        return error_response('Нужна авторизация.', 401)
+    celebrities = timeline.followed_celebrities(request.user)
+
+    def build(fields):
+        sources = [select(
+            TimelineEntry.objects.filter(user=request.user),
+            fields, POST_FIELDS, 'pub_date', 'post_id', prefix='post__',
+        )]
+        if celebrities:
+            sources.append(select(
+                Post.objects.filter(author_id__in=celebrities),
+                fields, POST_FIELDS, 'pub_date', 'id',
+            ))
+        return sources
+
+    return feed_response(request, build)
+
+
+@require_safe
+def post_detail(request, post_id):
+    try:
+        fields = parse_fields(request.GET.get('fields'), POST_FIELDS)
+    except ValueError as error:
+        return error_response(str(error))
+    row = select(
+        Post.objects.filter(pk=post_id), fields, POST_FIELDS, 'pub_date', 'id'
+    ).first()
+    if row is None:
+        return error_response('Пост не найден.', 404)
+    return JsonResponse(
+        serialize(row, fields, IMAGE_STORAGE),
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+@require_safe
+def post_comments(request, post_id):
+    """Комментарии поста от старых к новым."""
+    if not Post.objects.filter(pk=post_id).exists():
+        return error_response('Пост не найден.', 404)
+    return feed_response(
+        request,
+        lambda fields: [select(
+            Comment.objects.filter(post_id=post_id),
+            fields, COMMENT_FIELDS, 'created', 'id',
+        )],
+        available=COMMENT_FIELDS,
+        descending=False,
+    )
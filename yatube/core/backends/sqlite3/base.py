@@ -0,0 +1,114 @@
+"""SQLite с настройками для веб-нагрузки.
+
+Каждое новое соединение получает PRAGMAS: журнал WAL (читатели не
+ждут писателя, а писатель — читателей), synchronous=NORMAL (в режиме
+WAL база не портится при сбое, теряется лишь последняя транзакция при
+отключении питания), кеш страниц и mmap побольше и busy_timeout, чтобы
+писатели ждали друг друга, а не падали с «database is locked».
+
+В основной базе транзакции начинаются с BEGIN IMMEDIATE: отложенная
+транзакция, которая сначала читает, а потом пишет, при занятой базе
+падает сразу, без ожидания по busy_timeout. Цена — блокировка записи
+на каждый atomic(), даже если блок только читает: такие блоки ждут
+писателей и друг друга. В остальных базах (реплики только читают) по
+умолчанию DEFERRED, и чтения в atomic() идут параллельно.
+
+Соединения живут CONN_MAX_AGE секунд. С CONN_HEALTH_CHECKS перед
+первым запросом в базу в каждом HTTP-запросе соединение проверяется
+и, если оно умерло, открывается заново (как в Django 4.1).
+
+OPTIONS в DATABASES:
+    pragmas — дополнения к PRAGMAS, None убирает значение;
+    transaction_mode — DEFERRED, IMMEDIATE или EXCLUSIVE; по умолчанию
+        IMMEDIATE для базы default и DEFERRED для остальных.
+"""
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    # Отрицательное значение — в КиБ, то есть 64 МиБ на соединение.
+    'cache_size': -65536,
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'memory',
+}
+# Значения SQLite по умолчанию: с ними замеряется прирост от PRAGMAS.
+STOCK_PRAGMAS = {
+    'journal_mode': 'delete',
+    'synchronous': 'full',
+    'cache_size': -2000,
+    'mmap_size': 0,
+    'busy_timeout': 5000,
+    'temp_store': 'default',
+}
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+# Ключи OPTIONS этого движка; остальные уходят в sqlite3.connect().
+OWN_OPTIONS = ('pragmas', 'transaction_mode')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    health_check_needed = False
+
+    @property
+    def pragmas(self):
+        pragmas = {
+            **PRAGMAS, **self.settings_dict['OPTIONS'].get('pragmas', {})
+        }
+        return {
+            name: value for name, value in pragmas.items()
+            if value is not None
+        }
+
+    @property
+    def transaction_mode(self):
+        default = 'IMMEDIATE' if self.alias == DEFAULT_DB_ALIAS else 'DEFERRED'
+        mode = self.settings_dict['OPTIONS'].get(
+            'transaction_mode', default
+        ).upper()
+        if mode not in TRANSACTION_MODES:
+            raise ValueError(f'Неизвестный transaction_mode: {mode}')
+        return mode
+
+    def get_connection_params(self):
+        return {
+            name: value
+            for name, value in super().get_connection_params().items()
+            if name not in OWN_OPTIONS
+        }
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
+
+    def is_usable(self):
+        try:
+            self.connection.execute('SELECT 1')
+        except base.Database.Error:
+            return False
+        return True
+
+    def close_if_unusable_or_obsolete(self):
+        # Вызывается в начале и в конце каждого HTTP-запроса.
+        super().close_if_unusable_or_obsolete()
+        if self.connection is not None:
+            self.health_check_needed = self.settings_dict.get(
+                'CONN_HEALTH_CHECKS', False
+            )
+
+    def ensure_connection(self):
+        if self.connection is not None and self.health_check_needed:
+            self.health_check_needed = False
+            if not self.in_atomic_block and not self.is_usable():
+                self.close()
+                # Базу в памяти close() не закрывает: её данные живут,
+                # пока открыто соединение. Мёртвое соединение всё равно
+                # не отдаст их, открываем новое.
+                self.connection = None
+        super().ensure_connection()
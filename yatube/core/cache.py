@@ -0,0 +1,180 @@
+"""Кеш страниц с версиями вместо короткого TTL.
+
+Каждая страница зависит от нескольких «областей» (например, ``posts``
+или ``post:42``). Номер версии области входит в ключ кеша, поэтому при
+изменении данных достаточно сменить версию — старые записи просто
+перестают читаться и вытесняются по времени жизни.
+
+Версия — это время изменения в микросекундах, её можно использовать и
+как Last-Modified. Из тех же версий строится ETag, поэтому повторный
+запрос с If-None-Match или If-Modified-Since получает 304 ещё до
+обращения к кешу страниц и рендеринга. Страница, собранная по реплике
+старше версий, отдаётся без кеша и валидаторов.
+
+Версии лежат в отдельном кеше PAGE_VERSION_CACHE, общем для всех
+процессов сервера; сами страницы — в кеше по умолчанию, он может быть
+и локальным: страница со старыми версиями там просто не найдётся.
+"""
+import hashlib
+import time
+from calendar import timegm
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from . import metrics, replicas
+
+VERSION_PREFIX = 'version:'
+
+
+def _new_version():
+    return time.time_ns() // 1000
+
+
+def _versions():
+    return caches[settings.PAGE_VERSION_CACHE]
+
+
+def _version_key(scope):
+    # Слаги и имена пользователей бывают не ASCII: ключ делаем безопасным.
+    return VERSION_PREFIX + hashlib.md5(scope.encode()).hexdigest()
+
+
+def get_versions(scopes):
+    """Версии областей одним запросом к кешу."""
+    keys = [_version_key(scope) for scope in scopes]
+    found = _versions().get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        _versions().set_many(missing, timeout=None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def bump(*scopes):
+    """Меняет версии областей сейчас и ещё раз после коммита.
+
+    Повтор после коммита нужен, чтобы параллельный запрос не закешировал
+    данные, прочитанные до конца транзакции.
+    """
+    def _bump():
+        version = _new_version()
+        _versions().set_many(
+            {_version_key(scope): version for scope in scopes},
+            timeout=None,
+        )
+
+    _bump()
+    transaction.on_commit(_bump)
+
+
+def page_cache_key(request, scopes, versions):
+    user_key = ''
+    if request.user.is_authenticated:
+        # Страница зависит от пользователя и его CSRF-токена.
+        user_key = '{}:{}'.format(
+            request.user.pk,
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        )
+    raw = '|'.join(
+        [request.get_full_path(), user_key]
+        + [f'{scope}={version}' for scope, version in zip(scopes, versions)]
+    )
+    return 'page:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _last_modified(request, versions, last_modified, args, kwargs):
+    """Время последнего изменения страницы в секундах или None.
+
+    Берётся позднейшее из времени в базе и версий областей. Для
+    авторизованных не отдаётся: их страницы различаются, а If-Modified-
+    Since в отличие от ETag не учитывает, кто смотрит.
+    """
+    if last_modified is None or request.user.is_authenticated:
+        return None
+    changed = last_modified(request, *args, **kwargs)
+    seconds = max(versions) // 1_000_000
+    if changed is not None:
+        seconds = max(seconds, timegm(changed.utctimetuple()))
+    return seconds
+
+
+def _conditional_response(request, etag, modified):
+    """Ответ 304 (или 412) по валидаторам запроса; считает их в метриках."""
+    metrics.incr_total('conditional.pages')
+    if ('HTTP_IF_NONE_MATCH' in request.META
+            or 'HTTP_IF_MODIFIED_SINCE' in request.META):
+        metrics.incr_total('conditional.revalidations')
+    response = get_conditional_response(
+        request, etag=etag, last_modified=modified
+    )
+    if response is not None and response.status_code == 304:
+        metrics.incr_total('conditional.not_modified')
+    return response
+
+
+def _set_validators(request, response, etag, modified):
+    response['ETag'] = etag
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified)
+    # Браузер хранит страницу, но каждый раз проверяет её.
+    patch_cache_control(
+        response, no_cache=True, private=request.user.is_authenticated
+    )
+
+
+def cache_page_versioned(scopes, timeout=None, last_modified=None):
+    """Кеширует GET-ответ представления до смены версий областей.
+
+    ``scopes(request, *args, **kwargs)`` возвращает список областей.
+    Ответ получает ETag из версий, а с ``last_modified`` ещё и
+    Last-Modified: функция с теми же аргументами возвращает время
+    последнего изменения данных страницы по базе (агрегатом, без
+    загрузки объектов). Совпавший валидатор даёт 304 без рендеринга.
+    """
+    if timeout is None:
+        timeout = settings.PAGE_CACHE_TIMEOUT
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or (
+                request.user.is_authenticated
+                and settings.CSRF_COOKIE_NAME not in request.COOKIES
+            ):
+                # Токен CSRF ещё не выдан: такую страницу не кешируем
+                # и не подтверждаем старую копию у браузера.
+                return view(request, *args, **kwargs)
+            names = scopes(request, *args, **kwargs)
+            versions = get_versions(names)
+            key = page_cache_key(request, names, versions)
+            etag = quote_etag(key.split(':', 1)[1])
+            modified = _last_modified(
+                request, versions, last_modified, args, kwargs
+            )
+            response = _conditional_response(request, etag, modified)
+            if response is not None:
+                return response
+            started = time.perf_counter()
+            response = cache.get(key)
+            metrics.add_timing('cache', time.perf_counter() - started)
+            hit = response is not None
+            metrics.add_timing('cache.hit' if hit else 'cache.miss')
+            fresh = True
+            if response is None:
+                response = view(request, *args, **kwargs)
+                # Страницу с отстающей реплики нельзя запомнить под
+                # новыми версиями: она переживёт изменение.
+                fresh = replicas.fresh_since(max(versions))
+                if (fresh and response.status_code == 200
+                        and not response.streaming):
+                    cache.set(key, response, timeout)
+            if response.status_code == 200 and fresh:
+                _set_validators(request, response, etag, modified)
+            return response
+        return wrapper
+    return decorator
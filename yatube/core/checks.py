@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Warning, register
+
+# Кеши, которые видит только свой процесс.
+PROCESS_LOCAL = (LocMemCache, DummyCache)
+
+
+@register()
+def check_page_version_cache(app_configs, **kwargs):
+    """Версии кеша страниц не должны жить в памяти одного процесса."""
+    alias = settings.PAGE_VERSION_CACHE
+    if not isinstance(caches[alias], PROCESS_LOCAL):
+        return []
+    return [Warning(
+        f'Версии кеша страниц хранятся в кеше «{alias}», который виден '
+        'только своему процессу.',
+        hint='Изменения сбросят страницы лишь в одном процессе сервера; '
+             'укажите в PAGE_VERSION_CACHE общий кеш (файловый, '
+             'memcached, redis).',
+        id='core.W001',
+    )]
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from django.views.static import serve
+
+from core.views import media_file
+
+NAME = 'bench.bin'
+
+
+def consume(response, sink, use_sendfile):
+    """Отдаёт тело ответа в sink так, как это сделал бы WSGI-сервер.
+
+    С use_sendfile файл уходит через os.sendfile, как в wsgi.file_wrapper
+    gunicorn; иначе тело читается блоками в Python.
+    """
+    filelike = getattr(response, 'file_to_stream', None)
+    try:
+        if use_sendfile and filelike is not None:
+            fd, offset = filelike.fileno(), filelike.tell()
+            remaining = int(response['Content-Length'])
+            total = remaining
+            while remaining:
+                sent = os.sendfile(sink, fd, offset, remaining)
+                offset += sent
+                remaining -= sent
+            return total
+        total = 0
+        for chunk in response.streaming_content:
+            os.write(sink, chunk)
+            total += len(chunk)
+        return total
+    finally:
+        response.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает отдачу медиа через django.views.static.serve и '
+        'core.views.media_file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=16, help='МБ')
+        parser.add_argument('--requests', type=int, default=20)
+        parser.add_argument(
+            '--range-bytes', type=int, default=64 * 1024,
+            help='длина хвоста файла для запроса с Range',
+        )
+
+    def handle(self, *args, size, requests, range_bytes, **options):
+        root = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(root, NAME), 'wb') as file:
+                for _ in range(size):
+                    file.write(os.urandom(1024 * 1024))
+            with override_settings(
+                MEDIA_ROOT=root, MEDIA_SENDFILE_HEADER=None
+            ):
+                self.run_cases(root, requests, range_bytes)
+        finally:
+            shutil.rmtree(root)
+
+    def run_cases(self, root, requests, range_bytes):
+        views = {
+            'static.serve': lambda request: serve(
+                request, NAME, document_root=root
+            ),
+            'media_file': lambda request: media_file(request, NAME),
+        }
+        headers = {
+            'весь файл': {},
+            f'Range: последние {range_bytes} Б': {
+                'HTTP_RANGE': f'bytes=-{range_bytes}'
+            },
+        }
+        factory = RequestFactory()
+        sink = os.open(os.devnull, os.O_WRONLY)
+        try:
+            for label, extra in headers.items():
+                for view_name, view in views.items():
+                    for use_sendfile in (False, True):
+                        started = time.perf_counter()
+                        total = 0
+                        for _ in range(requests):
+                            response = view(factory.get('/', **extra))
+                            total += consume(response, sink, use_sendfile)
+                        elapsed = time.perf_counter() - started
+                        mode = 'sendfile' if use_sendfile else 'чтение'
+                        self.stdout.write(
+                            f'{label}, {view_name}, {mode}: '
+                            f'{elapsed / requests * 1000:.2f} мс/запрос, '
+                            f'{total / elapsed / 2 ** 20:.0f} МБ/с, '
+                            f'отдано {total // requests} Б'
+                        )
+        finally:
+            os.close(sink)
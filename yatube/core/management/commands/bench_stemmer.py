@@ -0,0 +1,58 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from faker import Faker
+
+from core.stemmer import stem, tokenize
+
+ENDINGS = (
+    '', 'а', 'ы', 'е', 'у', 'ой', 'ами', 'ах', 'ов', 'ий', 'ая', 'ое',
+    'ые', 'ого', 'ому', 'ыми', 'ть', 'ла', 'ли', 'ет', 'ют', 'ился',
+    'ость', 'ейший', 'анный', 'ющий', 'вшись',
+)
+
+
+def synthetic_corpus(tokens, vocabulary, seed):
+    """Текст из tokens слов: корни из Faker с русскими окончаниями."""
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    rng = random.Random(seed)
+    roots = list({
+        word.lower()[:-1] for word in fake.words(nb=vocabulary)
+        if len(word) > 3
+    })
+    words = [
+        rng.choice(roots) + rng.choice(ENDINGS) for _ in range(tokens)
+    ]
+    lines = []
+    for start in range(0, len(words), 12):
+        lines.append(' '.join(words[start:start + 12]).capitalize() + '.')
+    return '\n'.join(lines)
+
+
+class Command(BaseCommand):
+    help = 'Замеряет скорость токенизации и стемминга на синтетическом тексте.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', type=int, default=200_000)
+        parser.add_argument('--vocabulary', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, tokens, vocabulary, seed, **options):
+        corpus = synthetic_corpus(tokens, vocabulary, seed)
+        stem.cache_clear()
+        for label in ('холодный кеш', 'тёплый кеш'):
+            started = time.perf_counter()
+            count = len(tokenize(corpus))
+            elapsed = time.perf_counter() - started
+            rate = f'{count / elapsed:,.0f}'.replace(',', ' ')
+            self.stdout.write(
+                f'{label}: {count} токенов за {elapsed:.3f} с, '
+                f'{rate} токенов/с'
+            )
+        info = stem.cache_info()
+        self.stdout.write(
+            f'Кеш основ: {info.currsize} словоформ, '
+            f'попаданий {info.hits}, промахов {info.misses}'
+        )
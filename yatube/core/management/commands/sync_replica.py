@@ -0,0 +1,47 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик через backup API. '
+        'С --interval повторяет копирование, пока не прервут.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append', default=[],
+            help='Псевдоним реплики из DATABASES; можно повторять. По '
+                 'умолчанию — все из REPLICA_DATABASES.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Секунд между копированиями; 0 — скопировать один раз.',
+        )
+
+    def handle(self, *args, database, interval, **options):
+        aliases = database or settings.REPLICA_DATABASES
+        if not aliases:
+            raise CommandError(
+                'Нет реплик: укажите --database или REPLICA_DATABASES.'
+            )
+        for alias in aliases:
+            if alias not in settings.DATABASES or alias == DEFAULT_DB_ALIAS:
+                raise CommandError(f'Неизвестная реплика: {alias}')
+        source = connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+        while True:
+            for alias in aliases:
+                started = time.perf_counter()
+                replicas.sync(source, connections[alias].settings_dict['NAME'])
+                self.stdout.write(
+                    f'{alias}: скопировано за '
+                    f'{(time.perf_counter() - started) * 1000:.0f} мс'
+                )
+            if not interval:
+                return
+            time.sleep(interval)
@@ -0,0 +1,196 @@
+"""Счётчики и замеры одного запроса и общие счётчики процесса.
+
+Код в любом месте обработки запроса вызывает ``incr('имя')``, а
+RequestMetricsMiddleware отдаёт итог в заголовке X-Request-Metrics и
+пишет его в журнал. Вне запроса такие счётчики никуда не пишутся.
+
+``incr_total('имя')`` вдобавок копит значение за всё время жизни
+процесса; накопленное отдаёт представление core.views.metrics.
+
+Время частей запроса — база, шаблоны, кеш, миниатюры — копится через
+``add_timing`` и ``timer`` и уходит в заголовок Server-Timing и в одну
+строку JSON в журнале на запрос. Доля запросов PROFILE_SAMPLE_RATE
+целиком проходит под cProfile, профили пишутся в PROFILE_DIR.
+"""
+import cProfile
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'X-Request-Metrics'
+SERVER_TIMING = 'Server-Timing'
+
+_local = threading.local()
+_totals = Counter()
+_totals_lock = threading.Lock()
+
+
+def incr(name, value=1):
+    counters = getattr(_local, 'counters', None)
+    if counters is not None:
+        counters[name] += value
+
+
+def incr_total(name, value=1):
+    with _totals_lock:
+        _totals[name] += value
+    incr(name, value)
+
+
+def totals():
+    """Счётчики процесса с момента запуска."""
+    with _totals_lock:
+        return dict(_totals)
+
+
+def current():
+    """Счётчики текущего запроса."""
+    return dict(getattr(_local, 'counters', None) or {})
+
+
+def add_timing(name, seconds=None, count=1):
+    """Добавляет к замеру запроса время (или только количество)."""
+    values = getattr(_local, 'timings', None)
+    if values is None or (seconds is None and not count):
+        return
+    entry = values.setdefault(name, [None, 0])
+    if seconds is not None:
+        entry[0] = (entry[0] or 0.0) + seconds
+    entry[1] += count
+
+
+@contextmanager
+def timer(name, count=1):
+    """Замеряет блок кода как часть запроса."""
+    if getattr(_local, 'timings', None) is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(name, time.perf_counter() - started, count)
+
+
+def timings():
+    """Замеры текущего запроса: {имя: (секунды или None, количество)}."""
+    return {
+        name: tuple(entry)
+        for name, entry in (getattr(_local, 'timings', None) or {}).items()
+    }
+
+
+def _time_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        add_timing('db', time.perf_counter() - started)
+
+
+def server_timing(values, elapsed):
+    """Значение заголовка Server-Timing; количество уходит в desc."""
+    parts = []
+    for name, (seconds, count) in values.items():
+        part = name
+        if seconds is not None:
+            part += f';dur={seconds * 1000:.1f}'
+        parts.append(f'{part};desc="{count}"')
+    parts.append(f'total;dur={elapsed * 1000:.1f}')
+    return ', '.join(parts)
+
+
+def _profile_path(request, elapsed):
+    view = getattr(request.resolver_match, 'view_name', None) or 'unknown'
+    name = '{}-{}-{}-{:.0f}ms.prof'.format(
+        time.strftime('%Y%m%d-%H%M%S'), request.method,
+        view.replace(':', '.'), elapsed * 1000,
+    )
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    return os.path.join(settings.PROFILE_DIR, name)
+
+
+def _start_profile():
+    """cProfile для доли запросов PROFILE_SAMPLE_RATE, иначе None."""
+    if random.random() >= settings.PROFILE_SAMPLE_RATE:
+        return None
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # В потоке уже работает другой профилировщик.
+        return None
+    return profile
+
+
+class RequestMetricsMiddleware:
+    """Счётчики и замеры запроса; сама стоит пару вызовов perf_counter
+    на SQL-запрос и шаблон, поэтому включена всегда."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.counters = Counter()
+        _local.timings = {}
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(_time_query)
+                    )
+                profile = _start_profile()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profile is not None:
+                        profile.disable()
+            elapsed = time.perf_counter() - started
+            counters = current()
+            values = timings()
+        finally:
+            _local.counters = None
+            _local.timings = None
+        if counters:
+            response[HEADER] = ', '.join(
+                f'{name}={value}' for name, value in sorted(counters.items())
+            )
+        if settings.SERVER_TIMING:
+            response[SERVER_TIMING] = server_timing(values, elapsed)
+        if profile is not None:
+            try:
+                profile.dump_stats(_profile_path(request, elapsed))
+            except OSError:
+                logger.exception('Не удалось сохранить профиль запроса')
+        if logger.isEnabledFor(logging.INFO):
+            record = self.record(request, response, values, counters)
+            record['total_ms'] = round(elapsed * 1000, 3)
+            logger.info(json.dumps(record, ensure_ascii=False))
+        return response
+
+    def record(self, request, response, values, counters):
+        """Строка журнала: запрос, ответ, замеры и счётчики."""
+        match = request.resolver_match
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+        }
+        for name, (seconds, count) in values.items():
+            if seconds is not None:
+                record[f'{name}_ms'] = round(seconds * 1000, 3)
+            record[f'{name}_count'] = count
+        record.update(counters)
+        return record
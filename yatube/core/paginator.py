@@ -0,0 +1,177 @@
+import base64
+import binascii
+import heapq
+from itertools import islice
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(value, pk):
+    """Упаковывает ключ (дата, id) в непрозрачный курсор для URL."""
+    raw = f'{value.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Распаковывает курсор; для испорченного курсора возвращает None."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, pk = raw.decode().split('|')
+        value = parse_datetime(value)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if value is None:
+        return None
+    return value, pk
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (дата, id) без OFFSET и COUNT.
+
+    Страницы адресуются курсорами ``?after=``/``?before=``, поэтому общее
+    число страниц неизвестно: ``num_pages`` показывает лишь, есть ли
+    страница после текущей. Номер у первой страницы 1, у остальных 2.
+    Старые ссылки ``?page=N`` продолжают работать через OFFSET.
+
+    Вместо одного queryset можно передать список: источники читаются по
+    одному ключу и сливаются, строки с одинаковым ключом отбрасываются.
+    Строками могут быть и словари из values().
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 key_field='pk', descending=True):
+        super().__init__(object_list, per_page)
+        if isinstance(object_list, (list, tuple)):
+            self.sources = list(object_list)
+        else:
+            self.sources = [object_list]
+        self.date_field = date_field
+        self.key_field = key_field
+        self.descending = descending
+        self._num_pages = 1
+
+    @property
+    def num_pages(self):
+        return self._num_pages
+
+    def get_cursor_page(self, after=None, before=None, number=None):
+        """Возвращает страницу по курсору или номеру, как get_page()."""
+        if after:
+            key = decode_cursor(after)
+            if key is not None:
+                return self._page_after(key)
+        if before:
+            key = decode_cursor(before)
+            if key is not None:
+                return self._page_before(key)
+        if number:
+            return self._page_number(number)
+        return self._page_after(None)
+
+    def _ordering(self, reverse=False):
+        prefix = '-' if self.descending != reverse else ''
+        return (prefix + self.date_field, prefix + self.key_field)
+
+    def _seek(self, queryset, key, forward):
+        value, pk = key
+        lookup = 'lt' if self.descending == forward else 'gt'
+        return queryset.filter(
+            Q(**{f'{self.date_field}__{lookup}': value})
+            | Q(**{self.date_field: value, f'{self.key_field}__{lookup}': pk})
+        )
+
+    def _row_key(self, row):
+        if isinstance(row, dict):
+            return row[self.date_field], row[self.key_field]
+        return getattr(row, self.date_field), getattr(row, self.key_field)
+
+    def row_cursor(self, row):
+        return encode_cursor(*self._row_key(row))
+
+    def iterate(self, after=None, limit=None):
+        """Строки ленты после курсора, по одной и без сборки страницы.
+
+        Источники читаются через iterator() и сливаются на лету, поэтому
+        в памяти не держится больше одной пачки строк на источник.
+        """
+        key = decode_cursor(after) if after else None
+        iterators = []
+        for queryset in self.sources:
+            queryset = queryset.order_by(*self._ordering())
+            if key is not None:
+                queryset = self._seek(queryset, key, True)
+            if limit is not None:
+                queryset = queryset[:limit]
+            iterators.append(queryset.iterator())
+        if len(iterators) == 1:
+            return iterators[0]
+        return islice(self._merge(iterators), limit)
+
+    def _merge(self, iterators):
+        previous = None
+        for row in heapq.merge(
+            *iterators, key=self._row_key, reverse=self.descending
+        ):
+            key = self._row_key(row)
+            if key != previous:
+                previous = key
+                yield row
+
+    def _fetch(self, key, forward, limit, offset=0):
+        """Строки в порядке обхода: вперёд по ленте или назад от ключа."""
+        querysets = []
+        for queryset in self.sources:
+            queryset = queryset.order_by(*self._ordering(not forward))
+            if key is not None:
+                queryset = self._seek(queryset, key, forward)
+            querysets.append(queryset)
+        if len(querysets) == 1:
+            return list(querysets[0][offset:offset + limit])
+        rows = {}
+        for queryset in querysets:
+            for row in queryset[:offset + limit]:
+                rows.setdefault(self._row_key(row), row)
+        keys = sorted(rows, reverse=self.descending == forward)
+        return [rows[key] for key in keys[offset:offset + limit]]
+
+    def _page_after(self, key):
+        rows = self._fetch(key, True, self.per_page + 1)
+        number = 1 if key is None else 2
+        return self._build_page(rows, number)
+
+    def _page_before(self, key):
+        rows = self._fetch(key, False, self.per_page + 1)
+        if len(rows) <= self.per_page:
+            # Дошли до начала ленты: отдаём актуальную первую страницу.
+            return self._page_after(None)
+        rows = rows[:self.per_page][::-1]
+        return self._build_page(rows, 2, has_next=True)
+
+    def _page_number(self, number):
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        offset = (number - 1) * self.per_page
+        rows = self._fetch(None, True, self.per_page + 1, offset)
+        if not rows and number > 1:
+            return self._page_after(None)
+        return self._build_page(rows, number)
+
+    def _build_page(self, rows, number, has_next=None):
+        if has_next is None:
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+        self._num_pages = number + int(has_next)
+        page = self._get_page(rows, number, self)
+        page.next_cursor = None
+        page.previous_cursor = None
+        if rows and has_next:
+            page.next_cursor = self.row_cursor(rows[-1])
+        if rows and number > 1:
+            page.previous_cursor = self.row_cursor(rows[0])
+        return page
@@ -0,0 +1,37 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+
+def query_budget(limit):
+    """Объявляет предельное число SQL-запросов представления.
+
+    Бюджет считается для авторизованного запроса: две выборки сессии
+    и пользователя входят в него. В лентах с картинками добавляется
+    ещё один запрос — миниатюры страницы, которых нет в кеше.
+    """
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def assert_query_budget(client, url, method='get', **kwargs):
+    """Выполняет запрос и проверяет, что представление уложилось в бюджет.
+
+    Подходит и для pytest, и для TestCase: при превышении бросает
+    AssertionError со списком выполненных запросов.
+    """
+    view = resolve(url.split('?')[0]).func
+    limit = getattr(view, 'query_budget', None)
+    assert limit is not None, (
+        f'У представления для `{url}` не объявлен @query_budget'
+    )
+    with CaptureQueriesContext(connection) as queries:
+        response = getattr(client, method)(url, **kwargs)
+    executed = [query['sql'] for query in queries]
+    assert len(executed) <= limit, (
+        f'`{url}` выполнил {len(executed)} запросов при бюджете {limit}:\n'
+        + '\n'.join(executed)
+    )
+    return response
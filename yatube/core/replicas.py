@@ -0,0 +1,152 @@
+"""Чтение posts с реплик базы и «свои записи видны сразу».
+
+Если в REPLICA_DATABASES перечислены реплики, ReplicaMiddleware на
+каждый GET-запрос выбирает одну из них, и ReplicaRouter отправляет
+туда чтения моделей posts, в том числе при отдаче потокового ответа.
+Всё остальное идёт в основную базу: записи, чтения других приложений
+(пользователи, сессии), чтения внутри транзакции и все запросы с
+методами кроме GET и HEAD.
+
+Реплика отстаёт. Представление, которое записало данные, вызывает
+``pin(request)``, и ещё REPLICA_PIN_SECONDS сессия читает только из
+основной базы: автор сразу видит свой пост, комментарий и подписку.
+
+Реплика на SQLite — копия основной базы, которую периодически
+обновляет команда sync_replica. Время снимка лежит в заголовке файла
+(PRAGMA user_version), и кеш страниц по нему не сохраняет страницу,
+собранную по данным старше текущих версий (см. core.cache).
+"""
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Приложения, чьи чтения можно отдавать репликам.
+APPS = ('posts',)
+PIN_KEY = '_replica_pin'
+
+_local = threading.local()
+
+
+def current():
+    """Реплика текущего запроса или None — читать из основной базы."""
+    return getattr(_local, 'alias', None)
+
+
+def pin(request):
+    """Закрепляет сессию за основной базой после записи."""
+    if settings.REPLICA_DATABASES:
+        request.session[PIN_KEY] = time.time() + settings.REPLICA_PIN_SECONDS
+
+
+def is_pinned(request):
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        # Без cookie сессии нет и закрепления; сессию не трогаем, чтобы
+        # не добавлять анонимам Vary: Cookie.
+        return False
+    return request.session.get(PIN_KEY, 0) > time.time()
+
+
+def synced_at(alias):
+    """Время снимка реплики в секундах (0 — неизвестно)."""
+    with connections[alias].cursor() as cursor:
+        cursor.execute('PRAGMA user_version')
+        return cursor.fetchone()[0]
+
+
+def fresh_since(version):
+    """Видны ли в данных запроса изменения с версией кеша version (мкс)."""
+    alias = current()
+    return alias is None or synced_at(alias) * 1_000_000 >= version
+
+
+def sync(source, target):
+    """Копирует базу source в target через backup API SQLite.
+
+    Снимок берётся в начале копирования за одну транзакцию чтения;
+    время до его начала записывается в user_version копии, с запасом
+    в сторону «старее», чем на самом деле.
+    """
+    started = int(time.time())
+    source_connection = sqlite3.connect(source)
+    target_connection = sqlite3.connect(target)
+    try:
+        source_connection.backup(target_connection)
+        target_connection.execute(f'PRAGMA user_version = {started}')
+        target_connection.commit()
+    finally:
+        source_connection.close()
+        target_connection.close()
+    return started
+
+
+class ReplicaMiddleware:
+    """Выбирает реплику для запроса; стоит после AuthenticationMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        replicas = settings.REPLICA_DATABASES
+        alias = None
+        if (replicas and request.method in ('GET', 'HEAD')
+                and not is_pinned(request)):
+            alias = random.choice(replicas)
+        _local.alias = alias
+        try:
+            response = self.get_response(request)
+        finally:
+            _local.alias = None
+        if alias is not None and response.streaming:
+            # Тело потокового ответа читает базу уже после возврата.
+            response.streaming_content = _with_alias(
+                alias, response.streaming_content
+            )
+        return response
+
+
+def _with_alias(alias, content):
+    """Отдаёт куски content, читая их с реплики alias.
+
+    Между кусками поток занят сервером, поэтому реплика выбрана только
+    на время получения очередного куска.
+    """
+    content = iter(content)
+    while True:
+        _local.alias = alias
+        try:
+            chunk = next(content)
+        except StopIteration:
+            return
+        finally:
+            _local.alias = None
+        yield chunk
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in APPS:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Внутри транзакции читаем то, что в ней же записано.
+            return DEFAULT_DB_ALIAS
+        return current()
+
+    def db_for_write(self, model, **hints):
+        # Иначе объект, прочитанный с реплики, туда же и сохранится.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схему реплика получает вместе с данными от sync_replica.
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
@@ -0,0 +1,137 @@
+"""Стеммер русского языка по алгоритму Snowball и токенизатор.
+
+Реализация на чистом Python повторяет russian/stem.sbl: окончания
+снимаются только в области RV (после первой гласной), словообразующие
+суффиксы «ост/ость» — в R2. Результат stem() кешируется: в живом тексте
+одни и те же словоформы встречаются постоянно.
+"""
+import re
+from functools import lru_cache
+
+WORD_RE = re.compile(r'\w+')
+VOWELS = frozenset('аеиоуыэюя')
+
+
+def _by_length(*suffixes):
+    return tuple(sorted(suffixes, key=len, reverse=True))
+
+
+PERFECTIVE_GERUND_1 = frozenset(('в', 'вши', 'вшись'))
+PERFECTIVE_GERUND = _by_length(
+    *PERFECTIVE_GERUND_1, 'ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись',
+)
+ADJECTIVE = _by_length(
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE_1 = frozenset(('ем', 'нн', 'вш', 'ющ', 'щ'))
+PARTICIPLE = _by_length(*PARTICIPLE_1, 'ивш', 'ывш', 'ующ')
+REFLEXIVE = _by_length('ся', 'сь')
+VERB_1 = frozenset((
+    'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+    'ют', 'ны', 'ть', 'ешь', 'нно',
+))
+VERB = _by_length(
+    *VERB_1, 'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли',
+    'ей', 'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+    'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+)
+NOUN = _by_length(
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+    'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+    'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я',
+)
+DERIVATIONAL = _by_length('ост', 'ость')
+TIDY_UP = _by_length('ейш', 'ейше', 'н', 'ь')
+
+
+def _regions(word):
+    """Начала областей RV и R2."""
+    length = len(word)
+    rv = r2 = length
+    position = 0
+    for step, wanted_vowel in enumerate((True, False, True, False)):
+        while position < length and (word[position] in VOWELS) != (
+            wanted_vowel
+        ):
+            position += 1
+        if position == length:
+            break
+        position += 1
+        if step == 0:
+            rv = position
+        elif step == 3:
+            r2 = position
+    return rv, r2
+
+
+def _longest(word, start, suffixes):
+    """Самое длинное окончание из suffixes, лежащее не левее start."""
+    for suffix in suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= start:
+            return suffix
+    return None
+
+
+def _remove(word, rv, suffixes, after_a=frozenset()):
+    """Снимает окончание; для after_a перед ним должна стоять «а» или «я».
+
+    Как и among в Snowball, решает самое длинное совпадение: если оно
+    не подошло по условию, более короткие уже не пробуются.
+    """
+    suffix = _longest(word, rv, suffixes)
+    if suffix is None:
+        return None
+    stem = word[:-len(suffix)]
+    if suffix in after_a and not (
+        len(stem) > rv and stem[-1] in 'ая'
+    ):
+        return None
+    return stem
+
+
+def _adjectival(word, rv):
+    stem = _remove(word, rv, ADJECTIVE)
+    if stem is None:
+        return None
+    participle = _remove(stem, rv, PARTICIPLE, PARTICIPLE_1)
+    return stem if participle is None else participle
+
+
+@lru_cache(maxsize=100_000)
+def stem(word):
+    """Основа слова; слово приводится к нижнему регистру, ё → е."""
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    result = _remove(word, rv, PERFECTIVE_GERUND, PERFECTIVE_GERUND_1)
+    if result is None:
+        word = _remove(word, rv, REFLEXIVE) or word
+        result = (
+            _adjectival(word, rv)
+            or _remove(word, rv, VERB, VERB_1)
+            or _remove(word, rv, NOUN)
+        )
+    if result is not None:
+        word = result
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+    suffix = _longest(word, r2, DERIVATIONAL)
+    if suffix:
+        word = word[:-len(suffix)]
+    suffix = _longest(word, rv, TIDY_UP)
+    if suffix in ('ейш', 'ейше'):
+        word = word[:-len(suffix)]
+        suffix = 'н'
+    if suffix == 'н':
+        if word.endswith('нн') and len(word) - 2 >= rv:
+            word = word[:-1]
+    elif suffix == 'ь':
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Основы всех слов текста по порядку."""
+    return [stem(word) for word in WORD_RE.findall(text)]
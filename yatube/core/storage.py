@@ -0,0 +1,143 @@
+import gzip
+import hashlib
+import io
+import os
+
+from django.contrib.staticfiles.storage import (
+    ManifestStaticFilesStorage, StaticFilesStorage,
+)
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: тогда только gzip
+    brotli = None
+
+# Уже сжатые форматы повторно не сжимаем.
+INCOMPRESSIBLE = frozenset((
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.ico', '.woff', '.woff2',
+    '.zip', '.gz', '.br', '.mp4', '.webm',
+))
+# Сжатая копия хранится, только если она заметно меньше исходной.
+MIN_COMPRESSED_RATIO = 0.95
+
+
+def content_hash(content):
+    """sha256 содержимого файла; позиция чтения возвращается в начало."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentHashStorage(FileSystemStorage):
+    """Хранилище, где имя файла — хеш его содержимого.
+
+    Одинаковые загрузки попадают в один файл в каталоге upload_to и
+    поэтому делят и набор миниатюр. Удалять такой файл можно, только
+    когда на него больше никто не ссылается: это решает вызывающий код.
+    """
+
+    def hashed_name(self, name, content):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        hashed = content_hash(content) + extension
+        return f'{directory}/{hashed}' if directory else hashed
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Такой файл уже есть: вторую копию не пишем.
+            return name
+        try:
+            return super().save(name, content, max_length)
+        except FileExistsError:
+            # Тот же файл только что записал параллельный запрос.
+            return name
+
+    def get_available_name(self, name, max_length=None):
+        # Имя задаёт содержимое: вместо копии с суффиксом вроде
+        # «<хеш>_a1b2c3d.gif» save() берёт уже записанный файл.
+        if self.exists(name):
+            raise FileExistsError(name)
+        return super().get_available_name(name, max_length)
+
+
+def gzip_bytes(data):
+    # mtime=0: одинаковый файл даёт одинаковый архив при каждой сборке.
+    buffer = io.BytesIO()
+    with gzip.GzipFile(
+        fileobj=buffer, mode='wb', compresslevel=9, mtime=0
+    ) as archive:
+        archive.write(data)
+    return buffer.getvalue()
+
+
+def static_encodings():
+    """Доступные сжатия статики: (кодировка, расширение, функция)."""
+    encodings = [('gzip', '.gz', gzip_bytes)]
+    if brotli is not None:
+        encodings.insert(0, ('br', '.br', brotli.compress))
+    return encodings
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Статика с хешем содержимого в имени и сжатыми копиями рядом.
+
+    collectstatic пишет файлы вида ``bootstrap.min.<hash>.css``, манифест
+    и для сжимаемых файлов ``.gz`` и, если установлен brotli, ``.br``.
+    Файлы с хешем в имени не меняются, их можно кешировать навсегда:
+    immutable_names отдаёт их набор для core.views.static_file.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.immutable_names = frozenset(self.hashed_files.values())
+
+    def url(self, name, force=False):
+        if not self.hashed_files:
+            # collectstatic ещё не запускался: отдаём исходные имена.
+            return StaticFilesStorage.url(self, name)
+        return super().url(name, force)
+
+    def save_manifest(self):
+        super().save_manifest()
+        self.immutable_names = frozenset(self.hashed_files.values())
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            # По строке на каждую записанную копию; несжатые — молча.
+            for target in self.compress(name):
+                yield name, target, True
+
+    def compress(self, name):
+        """Пишет сжатые копии файла и возвращает их имена."""
+        if os.path.splitext(name)[1].lower() in INCOMPRESSIBLE:
+            return []
+        with self.open(name) as source:
+            data = source.read()
+        written = []
+        for _, extension, compress in static_encodings():
+            packed = compress(data)
+            if len(packed) >= len(data) * MIN_COMPRESSED_RATIO:
+                continue
+            target = name + extension
+            if self.exists(target):
+                self.delete(target)
+            self._save(target, ContentFile(packed))
+            written.append(target)
+        return written
@@ -0,0 +1,38 @@
+"""Шаблонизатор Django, который замеряет рендеринг для Server-Timing.
+
+Замеряются только шаблоны, отданные движком наружу (render(),
+get_template()); {% include %} и {% extends %} рендерятся внутри них
+и отдельно не считаются. Шаблон, отрендеренный изнутри другого
+(карточки постов), уже входит во время внешнего.
+"""
+import threading
+
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+from . import metrics
+
+_local = threading.local()
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        if getattr(_local, 'rendering', False):
+            return super().render(context, request)
+        _local.rendering = True
+        try:
+            with metrics.timer('tpl'):
+                return super().render(context, request)
+        finally:
+            _local.rendering = False
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
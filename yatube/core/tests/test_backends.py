@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.test import SimpleTestCase
+
+from core.backends.sqlite3.base import DatabaseWrapper
+
+
+class SQLiteBackendTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.wrapper = self.connect(DEFAULT_DB_ALIAS)
+
+    def connect(self, alias, **options):
+        wrapper = DatabaseWrapper({
+            **connection.settings_dict,
+            'NAME': os.path.join(self.directory, 'db.sqlite3'),
+            'OPTIONS': options,
+        }, alias=alias)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, name):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        """Новое соединение в режиме WAL, с synchronous=NORMAL (1) и
+        транзакциями BEGIN IMMEDIATE."""
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.wrapper.transaction_mode, 'IMMEDIATE')
+
+    def test_replica_reads_do_not_wait_for_writer(self):
+        """Вне основной базы транзакция не берёт блокировку записи."""
+        replica = self.connect('replica', pragmas={'busy_timeout': 0})
+        self.assertEqual(replica.transaction_mode, 'DEFERRED')
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (name TEXT)')
+        # Писатель держит BEGIN IMMEDIATE, как в atomic() основной базы.
+        self.wrapper._start_transaction_under_autocommit()
+        self.addCleanup(self.wrapper.cursor().execute, 'ROLLBACK')
+        replica._start_transaction_under_autocommit()
+        with replica.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM item')
+            self.assertEqual(cursor.fetchone()[0], 0)
+            cursor.execute('ROLLBACK')
+
+    def test_health_check_reopens_dead_connection(self):
+        self.wrapper.ensure_connection()
+        self.wrapper.connection.close()
+        self.assertFalse(self.wrapper.is_usable())
+        # Начало HTTP-запроса: соединение проверяется перед первым SQL.
+        self.wrapper.close_if_unusable_or_obsolete()
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
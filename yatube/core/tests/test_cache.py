@@ -0,0 +1,27 @@
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from core import cache
+from core.checks import check_page_version_cache
+
+
+class PageVersionCacheTest(SimpleTestCase):
+    def test_versions_live_in_shared_cache(self):
+        """Версии пишутся в кеш PAGE_VERSION_CACHE, а не в кеш страниц."""
+        cache.bump('scope-test')
+        key = cache._version_key('scope-test')
+        self.assertIsNotNone(caches['versions'].get(key))
+        self.assertIsNone(caches['default'].get(key))
+        self.assertEqual(
+            cache.get_versions(['scope-test']),
+            [caches['versions'].get(key)],
+        )
+
+    def test_shared_cache_passes_check(self):
+        self.assertEqual(check_page_version_cache(None), [])
+
+    @override_settings(PAGE_VERSION_CACHE='default')
+    def test_process_local_cache_warns(self):
+        """Версии в LocMemCache видны только одному процессу."""
+        warnings = check_page_version_cache(None)
+        self.assertEqual([warning.id for warning in warnings], ['core.W001'])
@@ -0,0 +1,16 @@
+from django.test import SimpleTestCase
+
+from core.histogram import Histogram
+
+
+class HistogramTests(SimpleTestCase):
+    def test_histogram_percentiles(self):
+        """Перцентили с тремя значащими цифрами, сумма гистограмм."""
+        first, second = Histogram(), Histogram()
+        for value in range(1, 1001):
+            (first if value % 2 else second).record(value / 1000)
+        histogram = first.merge(second)
+        self.assertEqual(histogram.count, 1000)
+        self.assertAlmostEqual(histogram.percentile(50), 0.5, places=2)
+        self.assertAlmostEqual(histogram.percentile(99), 0.99, places=2)
+        self.assertEqual(histogram.percentile(100), 1.0)
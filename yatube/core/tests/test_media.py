@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_SENDFILE_HEADER=None)
+class MediaFileTests(TestCase):
+    content = bytes(range(256)) * 40
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts'), exist_ok=True)
+        with open(os.path.join(TEMP_MEDIA_ROOT, 'posts', 'a.gif'), 'wb') as f:
+            f.write(cls.content)
+        open(os.path.join(TEMP_MEDIA_ROOT, 'posts', 'empty.gif'), 'wb').close()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def get(self, **extra):
+        response = self.client.get('/media/posts/a.gif', **extra)
+        if response.streaming:
+            response.body = b''.join(response.streaming_content)
+        return response
+
+    def test_full_file_and_range(self):
+        """Файл отдаётся целиком и по диапазону байт."""
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.body, self.content)
+        self.assertEqual(response['Content-Type'], 'image/gif')
+        for header, expected, content_range in (
+            ('bytes=10-19', self.content[10:20], 'bytes 10-19/10240'),
+            ('bytes=10240-', None, 'bytes */10240'),
+            ('bytes=-5', self.content[-5:], 'bytes 10235-10239/10240'),
+            ('bytes=10230-99999', self.content[10230:],
+             'bytes 10230-10239/10240'),
+        ):
+            with self.subTest(header=header):
+                response = self.get(HTTP_RANGE=header)
+                self.assertEqual(response['Content-Range'], content_range)
+                if expected is None:
+                    self.assertEqual(response.status_code, 416)
+                    continue
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response.body, expected)
+                self.assertEqual(
+                    int(response['Content-Length']), len(expected)
+                )
+
+    def test_suffix_range_of_empty_file(self):
+        """У пустого файла нет последних байт: ответ 416."""
+        response = self.client.get(
+            '/media/posts/empty.gif', HTTP_RANGE='bytes=-5'
+        )
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */0')
+
+    def test_conditional_requests(self):
+        """ETag даёт 304, а устаревший If-Range — весь файл."""
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.get(HTTP_RANGE='bytes=0-0', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        response = self.get(HTTP_RANGE='bytes=0-0', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.body, self.content)
+
+    @override_settings(MEDIA_SENDFILE_HEADER='X-Accel-Redirect')
+    def test_delegated_to_web_server(self):
+        """За nginx Django только проверяет путь и отдаёт заголовок."""
+        response = self.get()
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/internal-media/posts/a.gif'
+        )
+        self.assertEqual(response.content, b'')
+        for path in ('/media/../manage.py', '/media/posts/',
+                     '/media/posts/missing.gif'):
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path).status_code, 404)
@@ -0,0 +1,76 @@
+import gzip
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+STATIC_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(STATIC_ROOT=STATIC_ROOT)
+class StaticFilesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.output = StringIO()
+        call_command(
+            'collectstatic', interactive=False, verbosity=2,
+            stdout=cls.output,
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(STATIC_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_hashed_names_in_templates(self):
+        """Шаблоны ссылаются на файлы с хешем содержимого."""
+        response = self.client.get(reverse('about:author'))
+        css_url = staticfiles_storage.url('css/bootstrap.min.css')
+        self.assertRegex(css_url, r'bootstrap\.min\.[0-9a-f]{12}\.css$')
+        self.assertContains(response, css_url)
+
+    def test_best_encoding_served_immutable(self):
+        """Сжатая копия выбирается по Accept-Encoding."""
+        url = staticfiles_storage.url('css/bootstrap.min.css')
+        plain = self.client.get(url, HTTP_ACCEPT_ENCODING='identity')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('immutable', plain['Cache-Control'])
+        self.assertEqual(plain['Vary'], 'Accept-Encoding')
+        packed = self.client.get(
+            url, HTTP_ACCEPT_ENCODING='gzip;q=0.5, br;q=0'
+        )
+        self.assertEqual(packed['Content-Encoding'], 'gzip')
+        self.assertEqual(packed['Content-Type'], 'text/css')
+        self.assertEqual(
+            gzip.decompress(b''.join(packed.streaming_content)),
+            b''.join(plain.streaming_content),
+        )
+
+    def test_unhashed_name_revalidated(self):
+        """Файл без хеша отдаётся без immutable, чужие пути — 404."""
+        response = self.client.get('/static/img/logo.png')
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertEqual(
+            self.client.get('/static/../manage.py').status_code, 404
+        )
+
+    def test_post_processed_once_per_compressed_copy(self):
+        """collectstatic называет каждую сжатую копию, а картинки не жмёт."""
+        lines = self.output.getvalue().splitlines()
+        self.assertIn(
+            "Post-processed 'css/bootstrap.min.css' as "
+            "'css/bootstrap.min.css.gz'",
+            lines,
+        )
+        self.assertFalse([line for line in lines if "as '[]'" in line])
+        self.assertFalse([
+            line for line in lines
+            if line.startswith("Post-processed 'img/logo.png' as")
+            and line.endswith(".gz'")
+        ])
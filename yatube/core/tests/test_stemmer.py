@@ -0,0 +1,19 @@
+from django.test import SimpleTestCase
+
+from core.stemmer import stem
+
+
+class StemmerTests(SimpleTestCase):
+    def test_stemmer(self):
+        """Стеммер совпадает с эталонным Snowball на примерах."""
+        examples = {
+            'важнейшие': 'важн',
+            'бежать': 'бежа',
+            'обязанности': 'обязан',
+            'умывшись': 'ум',
+            'Ёлка': 'елк',
+            'длинный': 'длин',
+        }
+        for word, expected in examples.items():
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), expected)
@@ -0,0 +1,135 @@
+"""Приём картинок с ограниченным расходом памяти.
+
+Загрузка всегда пишется во временный файл на диске и обрезается на
+IMAGE_UPLOAD_MAX_BYTES. Затем normalize_image() по заголовку проверяет
+число пикселей, декодирует JPEG сразу в уменьшенном виде (draft),
+поворачивает по EXIF и сохраняет мастер-копию не больше
+IMAGE_MASTER_SIZE по длинной стороне и без метаданных.
+"""
+import logging
+import math
+import os
+import struct
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageOps
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Форматы, которые сохраняются как есть; остальные — в PNG.
+KEEP_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+JPEG_QUALITY = 85
+# Режимы, которые PNG сохраняет без преобразования.
+PNG_MODES = ('1', 'L', 'LA', 'P', 'RGB', 'RGBA')
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку на диск и перестаёт писать после предела.
+
+    Слишком большой файл отдаётся форме пустым и с флагом too_large,
+    поэтому поле с ним не проходит проверку на пустой файл.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.too_large = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.too_large:
+            return None
+        if start + len(raw_data) > settings.IMAGE_UPLOAD_MAX_BYTES:
+            self.too_large = True
+            self.file.seek(0)
+            self.file.truncate()
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        metrics.incr('upload.bytes', file_size)
+        if self.too_large:
+            self.file.seek(0)
+            self.file.size = 0
+            self.file.too_large = True
+            return self.file
+        return super().file_complete(file_size)
+
+
+def _draft_size(size, limit):
+    scale = min(1, limit / max(size))
+    return tuple(math.ceil(side * scale) for side in size)
+
+
+def normalize_image(upload):
+    """Мастер-копия картинки: ограниченного размера и без метаданных.
+
+    Возвращает новый файл во временном хранилище; в памяти держится
+    только декодированная и уже уменьшенная картинка. Битый файл или
+    «бомба» из сжатых данных дают ValidationError, а не ошибку 500.
+    """
+    upload.seek(0)
+    try:
+        return _normalize(upload)
+    # Кроме OSError Pillow на испорченных заголовках и EXIF бросает
+    # ValueError, SyntaxError и struct.error.
+    except (
+        OSError, ValueError, SyntaxError, struct.error,
+        Image.DecompressionBombError,
+    ) as error:
+        logger.info('Картинка %s не прочитана: %s', upload.name, error)
+        raise ValidationError(
+            'Не удалось прочитать картинку.', code='invalid_image'
+        )
+
+
+def _normalize(upload):
+    with Image.open(upload) as image:
+        width, height = image.size
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Картинка слишком большая: %(width)s×%(height)s пикселей.',
+                code='too_many_pixels',
+                params={'width': width, 'height': height},
+            )
+        source_format = image.format
+        # Для JPEG декодер сразу уменьшает картинку в 2, 4 или 8 раз.
+        image.draft('RGB', _draft_size(image.size, settings.IMAGE_MASTER_SIZE))
+        master = ImageOps.exif_transpose(image)
+    master.thumbnail(
+        (settings.IMAGE_MASTER_SIZE, settings.IMAGE_MASTER_SIZE),
+        Image.LANCZOS,
+    )
+    metrics.incr(
+        'upload.decoded_bytes',
+        master.width * master.height * len(master.getbands()),
+    )
+    image_format = source_format if source_format in KEEP_FORMATS else 'PNG'
+    options = {}
+    if image_format == 'JPEG':
+        if master.mode not in ('RGB', 'L'):
+            master = master.convert('RGB')
+        options = {'quality': JPEG_QUALITY, 'optimize': True}
+    elif image_format == 'PNG' and master.mode not in PNG_MODES:
+        # CMYK из TIFF, 16-битные и прочие режимы PNG не сохранит.
+        transparent = 'A' in master.getbands() or 'transparency' in master.info
+        master = master.convert('RGBA' if transparent else 'RGB')
+    output = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    # Метаданные (EXIF, ICC, текстовые блоки PNG) не передаются в save().
+    master.save(output, image_format, **options)
+    output.seek(0)
+    name = '{}.{}'.format(
+        os.path.splitext(os.path.basename(upload.name))[0],
+        KEEP_FORMATS[image_format],
+    )
+    logger.debug(
+        'Картинка %s: %s×%s → %s×%s', upload.name, width, height,
+        master.width, master.height,
+    )
+    return File(output, name=name)
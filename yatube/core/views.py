@@ -1,4 +1,28 @@
+import mimetypes
+import os
+import posixpath
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import PermissionDenied, SuspiciousFileOperation
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified,
+)
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.static import was_modified_since
+
+from . import metrics as request_metrics
+from .storage import static_encodings
+
+# Файлы с хешем в имени кешируются на год и не проверяются повторно.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Остальные браузер проверяет при каждом использовании.
+MUTABLE_CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+# Блок чтения медиа, если сервер не умеет sendfile (у FileResponse 4 КБ).
+MEDIA_BLOCK_SIZE = 256 * 1024
 
 
 def page_not_found(request, exception):
@@ -17,3 +41,231 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+def metrics(request):
+    """Счётчики процесса в текстовом виде, по одному на строку.
+
+    Доступно сотрудникам и адресам из INTERNAL_IPS.
+    """
+    if not (request.user.is_staff
+            or request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS):
+        raise PermissionDenied
+    totals = request_metrics.totals()
+    pages = totals.get('conditional.pages', 0)
+    if pages:
+        totals['conditional.not_modified_ratio'] = round(
+            totals.get('conditional.not_modified', 0) / pages, 4
+        )
+    lines = [f'{name} {value}' for name, value in sorted(totals.items())]
+    return HttpResponse(
+        '\n'.join(lines) + '\n', content_type='text/plain; charset=utf-8'
+    )
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding с q > 0."""
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _pick_encoding(request, path):
+    """Лучшая сжатая копия файла, которую принимает клиент."""
+    accepted = accepted_encodings(
+        request.META.get('HTTP_ACCEPT_ENCODING', '')
+    )
+    for encoding, extension, _ in static_encodings():
+        if (encoding in accepted or '*' in accepted) and os.path.isfile(
+            path + extension
+        ):
+            return encoding, path + extension
+    return None, path
+
+
+def _resolve(root, path):
+    """Путь к обычному файлу внутри root или 404."""
+    name = posixpath.normpath(path).lstrip('/')
+    try:
+        full_path = safe_join(root, name)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+    return name, full_path
+
+
+def static_file(request, path):
+    """Отдаёт собранную статику из STATIC_ROOT.
+
+    Сжатая копия выбирается по Accept-Encoding; файлы с хешем в имени
+    отдаются с Cache-Control: immutable.
+    """
+    name, full_path = _resolve(settings.STATIC_ROOT, path)
+    encoding, served_path = _pick_encoding(request, full_path)
+    stat = os.stat(served_path)
+    immutable = name in getattr(
+        staticfiles_storage, 'immutable_names', frozenset()
+    )
+    if not immutable and not was_modified_since(
+        request.META.get('HTTP_IF_MODIFIED_SINCE'),
+        stat.st_mtime, stat.st_size,
+    ):
+        return HttpResponseNotModified()
+    content_type, _ = mimetypes.guess_type(full_path)
+    response = FileResponse(
+        open(served_path, 'rb'),
+        content_type=content_type or 'application/octet-stream',
+    )
+    response['Content-Length'] = stat.st_size
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = (
+        IMMUTABLE_CACHE_CONTROL if immutable else MUTABLE_CACHE_CONTROL
+    )
+    if encoding:
+        response['Content-Encoding'] = encoding
+        request_metrics.incr(f'static.{encoding}')
+    if any(
+        os.path.isfile(full_path + extension)
+        for _, extension, _ in static_encodings()
+    ):
+        patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+class FileRange:
+    """Часть открытого файла для FileResponse.
+
+    read() не выходит за конец диапазона; fileno() и tell() отдаются
+    как есть, поэтому wsgi.file_wrapper сервера (gunicorn) отправит
+    диапазон через os.sendfile, взяв длину из Content-Length.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Один диапазон ``bytes=`` как (начало, конец включительно).
+
+    None — заголовка нет или он не поддерживается (несколько диапазонов,
+    другие единицы): тогда отдаётся весь файл. ValueError — диапазон
+    за пределами файла, ответ 416.
+    """
+    units, _, spec = (header or '').partition('=')
+    if units.strip() != 'bytes' or ',' in spec:
+        return None
+    first, dash, last = spec.strip().partition('-')
+    if not dash or not (first + last).isdigit():
+        return None
+    if first == '':
+        # bytes=-N: последние N байт; у пустого файла их нет.
+        if int(last) == 0 or size == 0:
+            raise ValueError(header)
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _range_applies(request, etag, mtime):
+    """If-Range: диапазон отдаётся, только если файл не менялся."""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(mtime)
+
+
+def media_file(request, path):
+    """Отдаёт загруженный файл из MEDIA_ROOT.
+
+    Путь проверяется здесь; сами байты отдаёт веб-сервер по
+    MEDIA_SENDFILE_HEADER, а без него — Django с поддержкой Range и
+    условных запросов.
+    """
+    name, full_path = _resolve(settings.MEDIA_ROOT, path)
+    if os.path.basename(name).startswith('.'):
+        raise Http404
+    stat = os.stat(full_path)
+    etag = quote_etag('{:x}-{:x}'.format(int(stat.st_mtime), stat.st_size))
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if response is None:
+        response = _media_response(request, name, full_path, stat, etag)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = 'public, max-age={}'.format(
+        settings.MEDIA_CACHE_MAX_AGE
+    )
+    return response
+
+
+def _media_response(request, name, full_path, stat, etag):
+    content_type, _ = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    header = settings.MEDIA_SENDFILE_HEADER
+    if header:
+        # Диапазоны и отправку файла берёт на себя веб-сервер.
+        response = HttpResponse(content_type=content_type)
+        response[header] = (
+            settings.MEDIA_ACCEL_PREFIX + name
+            if header == 'X-Accel-Redirect' else full_path
+        )
+        request_metrics.incr('media.sendfile')
+        return response
+    size = stat.st_size
+    byte_range = None
+    if _range_applies(request, etag, stat.st_mtime):
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    response = FileResponse(
+        FileRange(open(full_path, 'rb'), start, length),
+        content_type=content_type,
+    )
+    response.block_size = MEDIA_BLOCK_SIZE
+    response['Content-Length'] = length
+    response['Accept-Ranges'] = 'bytes'
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    request_metrics.incr('media.bytes', length)
+    return response
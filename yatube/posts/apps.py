@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        # Регистрируем обработчики сигналов счётчиков.
+        from . import signals  # noqa: F401
@@ -0,0 +1,211 @@
+"""Замеры представлений posts и users.
+
+Каждое представление из posts.urls и users.urls вызывается через
+тестовый клиент на данных из posts.benchdata: время ответа целиком
+(со стримингом тела), число SQL-запросов и время в базе. Запросы
+считает execute_wrapper, поэтому замеры работают и при DEBUG=False.
+Итог сравнивается с сохранённым прошлым результатом.
+"""
+import statistics
+import time
+from urllib.parse import unquote
+
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.urls import resolve, reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlencode, urlsafe_base64_encode
+
+from posts import urls as posts_urls
+from users import urls as users_urls
+from .models import Follow
+
+URL_MODULES = (posts_urls, users_urls)
+
+
+class Scenario:
+    """Запрос к представлению: от чьего имени и что сделать перед ним.
+
+    prepare(client) вызывается перед каждым повтором вне замера: так
+    повторяемые запросы с побочным эффектом (подписка, выход) каждый
+    раз начинают с одного и того же состояния.
+    """
+
+    def __init__(self, name, kwargs=None, query='', user=None,
+                 method='get', data=None, prepare=None):
+        self.name = name
+        self.url = reverse(name, kwargs=kwargs) + query
+        self.user = user
+        self.method = method
+        self.data = data or {}
+        self.prepare = prepare
+        self.label = name + unquote(query)
+
+
+def url_names():
+    """Имена всех адресов posts и users вида ``posts:index``."""
+    return {
+        f'{module.app_name}:{pattern.name}'
+        for module in URL_MODULES for pattern in module.urlpatterns
+    }
+
+
+def missing(scenarios):
+    """Адреса, для которых не описан ни один сценарий."""
+    return url_names() - {scenario.name for scenario in scenarios}
+
+
+def scenarios(data):
+    """Сценарии для данных из benchdata.sample()."""
+    author, reader = data['author'], data['reader']
+    post = data['post']
+    uid = urlsafe_base64_encode(force_bytes(reader.pk))
+    token = default_token_generator.make_token(reader)
+
+    def unfollow(client):
+        Follow.objects.filter(user=reader, author=author).delete()
+
+    def follow(client):
+        Follow.objects.get_or_create(user=reader, author=author)
+
+    def login(client):
+        client.force_login(reader)
+
+    post_kwargs = {'post_id': post.pk}
+    author_kwargs = {'username': author.username}
+    return [
+        Scenario('posts:index'),
+        Scenario('posts:index', query='?page=50'),
+        Scenario('posts:group_list', {'slug': data['group'].slug}),
+        Scenario('posts:profile', author_kwargs),
+        Scenario('posts:post_detail', post_kwargs),
+        Scenario('posts:comments', post_kwargs),
+        Scenario('posts:search', query='?' + urlencode({'q': data['word']})),
+        Scenario('posts:post_create', user=author),
+        Scenario('posts:post_edit', post_kwargs, user=post.author),
+        Scenario(
+            'posts:add_comment', post_kwargs, user=reader,
+            method='post', data={'text': 'Замер'},
+        ),
+        Scenario('posts:follow_index', user=reader),
+        Scenario('posts:export', query='?zip=0', user=author),
+        Scenario(
+            'posts:profile_follow', author_kwargs, user=reader,
+            prepare=unfollow,
+        ),
+        Scenario(
+            'posts:profile_unfollow', author_kwargs, user=reader,
+            prepare=follow,
+        ),
+        Scenario('users:signup'),
+        Scenario('users:logout', user=reader, prepare=login),
+        Scenario('users:login'),
+        Scenario('users:password_reset_form'),
+        Scenario('users:password_reset_done'),
+        Scenario(
+            'users:password_reset_confirm', {'uidb64': uid, 'token': token}
+        ),
+        Scenario('users:password_reset_complete'),
+        Scenario('users:password_change_form', user=reader),
+        Scenario('users:password_change_done', user=reader),
+    ]
+
+
+class QueryTimer:
+    """Обёртка execute_wrapper: число запросов и время в базе."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+def percentile(values, fraction):
+    """Значение по ближайшему рангу: percentile(values, 0.95) — p95."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def request(client, scenario):
+    """Выполняет запрос и дочитывает потоковый ответ."""
+    response = getattr(client, scenario.method)(scenario.url, scenario.data)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def measure(scenario, repeat=20, warmup=2, cold=True):
+    """Замер сценария: медиана и p95 времени, запросы и время в базе.
+
+    При cold кеш очищается перед каждым повтором: замеряется работа
+    представления, а не выдача страницы из кеша.
+    """
+    client = Client()
+    if scenario.user is not None:
+        client.force_login(scenario.user)
+    wall, sql, queries, statuses = [], [], [], set()
+    for iteration in range(warmup + repeat):
+        if scenario.prepare is not None:
+            scenario.prepare(client)
+        if cold:
+            cache.clear()
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            started = time.perf_counter()
+            response = request(client, scenario)
+            elapsed = time.perf_counter() - started
+        if iteration < warmup:
+            continue
+        wall.append(elapsed * 1000)
+        sql.append(timer.seconds * 1000)
+        queries.append(timer.count)
+        statuses.add(response.status_code)
+    view = resolve(scenario.url.split('?')[0]).func
+    return {
+        'name': scenario.name,
+        'status': sorted(statuses),
+        'wall_ms': round(statistics.median(wall), 3),
+        'wall_p95_ms': round(percentile(wall, 0.95), 3),
+        'wall_min_ms': round(min(wall), 3),
+        'sql_ms': round(statistics.median(sql), 3),
+        'queries': max(queries),
+        'query_budget': getattr(view, 'query_budget', None),
+    }
+
+
+def compare(results, baseline, threshold=0.2, min_delta_ms=1.0):
+    """Регрессии относительно baseline, строками для отчёта.
+
+    Время — регрессия, если медиана выросла больше чем на threshold
+    и больше чем на min_delta_ms (шум быстрых страниц). Число запросов
+    детерминировано, поэтому регрессия — любой лишний запрос.
+    """
+    regressions = []
+    for label, current in results.items():
+        before = baseline.get(label)
+        if before is None:
+            continue
+        if current['queries'] > before['queries']:
+            regressions.append(
+                f'{label}: запросов {before["queries"]} → '
+                f'{current["queries"]}'
+            )
+        for field in ('wall_ms', 'sql_ms'):
+            old, new = before[field], current[field]
+            if new > old * (1 + threshold) and new - old > min_delta_ms:
+                regressions.append(
+                    f'{label}: {field} {old:.1f} → {new:.1f} '
+                    f'(+{(new / old - 1) * 100 if old else 100:.0f}%)'
+                )
+    return regressions
@@ -0,0 +1,341 @@
+"""Синтетические данные для замеров скорости.
+
+Пользователи, группы, посты, комментарии и подписки пишутся пачками
+INSERT в обход save() и сигналов, как в import_content; производные
+данные (счётчики, ленты, поисковый индекс) затем собираются один раз.
+Распределения неравномерные, как в жизни: у немногих авторов большая
+часть постов и подписчиков, у немногих постов — большая часть
+комментариев. Одинаковые параметры и seed дают одинаковые данные.
+"""
+import bisect
+import json
+import os
+import random
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from faker import Faker
+
+from . import search
+from .management.commands.import_content import insert_rows
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+SCALE = {
+    'users': 1000,
+    'groups': 20,
+    'posts': 10000,
+    'comments': 20000,
+    'follows': 10000,
+}
+# Посты раскиданы по этому числу последних дней.
+DAYS = 365
+# Доля постов в группах.
+GROUPED = 0.7
+# Текстов в пуле Faker: генерировать текст на каждый пост долго.
+TEXT_POOL = 2000
+CHUNK_SIZE = 10000
+BATCH_SIZE = 500
+
+
+def add_arguments(parser):
+    """Параметры данных замеров для команд bench_views и load_test."""
+    parser.add_argument(
+        '--database',
+        default=os.path.join(settings.BASE_DIR, 'bench.sqlite3'),
+        help='Файл SQLite для данных замеров; рабочая база не '
+             'трогается. Данные переиспользуются между запусками.',
+    )
+    for name, default in SCALE.items():
+        parser.add_argument(f'--{name}', type=int, default=default)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--regenerate', action='store_true',
+        help='Удалить файл данных и создать заново.',
+    )
+
+
+def prepare_from_options(options, stdout=None):
+    """prepare() по параметрам из add_arguments; возвращает размеры."""
+    scale = {name: options[name] for name in SCALE}
+    prepare(
+        options['database'], scale, options['seed'],
+        options['regenerate'], stdout,
+    )
+    return scale
+
+
+def use_database(name):
+    """Переключает соединение по умолчанию на файл SQLite и мигрирует.
+
+    Замеры не должны трогать рабочую базу, а данные большого объёма
+    удобно держать в отдельном файле и переиспользовать между запусками.
+    """
+    connection.close()
+    connection.settings_dict['NAME'] = name
+    call_command('migrate', verbosity=0, interactive=False)
+
+
+@contextmanager
+def scratch_copy(database):
+    """Работа с временной копией файла данных; отдаёт каталог копии.
+
+    Нагрузка пишет посты, комментарии и сессии, а данные замеров
+    должны остаться прежними. Каталог удаляется на выходе.
+    """
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    try:
+        copy = os.path.join(workdir, 'db.sqlite3')
+        connection.close()
+        # Копия через backup API: в режиме WAL часть данных ещё в -wal.
+        source, target = sqlite3.connect(database), sqlite3.connect(copy)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+        use_database(copy)
+        yield workdir
+    finally:
+        connection.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def is_empty():
+    return not (User.objects.exists() or Post.objects.exists())
+
+
+def prepare(database, scale, seed=0, regenerate=False, stdout=None):
+    """Открывает файл данных замеров, при необходимости создавая данные.
+
+    Параметры создания лежат рядом в ``<database>.json``; непустая база
+    с другими параметрами — ValueError, чтобы не сравнивать замеры на
+    разных данных. regenerate удаляет файл и создаёт данные заново.
+    """
+    meta_path = f'{database}.json'
+    meta = {'scale': {**SCALE, **scale}, 'seed': seed}
+    if regenerate:
+        for path in (database, meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+    use_database(database)
+    if not is_empty():
+        try:
+            with open(meta_path, encoding='utf-8') as file:
+                existing = json.load(file)
+        except FileNotFoundError:
+            existing = None
+        if existing != meta:
+            raise ValueError(
+                f'Данные в {database} созданы с другими параметрами: '
+                f'{existing}'
+            )
+        return
+    generate(seed, stdout, **meta['scale'])
+    with open(meta_path, 'w', encoding='utf-8') as file:
+        json.dump(meta, file)
+
+
+class _Zipf:
+    """Выбор по рангу с весом 1 / (ранг + 1): первые — самые частые."""
+
+    def __init__(self, values, rng):
+        self.values = values
+        self.rng = rng
+        self.cum_weights = list(
+            accumulate(1 / (rank + 1) for rank in range(len(values)))
+        )
+
+    def __call__(self):
+        point = self.rng.random() * self.cum_weights[-1]
+        index = bisect.bisect(self.cum_weights, point)
+        return self.values[min(index, len(self.values) - 1)]
+
+
+class Generator:
+    def __init__(self, seed=0, stdout=None, chunk_size=CHUNK_SIZE,
+                 batch_size=BATCH_SIZE):
+        self.rng = random.Random(seed)
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(seed)
+        self.stdout = stdout
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.now = timezone.now()
+        self.first_pk = {
+            model: (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+            for model in (User, Group, Post, Comment, Follow)
+        }
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def run(self, users, groups, posts, comments, follows):
+        started = time.perf_counter()
+        self.texts = [
+            self.fake.paragraph(nb_sentences=3) for _ in range(TEXT_POOL)
+        ]
+        self.password = make_password(None)
+        self.write('Пользователи', User, users, self.build_user)
+        self.write('Группы', Group, groups, self.build_group)
+        self.pick_author = _Zipf(self.pks(User, users), self.rng)
+        self.pick_group = _Zipf(self.pks(Group, groups), self.rng)
+        # Время постов нужно комментариям: они не старше поста.
+        self.post_dates = array('d')
+        self.write('Посты', Post, posts, self.build_post)
+        if posts:
+            self.write('Комментарии', Comment, comments, self.build_comment)
+        self.pairs = self.follow_pairs(users, follows)
+        self.write('Подписки', Follow, len(self.pairs), self.build_follow)
+        self.reset_sequences()
+        self.rebuild()
+        self.log(f'Данные созданы за {time.perf_counter() - started:.1f} с')
+
+    def pks(self, model, total):
+        first = self.first_pk[model]
+        return list(range(first, first + total))
+
+    def write(self, label, model, total, build):
+        """Пишет total объектов build(pk, index) пачками в транзакциях."""
+        started = time.perf_counter()
+        first = self.first_pk[model]
+        for start in range(0, total, self.chunk_size):
+            objects = [
+                build(first + index, index)
+                for index in range(start, min(total, start + self.chunk_size))
+            ]
+            with transaction.atomic():
+                insert_rows(model, objects, self.batch_size)
+        rate = total / max(time.perf_counter() - started, 1e-9)
+        self.log(f'{label}: {total} строк, {rate:.0f} строк/с')
+
+    def build_user(self, pk, index):
+        return User(
+            pk=pk,
+            username=f'{self.fake.user_name()}{pk}',
+            first_name=self.fake.first_name(),
+            last_name=self.fake.last_name(),
+            password=self.password,
+            date_joined=self.now,
+        )
+
+    def build_group(self, pk, index):
+        return Group(
+            pk=pk,
+            title=f'{self.fake.word().capitalize()} {pk}',
+            slug=f'group-{pk}',
+            description=self.fake.sentence(),
+        )
+
+    def build_post(self, pk, index):
+        pub_date = self.now - timedelta(
+            seconds=self.rng.random() * DAYS * 24 * 60 * 60
+        )
+        self.post_dates.append(pub_date.timestamp())
+        grouped = self.pick_group.values and self.rng.random() < GROUPED
+        return Post(
+            pk=pk,
+            author_id=self.pick_author(),
+            group_id=self.pick_group() if grouped else None,
+            text=self.rng.choice(self.texts),
+            pub_date=pub_date,
+            image='',
+            comments_count=0,
+        )
+
+    def build_comment(self, pk, index):
+        # Куб равномерного числа сдвигает выбор к первым постам:
+        # у немногих постов большая часть комментариев.
+        post_index = int(len(self.post_dates) * self.rng.random() ** 3)
+        posted = self.post_dates[post_index]
+        created = posted + self.rng.random() * (self.now.timestamp() - posted)
+        return Comment(
+            pk=pk,
+            post_id=self.first_pk[Post] + post_index,
+            author_id=self.rng.choice(self.pick_author.values),
+            text=self.rng.choice(self.texts)[:200],
+            created=datetime.fromtimestamp(created, tz=timezone.utc),
+        )
+
+    def follow_pairs(self, users, follows):
+        """Уникальные пары: читатель любой, автор — по популярности."""
+        user_ids = self.pick_author.values
+        pairs, seen = [], set()
+        attempts = 0
+        while len(pairs) < follows and attempts < follows * 10 and users > 1:
+            attempts += 1
+            pair = (self.rng.choice(user_ids), self.pick_author())
+            if pair[0] != pair[1] and pair not in seen:
+                seen.add(pair)
+                pairs.append(pair)
+        return pairs
+
+    def build_follow(self, pk, index):
+        user_id, author_id = self.pairs[index]
+        return Follow(pk=pk, user_id=user_id, author_id=author_id)
+
+    def reset_sequences(self):
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Group, Post, Comment, Follow]
+        )
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def rebuild(self):
+        started = time.perf_counter()
+        call_command('recount_stats', stdout=self.stdout)
+        call_command('rebuild_timeline', stdout=self.stdout)
+        if search.available():
+            call_command('rebuild_search_index', stdout=self.stdout)
+        self.log(
+            'Производные данные собраны за '
+            f'{time.perf_counter() - started:.1f} с'
+        )
+
+
+def generate(seed=0, stdout=None, **scale):
+    """Создаёт данные; недостающие размеры берутся из SCALE."""
+    Generator(seed, stdout).run(**{**SCALE, **scale})
+
+
+def sample():
+    """Самые нагруженные объекты данных для адресов замеров.
+
+    Автор с наибольшим числом постов, читатель с наибольшим числом
+    подписок, самая большая группа, самый обсуждаемый пост и слово
+    из его текста для поиска.
+    """
+    stats = AuthorStats.objects.select_related('user')
+    author = stats.order_by('-posts_count', 'pk').first().user
+    reader = stats.order_by('-following_count', 'pk').first().user
+    group = (
+        Group.objects.annotate(total=Count('posts'))
+        .order_by('-total', 'pk').first()
+    )
+    post = (
+        Post.objects.select_related('author')
+        .order_by('-comments_count', 'pk').first()
+    )
+    words = [word for word in re.findall(r'\w+', post.text) if len(word) > 4]
+    return {
+        'author': author,
+        'reader': reader,
+        'group': group,
+        'post': post,
+        'word': words[0] if words else post.text.split()[0],
+    }
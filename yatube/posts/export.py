@@ -0,0 +1,154 @@
+"""Потоковая выгрузка постов, комментариев и подписок.
+
+Строки читаются из базы через iterator(chunk_size=...), сразу
+превращаются в JSONL или CSV и отдаются кусками; архив zip собирается
+на лету в буфер без перемотки. Память не зависит от числа строк:
+в ней живут только текущая пачка строк и несжатый кусок вывода.
+"""
+import csv
+import zipfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Comment, Follow, Post
+
+# Набор данных: модель и выгружаемые колонки {имя в файле: путь}.
+DATASETS = {
+    'posts': (Post, {
+        'id': 'id',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'image': 'image',
+        'comments_count': 'comments_count',
+    }),
+    'comments': (Comment, {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }),
+    'follows': (Follow, {
+        'user': 'user__username',
+        'author': 'author__username',
+    }),
+}
+# Чьи строки попадают в выгрузку пользователя.
+OWNER_FIELDS = {'posts': 'author', 'comments': 'author', 'follows': 'user'}
+FORMATS = ('jsonl', 'csv')
+CHUNK_SIZE = 2000
+# Вывод отдаётся кусками не меньше этого размера.
+BUFFER_SIZE = 64 * 1024
+
+
+def rows(dataset, user=None, chunk_size=CHUNK_SIZE):
+    """Кортежи колонок набора данных по порядку id."""
+    model, columns = DATASETS[dataset]
+    queryset = model.objects.order_by('pk')
+    if user is not None:
+        queryset = queryset.filter(**{OWNER_FIELDS[dataset]: user})
+    return queryset.values_list(*columns.values()).iterator(
+        chunk_size=chunk_size
+    )
+
+
+class _Line:
+    """Файл для csv.writer: write() возвращает строку, а не пишет её."""
+
+    def write(self, value):
+        return value
+
+
+def lines(dataset, file_format, user=None, chunk_size=CHUNK_SIZE):
+    """Строки файла набора данных; у CSV первая — заголовок."""
+    names = list(DATASETS[dataset][1])
+    if file_format == 'csv':
+        writer = csv.writer(_Line())
+        yield writer.writerow(names)
+        for row in rows(dataset, user, chunk_size):
+            yield writer.writerow(row)
+        return
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows(dataset, user, chunk_size):
+        yield encoder.encode(dict(zip(names, row))) + '\n'
+
+
+def typed_lines(datasets, user=None, chunk_size=CHUNK_SIZE):
+    """Один JSONL на несколько наборов: у каждой строки есть поле type."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for dataset in datasets:
+        names = list(DATASETS[dataset][1])
+        for row in rows(dataset, user, chunk_size):
+            yield encoder.encode(
+                {'type': dataset, **dict(zip(names, row))}
+            ) + '\n'
+
+
+def buffered(lines):
+    """Склеивает строки в куски байт примерно по BUFFER_SIZE."""
+    buffer, size = [], 0
+    for line in lines:
+        data = line.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= BUFFER_SIZE:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+class _Sink:
+    """Файл без перемотки, куда zipfile пишет архив."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def zip_stream(datasets, file_format, user=None, chunk_size=CHUNK_SIZE):
+    """Архив zip с файлом на каждый набор данных, кусками байт."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for dataset in datasets:
+            name = f'{dataset}.{file_format}'
+            with archive.open(name, 'w', force_zip64=True) as entry:
+                for chunk in buffered(
+                    lines(dataset, file_format, user, chunk_size)
+                ):
+                    entry.write(chunk)
+                    data = sink.pop()
+                    if data:
+                        yield data
+    yield sink.pop()
+
+
+def stream(datasets, file_format='jsonl', compress=True, user=None,
+           chunk_size=CHUNK_SIZE):
+    """Выгрузка кусками байт.
+
+    Без архива несколько наборов пишутся только в JSONL с полем type:
+    у CSV-файлов разные колонки. Для такого сочетания ValueError.
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f'Неизвестный формат: {file_format}')
+    if compress:
+        return zip_stream(datasets, file_format, user, chunk_size)
+    if len(datasets) == 1:
+        return buffered(lines(datasets[0], file_format, user, chunk_size))
+    if file_format == 'csv':
+        raise ValueError('Несколько наборов в CSV выгружаются только в zip.')
+    return buffered(typed_lines(datasets, user, chunk_size))
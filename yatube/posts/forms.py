@@ -1,6 +1,9 @@
 from .models import Post, Comment
+from django.conf import settings
 from django.forms import ModelForm, Textarea, Select
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from core.uploads import normalize_image
 
 
 class PostForm(ModelForm):
@@ -17,6 +20,12 @@ class PostForm(ModelForm):
                 'class': 'form-control'
             })
         }
+        error_messages = {
+            # Загрузка сверх предела приходит пустой (core.uploads).
+            'image': {'empty': 'Файл пустой или больше {} МБ'.format(
+                settings.IMAGE_UPLOAD_MAX_BYTES // (1024 * 1024)
+            )},
+        }
 
     def clean_text(self):
         text = self.cleaned_data['text']
@@ -26,6 +35,12 @@ class PostForm(ModelForm):
             )
         return text
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            return normalize_image(image)
+        return image
+
 
 class CommentForm(ModelForm):
     class Meta:
@@ -0,0 +1,369 @@
+"""Нагрузка на yatube.wsgi.application прямо в процессе, без сети.
+
+Виртуальные пользователи работают в пуле потоков (или процессов) и
+шлют запросы прямо в WSGI-приложение, каждый следующий — после ответа
+на предыдущий. Поведение на каждом шаге выбирается по весам смеси:
+аноним листает ленты, читатель открывает ленту подписок, комментатор
+пишет комментарии, автор публикует посты, часть — с картинками, то
+есть с работой для пула миниатюр. Задержки копятся в гистограммах по
+имени адреса, ошибки — по статусу и исключению.
+
+Модель замкнутая: при перегрузке пользователь ждёт ответа и не шлёт
+запросы, которые пришли бы за это время, поэтому хвост задержек
+получается ниже, чем у открытого потока запросов.
+"""
+import io
+import multiprocessing
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import unquote_to_bytes, urlencode
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.signals import got_request_exception
+from django.db import connection, connections
+from django.db.models import Max, Min
+from django.dispatch import receiver
+from django.test import Client
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+from PIL import Image
+
+from core.histogram import Histogram
+from . import thumbnails
+from .models import AuthorStats, Group, Post
+
+MIX = {'anonymous': 70, 'reader': 20, 'commenter': 8, 'poster': 2}
+# Запросы анонима: лента, группа, профиль, пост.
+ANONYMOUS_WEIGHTS = (40, 20, 20, 20)
+# Доля анонимных лент не с первой страницы и наибольшая такая страница.
+DEEP_PAGE_SHARE = 0.2
+DEEP_PAGE_MAX = 10
+
+_local = threading.local()
+
+
+def parse_mix(value):
+    """Смесь из строки ``anonymous=70,reader=20``; ValueError при ошибке."""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in MIX:
+            raise ValueError(f'Неизвестное поведение: {name}')
+        mix[name] = float(weight)
+    if not any(mix.values()):
+        raise ValueError('Все веса смеси нулевые.')
+    return mix
+
+
+def session_cookie(user):
+    """Значение cookie сессии пользователя, вошедшего в систему."""
+    client = Client()
+    client.force_login(user)
+    return client.cookies[settings.SESSION_COOKIE_NAME].value
+
+
+class Dataset:
+    """Что нужно пользователям для адресов: id постов, группы, авторы
+    и сессии самых подписанных читателей. Собирается до запуска."""
+
+    def __init__(self, accounts=50, authors=500):
+        bounds = Post.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        self.first_post = bounds['first']
+        self.last_post = bounds['last']
+        groups = Group.objects.order_by('pk')
+        self.groups = list(groups.values_list('slug', flat=True))
+        self.group_ids = list(groups.values_list('pk', flat=True))
+        stats = AuthorStats.objects.select_related('user')
+        self.authors = list(
+            stats.order_by('-posts_count')
+            .values_list('user__username', flat=True)[:authors]
+        )
+        self.sessions = [
+            session_cookie(item.user)
+            for item in stats.order_by('-following_count')[:accounts]
+        ]
+
+
+class Result:
+    """Гистограммы задержек, число запросов и ошибок по имени адреса."""
+
+    def __init__(self):
+        self.histograms = defaultdict(Histogram)
+        self.requests = Counter()
+        self.errors = Counter()
+        self.reasons = Counter()
+
+    def record(self, name, seconds, status):
+        self.histograms[name].record(seconds)
+        self.requests[name] += 1
+        if status is None or status >= 400:
+            self.errors[name] += 1
+            if status is not None:
+                self.reasons[name, str(status)] += 1
+
+    def exception(self, name, error):
+        self.reasons[name, f'{type(error).__name__}: {error}'[:100]] += 1
+
+    def merge(self, other):
+        for name, histogram in other.histograms.items():
+            self.histograms[name].merge(histogram)
+        self.requests.update(other.requests)
+        self.errors.update(other.errors)
+        self.reasons.update(other.reasons)
+        return self
+
+    def total(self):
+        histogram = Histogram()
+        for item in self.histograms.values():
+            histogram.merge(item)
+        return histogram
+
+
+@receiver(got_request_exception)
+def request_failed(sender, request=None, **kwargs):
+    """Исключение, которое Django превратил в 500: запоминаем причину."""
+    result = getattr(_local, 'result', None)
+    if result is not None:
+        result.exception(_local.name, sys.exc_info()[1])
+
+
+class WSGIClient:
+    """Запросы в WSGI-приложение с cookie сессии и токеном CSRF."""
+
+    def __init__(self, application, session=None):
+        self.application = application
+        self.csrf_token = get_random_string(64)
+        cookies = {settings.CSRF_COOKIE_NAME: self.csrf_token}
+        if session:
+            cookies[settings.SESSION_COOKIE_NAME] = session
+        self.cookie = '; '.join(f'{k}={v}' for k, v in cookies.items())
+
+    def environ(self, method, target, body, content_type):
+        path, _, query = target.partition('?')
+        return {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            # Как у настоящего сервера: байты UTF-8 строкой latin-1.
+            'PATH_INFO': unquote_to_bytes(path).decode('iso-8859-1'),
+            'QUERY_STRING': query,
+            'SERVER_NAME': 'loadtest',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '10.0.0.1',
+            'HTTP_HOST': 'loadtest',
+            'HTTP_COOKIE': self.cookie,
+            'HTTP_X_CSRFTOKEN': self.csrf_token,
+            'CONTENT_TYPE': content_type,
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': io.StringIO(),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+
+    def request(self, method, target, data=None, multipart=False):
+        """Статус ответа; тело дочитывается, как это сделал бы сервер."""
+        body, content_type = b'', ''
+        if data is not None and multipart:
+            body = encode_multipart(BOUNDARY, data)
+            content_type = MULTIPART_CONTENT
+        elif data is not None:
+            body = urlencode(data).encode()
+            content_type = 'application/x-www-form-urlencoded'
+        status = []
+
+        def start_response(value, headers, exc_info=None):
+            status.append(int(value.split()[0]))
+
+        result = self.application(
+            self.environ(method, target, body, content_type), start_response
+        )
+        try:
+            for _ in result:
+                pass
+        finally:
+            close = getattr(result, 'close', None)
+            if close is not None:
+                close()
+        return status[0]
+
+
+def visit(client, result, name, target, method='GET', data=None,
+          multipart=False):
+    """Запрос с замером: задержка, статус и исключение уходят в result."""
+    _local.result, _local.name = result, name
+    started = time.perf_counter()
+    try:
+        status = client.request(method, target, data, multipart)
+    except Exception as error:
+        status = None
+        result.exception(name, error)
+    finally:
+        _local.result = None
+    result.record(name, time.perf_counter() - started, status)
+
+
+def url(name, kwargs=None, query=None):
+    return reverse(name, kwargs=kwargs) + (
+        '?' + urlencode(query) if query else ''
+    )
+
+
+class VirtualUser:
+    def __init__(self, application, dataset, mix, rng, result,
+                 image_share):
+        self.application = application
+        self.dataset = dataset
+        self.behaviours = list(mix)
+        self.weights = list(mix.values())
+        self.rng = rng
+        self.result = result
+        self.image_share = image_share
+        self.anonymous_client = WSGIClient(application)
+
+    def step(self):
+        behaviour = self.rng.choices(self.behaviours, self.weights)[0]
+        getattr(self, behaviour)()
+
+    def visit(self, client, name, target, method='GET', data=None,
+              multipart=False):
+        visit(client, self.result, name, target, method, data, multipart)
+
+    def logged_in(self):
+        return WSGIClient(
+            self.application, self.rng.choice(self.dataset.sessions)
+        )
+
+    def post_id(self):
+        return {'post_id': self.rng.randint(
+            self.dataset.first_post, self.dataset.last_post
+        )}
+
+    def anonymous(self):
+        client, rng = self.anonymous_client, self.rng
+        kind = rng.choices(range(4), ANONYMOUS_WEIGHTS)[0]
+        if kind == 0:
+            page = 1
+            if rng.random() < DEEP_PAGE_SHARE:
+                page = rng.randint(2, DEEP_PAGE_MAX)
+            self.visit(client, 'posts:index', url(
+                'posts:index', query={'page': page} if page > 1 else None
+            ))
+        elif kind == 1 and self.dataset.groups:
+            slug = rng.choice(self.dataset.groups)
+            self.visit(client, 'posts:group_list', url(
+                'posts:group_list', {'slug': slug}
+            ))
+        elif kind == 2 and self.dataset.authors:
+            username = rng.choice(self.dataset.authors)
+            self.visit(client, 'posts:profile', url(
+                'posts:profile', {'username': username}
+            ))
+        else:
+            self.visit(client, 'posts:post_detail', url(
+                'posts:post_detail', self.post_id()
+            ))
+
+    def reader(self):
+        client = self.logged_in()
+        self.visit(client, 'posts:follow_index', url('posts:follow_index'))
+        if self.rng.random() < DEEP_PAGE_SHARE:
+            self.visit(client, 'posts:follow_index', url(
+                'posts:follow_index', query={'page': 2}
+            ))
+        self.visit(client, 'posts:post_detail', url(
+            'posts:post_detail', self.post_id()
+        ))
+
+    def commenter(self):
+        client = self.logged_in()
+        kwargs = self.post_id()
+        self.visit(client, 'posts:post_detail', url(
+            'posts:post_detail', kwargs
+        ))
+        self.visit(
+            client, 'posts:add_comment', url('posts:add_comment', kwargs),
+            'POST', {'text': f'Комментарий {self.rng.random()}'},
+        )
+
+    def poster(self):
+        client = self.logged_in()
+        self.visit(client, 'posts:post_create', url('posts:post_create'))
+        data = {'text': f'Пост под нагрузкой {self.rng.random()}'}
+        if self.dataset.group_ids and self.rng.random() < 0.5:
+            data['group'] = self.rng.choice(self.dataset.group_ids)
+        if self.rng.random() < self.image_share:
+            data['image'] = self.image()
+        self.visit(
+            client, 'posts:post_create', url('posts:post_create'),
+            'POST', data, multipart=True,
+        )
+
+    def image(self):
+        """Картинка со случайным цветом: у каждой свои миниатюры."""
+        color = tuple(self.rng.randrange(256) for _ in range(3))
+        buffer = io.BytesIO()
+        Image.new('RGB', (1200, 800), color).save(buffer, 'JPEG')
+        return SimpleUploadedFile(
+            'load.jpg', buffer.getvalue(), content_type='image/jpeg'
+        )
+
+
+def _worker(dataset, mix, duration, seed, image_share, in_child):
+    from yatube.wsgi import application
+
+    result = Result()
+    user = VirtualUser(
+        application, dataset, mix, random.Random(seed), result, image_share
+    )
+    deadline = time.monotonic() + duration
+    try:
+        while time.monotonic() < deadline:
+            user.step()
+    finally:
+        connection.close()
+        if in_child:
+            # Процесс завершается: дожидаемся своих миниатюр.
+            thumbnails.shutdown()
+    return result
+
+
+def run(dataset, mix=MIX, concurrency=8, duration=10.0, processes=False,
+        seed=0, image_share=0.3):
+    """Запускает concurrency пользователей на duration секунд.
+
+    Возвращает сумму результатов и фактическую длительность. С
+    processes пользователи работают в отдельных процессах (fork): у
+    каждого свой LocMemCache и своё соединение с базой.
+    """
+    jobs = [
+        (dataset, mix, duration, seed + index, image_share, processes)
+        for index in range(concurrency)
+    ]
+    started = time.perf_counter()
+    if processes:
+        # Открытое соединение не должно достаться потомкам.
+        connections.close_all()
+        pool = ProcessPoolExecutor(
+            concurrency, mp_context=multiprocessing.get_context('fork')
+        )
+    else:
+        pool = ThreadPoolExecutor(concurrency)
+    with pool:
+        results = list(pool.map(_worker, *zip(*jobs)))
+    elapsed = time.perf_counter() - started
+    thumbnails.shutdown()
+    total = Result()
+    for result in results:
+        total.merge(result)
+    return total, elapsed
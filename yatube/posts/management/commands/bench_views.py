@@ -0,0 +1,107 @@
+import json
+import platform
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from posts import bench, benchdata
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время, число SQL-запросов и время в базе для каждого '
+        'представления posts и users на синтетических данных заданного '
+        'размера и сравнивает итог с сохранённым прошлым замером.'
+    )
+
+    def add_arguments(self, parser):
+        benchdata.add_arguments(parser)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='Не очищать кеш перед запросами.',
+        )
+        parser.add_argument(
+            '--only', action='append', default=[],
+            help='Замерить только это имя адреса (posts:index); '
+                 'можно повторять.',
+        )
+        parser.add_argument('--output', help='Записать итог в файл JSON.')
+        parser.add_argument(
+            '--baseline', help='Сравнить с итогом прошлого замера.'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый рост времени, доля (0.2 — на 20%%).',
+        )
+        parser.add_argument(
+            '--min-delta', type=float, default=1.0,
+            help='Рост времени меньше стольких мс не считается регрессией.',
+        )
+
+    def handle(self, *args, repeat, warmup, warm, only, output, baseline,
+               threshold, min_delta, **options):
+        try:
+            scale = benchdata.prepare_from_options(options, self.stdout)
+        except ValueError as error:
+            raise CommandError(f'{error}; запустите с --regenerate.')
+        scenarios = bench.scenarios(benchdata.sample())
+        for name in sorted(bench.missing(scenarios)):
+            self.stderr.write(f'Нет сценария замера для {name}')
+        if only:
+            scenarios = [item for item in scenarios if item.name in only]
+        results = {}
+        # Без DEBUG: иначе включается debug_toolbar и копятся запросы.
+        with override_settings(DEBUG=False):
+            for scenario in scenarios:
+                result = bench.measure(scenario, repeat, warmup, not warm)
+                results[scenario.label] = result
+                self.stdout.write(self.format(scenario.label, result))
+        report = {
+            'meta': {
+                'scale': scale,
+                'seed': options['seed'],
+                'repeat': repeat,
+                'cache': 'warm' if warm else 'cold',
+                'created': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'results': results,
+        }
+        if output:
+            with open(output, 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        if baseline:
+            self.check_baseline(report, baseline, threshold, min_delta)
+
+    def format(self, label, result):
+        budget = result['query_budget']
+        return (
+            f'{label}: {result["wall_ms"]:.1f} мс '
+            f'(p95 {result["wall_p95_ms"]:.1f}), '
+            f'SQL {result["queries"]}'
+            + (f'/{budget}' if budget is not None else '')
+            + f' за {result["sql_ms"]:.1f} мс, '
+            f'статус {",".join(map(str, result["status"]))}'
+        )
+
+    def check_baseline(self, report, path, threshold, min_delta):
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)
+        if baseline['meta']['scale'] != report['meta']['scale']:
+            self.stderr.write(
+                'Прошлый замер сделан на данных другого размера: '
+                f'{baseline["meta"]["scale"]}'
+            )
+        regressions = bench.compare(
+            report['results'], baseline['results'], threshold, min_delta
+        )
+        for line in regressions:
+            self.stderr.write(line)
+        if regressions:
+            raise CommandError(f'Регрессий: {len(regressions)}')
+        self.stdout.write('Регрессий нет.')
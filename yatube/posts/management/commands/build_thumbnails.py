@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Строит недостающие миниатюры картинок постов.'
+
+    def handle(self, *args, **options):
+        built = 0
+        images = (
+            Post.objects.exclude(image='')
+            .values_list('image', flat=True).distinct()
+        )
+        for image in images.iterator():
+            missing = [
+                name for name in settings.THUMBNAIL_GEOMETRIES
+                if thumbnails.find_thumbnail(image, name) is None
+            ]
+            if missing:
+                thumbnails.generate(image)
+                built += 1
+        self.stdout.write(f'Построены миниатюры для картинок: {built}')
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import media, thumbnails
+from posts.models import Post
+from posts.signals import bump_post_pages
+
+
+class Command(BaseCommand):
+    help = (
+        'Переименовывает картинки постов по хешу содержимого, сводит '
+        'одинаковые файлы в один и удаляет лишние копии.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет сделано.',
+        )
+
+    def handle(self, *args, dry_run, **options):
+        field = Post._meta.get_field('image')
+        storage = field.storage
+        directory = field.upload_to.rstrip('/')
+        referenced = set(
+            Post.objects.exclude(image='')
+            .values_list('image', flat=True).distinct()
+        )
+        renamed = duplicates = orphans = 0
+        for filename in sorted(storage.listdir(directory)[1]):
+            name = f'{directory}/{filename}'
+            with storage.open(name) as content:
+                target = storage.hashed_name(name, content)
+            if target == name:
+                continue
+            if name not in referenced:
+                # На файл никто не ссылается: трогать его не наше дело.
+                orphans += 1
+                continue
+            if storage.exists(target) or target in referenced:
+                duplicates += 1
+            renamed += 1
+            referenced.add(target)
+            if not dry_run:
+                self.move(storage, name, target)
+        self.stdout.write(
+            f'Переименовано: {renamed}, из них дубликатов: {duplicates}, '
+            f'файлов без ссылок: {orphans}'
+            + (' (ничего не изменено)' if dry_run else '')
+        )
+
+    def move(self, storage, name, target):
+        with transaction.atomic():
+            if not storage.exists(target):
+                with storage.open(name) as content:
+                    storage.save(target, content)
+            posts = list(
+                Post.objects.filter(image=name)
+                .only('pk', 'author_id', 'group_id')
+            )
+            Post.objects.filter(image=name).update(image=target)
+            for post in posts:
+                bump_post_pages(post)
+                # Миниатюры старого имени удалит release().
+                post.image = target
+                thumbnails.enqueue(post)
+            # Старый файл и его миниатюры удалятся после коммита.
+            media.release(name)
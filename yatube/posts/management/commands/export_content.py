@@ -0,0 +1,65 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты, комментарии и подписки (всего сайта или одного '
+        'пользователя) в JSONL или CSV, по желанию в zip, не загружая '
+        'строки в память целиком.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dataset', action='append', choices=list(export.DATASETS),
+            help='Набор данных; можно указать несколько раз. '
+                 'По умолчанию все.',
+        )
+        parser.add_argument(
+            '--format', dest='file_format', choices=export.FORMATS,
+            default='jsonl',
+        )
+        parser.add_argument('--zip', action='store_true')
+        parser.add_argument('--user', help='username владельца данных.')
+        parser.add_argument(
+            '--output', default='-', help='Файл; по умолчанию stdout.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=export.CHUNK_SIZE,
+            help='Строк в одной выборке из базы.',
+        )
+
+    def handle(self, *args, dataset, file_format, zip, user, output,
+               chunk_size, **options):
+        datasets = dataset or list(export.DATASETS)
+        owner = None
+        if user:
+            owner = User.objects.filter(username=user).first()
+            if owner is None:
+                raise CommandError(f'Пользователь {user} не найден.')
+        try:
+            chunks = export.stream(
+                datasets, file_format, zip, owner, chunk_size
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        written = 0
+        if output == '-':
+            target = sys.stdout.buffer
+            written = self.write(chunks, target)
+            target.flush()
+        else:
+            with open(output, 'wb') as target:
+                written = self.write(chunks, target)
+        self.stderr.write(f'Записано байт: {written}')
+
+    def write(self, chunks, target):
+        written = 0
+        for chunk in chunks:
+            target.write(chunk)
+            written += len(chunk)
+        return written
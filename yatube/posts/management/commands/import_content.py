@@ -0,0 +1,336 @@
+import csv
+import json
+import sys
+import time
+from collections import Counter
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.cache import bump
+from posts import search
+from posts.models import Comment, Follow, Group, Post, User
+from .recount_stats import chunked_pks
+
+
+def read_rows(path):
+    """Строки JSONL или CSV (по расширению); ``-`` — JSONL из stdin."""
+    if path == '-':
+        yield from _json_lines(sys.stdin)
+        return
+    with open(path, encoding='utf-8', newline='') as file:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(file)
+        else:
+            yield from _json_lines(file)
+
+
+def _json_lines(file):
+    for line in file:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_date(value):
+    """Дата из ISO 8601; без пояса — в TIME_ZONE, без значения — сейчас."""
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(value)
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def insert_rows(model, objects, batch_size):
+    """INSERT пачками через bulk_create, в обход save() и сигналов.
+
+    Как и loaddata, оставляет даты с auto_now_add из объектов, а не
+    заменяет их текущим временем. Флаг полей снимается на время вставки:
+    во время загрузки никто больше в базу не пишет.
+    """
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        model.objects.bulk_create(objects, batch_size=batch_size)
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты, комментарии и подписки из JSONL или CSV пачками '
+        'без сигналов, затем один раз пересобирает счётчики, ленты и '
+        'поисковый индекс. Во время загрузки в базу никто не пишет.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts',
+            help='id, author, group, text, pub_date, image; id нужен, '
+                 'чтобы на пост ссылались комментарии.',
+        )
+        parser.add_argument(
+            '--comments',
+            help='post (id из --posts или id поста в базе), author, text, '
+                 'created.',
+        )
+        parser.add_argument('--follows', help='user, author.')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Строк в одном INSERT.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help='Строк в одной транзакции.',
+        )
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Создавать неизвестных авторов без пароля.',
+        )
+
+    def handle(self, *args, posts, comments, follows, batch_size,
+               chunk_size, create_users, **options):
+        if not (posts or comments or follows):
+            raise CommandError('Укажите --posts, --comments или --follows.')
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.create_users = create_users
+        self.users = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.post_ids = {}
+        self.existing_posts = set()
+        self.next_pk = {
+            model: (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+            for model in (Post, Comment)
+        }
+        self.first_post_pk = self.next_pk[Post]
+        self.commented = set()
+        self.scopes = {'posts', 'groups'}
+        self.skipped = Counter()
+        if posts:
+            self.load('Посты', posts, self.build_post, ('author',))
+        if comments:
+            self.load(
+                'Комментарии', comments, self.build_comment, ('author',),
+                prepare=self.load_comment_posts,
+            )
+        if follows:
+            self.load(
+                'Подписки', follows, self.build_follow, ('user', 'author'),
+                prepare=self.load_follows,
+            )
+        self.reset_sequences()
+        self.rebuild()
+        if self.skipped:
+            self.stdout.write('Пропущено: ' + ', '.join(
+                f'{reason} — {count}'
+                for reason, count in sorted(self.skipped.items())
+            ))
+
+    def load(self, label, path, build, user_fields, prepare=None):
+        started = time.perf_counter()
+        total = 0
+        for chunk in chunks(read_rows(path), self.chunk_size):
+            with transaction.atomic():
+                self.resolve_users(chunk, user_fields)
+                if prepare is not None:
+                    prepare(chunk)
+                objects = [
+                    obj for obj in map(build, chunk) if obj is not None
+                ]
+                if objects:
+                    insert_rows(type(objects[0]), objects, self.batch_size)
+            total += len(objects)
+            self.report(label, total, started)
+
+    def report(self, label, total, started):
+        rate = total / max(time.perf_counter() - started, 1e-9)
+        self.stdout.write(f'{label}: {total} строк, {rate:.0f} строк/с')
+
+    def resolve_users(self, chunk, user_fields):
+        """Создаёт неизвестных пользователей пачки одним INSERT."""
+        if not self.create_users:
+            return
+        missing = {
+            row[field] for row in chunk for field in user_fields
+            if row.get(field) and row[field] not in self.users
+        }
+        if not missing:
+            return
+        password = make_password(None)
+        User.objects.bulk_create(
+            [User(username=name, password=password) for name in missing],
+            batch_size=self.batch_size,
+        )
+        self.users.update(
+            User.objects.filter(username__in=missing)
+            .values_list('username', 'pk')
+        )
+
+    def take_pk(self, model):
+        pk = self.next_pk[model]
+        self.next_pk[model] += 1
+        return pk
+
+    def user_id(self, row, field):
+        user_id = self.users.get(row.get(field))
+        if user_id is None:
+            self.skipped['неизвестный пользователь'] += 1
+        return user_id
+
+    def build_post(self, row):
+        author_id = self.user_id(row, 'author')
+        if author_id is None:
+            return None
+        group_id = None
+        if row.get('group'):
+            group_id = self.groups.get(row['group'])
+            if group_id is None:
+                self.skipped['неизвестная группа'] += 1
+                return None
+            self.scopes.add(f'group:{row["group"]}')
+        try:
+            pub_date = parse_date(row.get('pub_date'))
+        except ValueError:
+            self.skipped['неверная дата'] += 1
+            return None
+        pk = self.take_pk(Post)
+        if row.get('id') not in (None, ''):
+            self.post_ids[str(row['id'])] = pk
+        self.scopes.add(f'profile:{row["author"]}')
+        return Post(
+            pk=pk,
+            author_id=author_id,
+            group_id=group_id,
+            text=row.get('text') or '',
+            pub_date=pub_date,
+            image=row.get('image') or '',
+        )
+
+    def load_comment_posts(self, chunk):
+        """Посты из базы, на которые ссылается пачка, одним запросом.
+
+        Ссылка сначала ищется среди постов этой загрузки, затем — среди
+        id постов в базе.
+        """
+        pks = set()
+        for row in chunk:
+            post = str(row.get('post'))
+            if post not in self.post_ids and post.isdigit():
+                pks.add(int(post))
+        self.existing_posts = set(
+            Post.objects.filter(pk__in=pks).values_list('pk', flat=True)
+        )
+
+    def build_comment(self, row):
+        post = str(row.get('post'))
+        post_id = self.post_ids.get(post)
+        if post_id is None and post.isdigit() and (
+            int(post) in self.existing_posts
+        ):
+            post_id = int(post)
+        if post_id is None:
+            self.skipped['комментарий к неизвестному посту'] += 1
+            return None
+        author_id = self.user_id(row, 'author')
+        if author_id is None:
+            return None
+        try:
+            created = parse_date(row.get('created'))
+        except ValueError:
+            self.skipped['неверная дата'] += 1
+            return None
+        self.commented.add(post_id)
+        if post_id < self.first_post_pk:
+            # Страницы новых постов ещё не могли попасть в кеш.
+            self.scopes.add(f'post:{post_id}')
+        return Comment(
+            pk=self.take_pk(Comment),
+            post_id=post_id,
+            author_id=author_id,
+            text=row.get('text') or '',
+            created=created,
+        )
+
+    def build_follow(self, row):
+        user_id = self.user_id(row, 'user')
+        author_id = self.user_id(row, 'author')
+        if user_id is None or author_id is None:
+            return None
+        if user_id == author_id:
+            self.skipped['подписка на себя'] += 1
+            return None
+        if (user_id, author_id) in self.follows:
+            self.skipped['повторная подписка'] += 1
+            return None
+        self.follows.add((user_id, author_id))
+        self.scopes.add(f'profile:{row["author"]}')
+        return Follow(user_id=user_id, author_id=author_id)
+
+    def load_follows(self, chunk):
+        """Уже существующие подписки пользователей пачки одним запросом."""
+        user_ids = {self.users.get(row.get('user')) for row in chunk}
+        self.follows = set(
+            Follow.objects.filter(user_id__in=user_ids - {None})
+            .values_list('user_id', 'author_id')
+        )
+
+    def reset_sequences(self):
+        """Id постов и комментариев заданы явно: догоняем счётчики id."""
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [Post, Comment]
+        )
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def rebuild(self):
+        started = time.perf_counter()
+        call_command('recount_stats', stdout=self.stdout)
+        call_command('rebuild_timeline', stdout=self.stdout)
+        if search.available():
+            imported = Post.objects.filter(
+                pk__gte=self.first_post_pk, pk__lt=self.next_pk[Post]
+            )
+            batches = list(chunked_pks(imported, self.batch_size))
+            older = sorted(
+                pk for pk in self.commented if pk < self.first_post_pk
+            )
+            batches += [
+                older[start:start + self.batch_size]
+                for start in range(0, len(older), self.batch_size)
+            ]
+            for pks in batches:
+                with transaction.atomic():
+                    search.index_posts(
+                        Post.objects.filter(pk__in=pks).only('pk', 'text')
+                    )
+        bump(*self.scopes)
+        self.stdout.write(
+            'Производные данные пересобраны за '
+            f'{time.perf_counter() - started:.1f} с'
+        )
@@ -0,0 +1,196 @@
+import json
+import os
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from core.backends.sqlite3.base import STOCK_PRAGMAS
+from posts import benchdata, loadtest
+
+COLUMNS = ('p50', 'p95', 'p99', 'p100')
+SQLITE_PROFILES = ('stock', 'tuned')
+
+
+@contextmanager
+def media_root(path):
+    """Загрузки под нагрузкой пишутся во временный каталог.
+
+    Не override_settings: по сигналу setting_changed миниатюры начинают
+    строиться прямо в запросе (так удобно тестам), а замерять нужно
+    рабочий режим с пулом. Хранилища читают MEDIA_ROOT при первом
+    обращении, а до запуска нагрузки к ним никто не обращается.
+    """
+    previous = settings.MEDIA_ROOT
+    settings.MEDIA_ROOT = path
+    try:
+        yield
+    finally:
+        settings.MEDIA_ROOT = previous
+
+
+@contextmanager
+def sqlite_profile(name):
+    """stock — SQLite как из коробки: PRAGMA по умолчанию, BEGIN
+    DEFERRED и новое соединение на каждый запрос; tuned — настройки
+    из DATABASES. Действует на соединения, открытые внутри блока."""
+    settings_dict = connection.settings_dict
+    previous = settings_dict['OPTIONS'], settings_dict['CONN_MAX_AGE']
+    if name == 'stock':
+        settings_dict['OPTIONS'] = {
+            'pragmas': STOCK_PRAGMAS, 'transaction_mode': 'DEFERRED'
+        }
+        settings_dict['CONN_MAX_AGE'] = 0
+    try:
+        yield
+    finally:
+        settings_dict['OPTIONS'], settings_dict['CONN_MAX_AGE'] = previous
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает yatube.wsgi.application в процессе, без сети: '
+        'виртуальные пользователи в потоках или процессах по смеси '
+        'поведений. Выводит пропускную способность, перцентили задержек '
+        'и долю ошибок по каждому адресу.'
+    )
+
+    def add_arguments(self, parser):
+        benchdata.add_arguments(parser)
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Число одновременных виртуальных пользователей.',
+        )
+        parser.add_argument(
+            '--duration', type=float, default=10.0, help='Секунд нагрузки.'
+        )
+        parser.add_argument(
+            '--processes', action='store_true',
+            help='Пользователи в отдельных процессах, а не в потоках.',
+        )
+        parser.add_argument(
+            '--mix',
+            default=','.join(
+                f'{name}={weight}' for name, weight in loadtest.MIX.items()
+            ),
+            help='Веса поведений: anonymous, reader, commenter, poster.',
+        )
+        parser.add_argument(
+            '--accounts', type=int, default=50,
+            help='Сколько читателей с наибольшим числом подписок '
+                 'используют вошедшие пользователи.',
+        )
+        parser.add_argument(
+            '--image-share', type=float, default=0.3,
+            help='Доля новых постов с картинкой.',
+        )
+        parser.add_argument(
+            '--sqlite', choices=SQLITE_PROFILES + ('both',),
+            default='tuned',
+            help='Настройки SQLite: stock — как из коробки, tuned — WAL, '
+                 'PRAGMA и постоянные соединения, both — оба прогона '
+                 'подряд для сравнения.',
+        )
+        parser.add_argument('--output', help='Записать итог в файл JSON.')
+
+    def handle(self, *args, concurrency, duration, processes, mix,
+               accounts, image_share, sqlite, output, **options):
+        try:
+            mix = loadtest.parse_mix(mix)
+            scale = benchdata.prepare_from_options(options, self.stdout)
+        except ValueError as error:
+            raise CommandError(error)
+        profiles = SQLITE_PROFILES if sqlite == 'both' else (sqlite,)
+        report = {}
+        for profile in profiles:
+            if len(profiles) > 1:
+                self.stdout.write(f'SQLite {profile}:')
+            # Каждый прогон — на свежей копии данных.
+            with sqlite_profile(profile), benchdata.scratch_copy(
+                options['database']
+            ) as workdir:
+                dataset = loadtest.Dataset(accounts)
+                media = os.path.join(workdir, 'media')
+                # Без DEBUG: иначе включается debug_toolbar.
+                with override_settings(DEBUG=False), media_root(media):
+                    result, elapsed = loadtest.run(
+                        dataset, mix, concurrency, duration, processes,
+                        options['seed'], image_share,
+                    )
+            report[profile] = self.report(result, elapsed)
+        if len(profiles) > 1:
+            self.compare(report['stock'], report['tuned'])
+        report['meta'] = {
+            'scale': scale,
+            'mix': mix,
+            'concurrency': concurrency,
+            'processes': processes,
+            'duration': duration,
+        }
+        if output:
+            with open(output, 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def report(self, result, elapsed):
+        total = result.total()
+        errors = sum(result.errors.values())
+        self.stdout.write(
+            f'Запросов: {total.count} за {elapsed:.1f} с, '
+            f'{total.count / elapsed:.1f} запросов/с, '
+            f'ошибок {self.rate(errors, total.count)}'
+        )
+        self.stdout.write(
+            f'{"адрес":<28}{"запросов":>9}{"ошибок":>9}'
+            + ''.join(f'{column:>9}' for column in COLUMNS) + '  (мс)'
+        )
+        routes = {}
+        rows = sorted(result.histograms.items()) + [('всего', total)]
+        for name, histogram in rows:
+            summary = histogram.summary()
+            failed = (
+                errors if histogram is total else result.errors[name]
+            )
+            self.stdout.write(
+                f'{name:<28}{histogram.count:>9}'
+                f'{self.rate(failed, histogram.count):>9}'
+                + ''.join(
+                    f'{summary[column] * 1000:>9.1f}' for column in COLUMNS
+                )
+            )
+            routes[name] = {
+                'requests': histogram.count,
+                'errors': failed,
+                'mean_ms': round(histogram.mean() * 1000, 3),
+                **{
+                    f'{key}_ms': round(value * 1000, 3)
+                    for key, value in summary.items()
+                },
+            }
+        if result.reasons:
+            self.stdout.write('Ошибки:')
+        for (name, reason), count in result.reasons.most_common():
+            self.stdout.write(f'  {name}: {reason} — {count}')
+        return {
+            'elapsed': round(elapsed, 3),
+            'throughput': round(total.count / elapsed, 3),
+            'routes': routes,
+            'errors': [
+                {'route': name, 'reason': reason, 'count': count}
+                for (name, reason), count in result.reasons.most_common()
+            ],
+        }
+
+    def compare(self, stock, tuned):
+        before, after = stock['routes']['всего'], tuned['routes']['всего']
+        self.stdout.write(
+            'tuned против stock: '
+            f'{tuned["throughput"] / stock["throughput"]:.2f}× запросов/с, '
+            f'p99 {before["p99_ms"]:.1f} → {after["p99_ms"]:.1f} мс, '
+            f'ошибок {before["errors"]} → {after["errors"]}'
+        )
+
+    @staticmethod
+    def rate(errors, count):
+        return f'{errors / count * 100 if count else 0:.1f}%'
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import search
+from posts.models import Post
+from .recount_stats import chunked_pks
+
+
+class Command(BaseCommand):
+    help = 'Заново собирает полнотекстовый индекс постов пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        if not search.available():
+            raise CommandError('Полнотекстовый индекс есть только в SQLite.')
+        indexed = 0
+        search.clear()
+        for pks in chunked_pks(Post.objects, batch_size):
+            with transaction.atomic():
+                search.index_posts(
+                    Post.objects.filter(pk__in=pks).only('pk', 'text')
+                )
+            indexed += len(pks)
+        self.stdout.write(f'Проиндексировано постов: {indexed}')
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import timeline
+from posts.models import Follow, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Заново собирает материализованные ленты подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Собрать ленту только этого пользователя (username).',
+        )
+
+    def handle(self, *args, user=None, **options):
+        follows = Follow.objects.order_by('user_id', 'author_id')
+        entries = TimelineEntry.objects.all()
+        if user:
+            follows = follows.filter(user__username=user)
+            entries = entries.filter(user__username=user)
+        pairs = follows.values_list('user_id', 'author_id').distinct()
+        rebuilt = 0
+        with transaction.atomic():
+            entries.delete()
+            if user:
+                for user_id, author_id in pairs.iterator():
+                    timeline.backfill_follow(user_id, author_id)
+                    rebuilt += 1
+            else:
+                # Все ленты сразу: по запросу на автора, а не на подписку.
+                authors = (
+                    follows.order_by('author_id')
+                    .values_list('author_id', flat=True).distinct()
+                )
+                for author_id in authors.iterator():
+                    timeline.backfill_all_followers(author_id)
+                rebuilt = pairs.count()
+        self.stdout.write(f'Пересобрано подписок: {rebuilt}')
@@ -0,0 +1,121 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts import timeline
+from posts.models import AuthorStats, Comment, Follow, Post, User
+
+STATS_FIELDS = ('posts_count', 'followers_count', 'following_count')
+
+
+def count_by(queryset, field):
+    """Словарь {значение field: число строк} одним GROUP BY."""
+    return dict(
+        queryset.order_by().values_list(field).annotate(total=Count('pk'))
+    )
+
+
+def chunked_pks(queryset, batch_size):
+    """Идёт по первичным ключам пачками, не держа их все в памяти."""
+    last_pk = 0
+    while True:
+        pks = list(
+            queryset.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            return
+        yield pks
+        last_pk = pks[-1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики постов, подписок и комментариев, '
+        'исправляет расхождения и раскладывает посты авторов, '
+        'опустившихся ниже TIMELINE_FANOUT_LIMIT.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать число расхождений.',
+        )
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        authors = self.repair_author_stats(batch_size, dry_run)
+        posts = self.repair_comment_counts(batch_size, dry_run)
+        if not dry_run:
+            # Исправленный счётчик мог опустить автора ниже предела.
+            demoted = timeline.materialize_demoted()
+            if demoted:
+                self.stdout.write(f'Разложены ленты авторов: {demoted}')
+        self.stdout.write(
+            f'Расхождений: счётчики авторов — {authors}, '
+            f'комментарии постов — {posts}'
+            + (' (ничего не изменено)' if dry_run else '')
+        )
+
+    def repair_author_stats(self, batch_size, dry_run):
+        posts = count_by(Post.objects, 'author')
+        followers = count_by(Follow.objects, 'author')
+        following = count_by(Follow.objects, 'user')
+        repaired = 0
+        for pks in chunked_pks(User.objects, batch_size):
+            existing = AuthorStats.objects.in_bulk(pks)
+            to_create, to_update = [], []
+            for pk in pks:
+                expected = (
+                    posts.get(pk, 0),
+                    followers.get(pk, 0),
+                    following.get(pk, 0),
+                )
+                stats = existing.get(pk)
+                if stats is None:
+                    stats = AuthorStats(user_id=pk)
+                    to_create.append(stats)
+                elif expected == tuple(
+                    getattr(stats, field) for field in STATS_FIELDS
+                ):
+                    continue
+                else:
+                    to_update.append(stats)
+                for field, value in zip(STATS_FIELDS, expected):
+                    setattr(stats, field, value)
+            repaired += len(to_create) + len(to_update)
+            if dry_run:
+                continue
+            with transaction.atomic():
+                AuthorStats.objects.bulk_create(to_create)
+                AuthorStats.objects.bulk_update(to_update, STATS_FIELDS)
+        return repaired
+
+    def repair_comment_counts(self, batch_size, dry_run):
+        # Одним UPDATE с подзапросом: bulk_update строил бы CASE на
+        # каждую строку пачки.
+        actual = Coalesce(Subquery(
+            Comment.objects.filter(post=OuterRef('pk'))
+            .order_by()
+            .values('post')
+            .annotate(total=Count('pk'))
+            .values('total')
+        ), 0)
+        repaired = 0
+        for pks in chunked_pks(Post.objects, batch_size):
+            drifted = [
+                pk for pk, stored, counted in Post.objects.filter(pk__in=pks)
+                .order_by()
+                .annotate(counted=Count('comments'))
+                .values_list('pk', 'comments_count', 'counted')
+                if stored != counted
+            ]
+            repaired += len(drifted)
+            if drifted and not dry_run:
+                Post.objects.filter(pk__in=drifted).update(
+                    comments_count=actual
+                )
+        return repaired
@@ -0,0 +1,150 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from posts import benchdata, loadtest, replay
+
+COLUMNS = ('p50', 'p95', 'p99')
+
+
+class Command(BaseCommand):
+    help = (
+        'Повторяет журнал доступа в формате combined на '
+        'yatube.wsgi.application: адреса posts, users и about с id из '
+        'данных замеров, по времени журнала или с ускорением. Выводит '
+        'перцентили задержек по адресам рядом с временем из журнала.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'log', help='Файл журнала, .gz или - для стандартного ввода.'
+        )
+        benchdata.add_arguments(parser)
+        parser.add_argument(
+            '--speed', type=float, default=1.0,
+            help='Ускорение относительно журнала: 2 — вдвое быстрее, '
+                 '0 — без пауз.',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help='Сколько запросов обрабатывается одновременно.',
+        )
+        parser.add_argument(
+            '--accounts', type=int, default=50,
+            help='Сколько сессий получают пользователи из журнала.',
+        )
+        parser.add_argument(
+            '--log-time-unit', choices=sorted(replay.TIME_UNITS),
+            default='s',
+            help='Единица времени ответа в конце строки журнала: s для '
+                 '$request_time nginx, us для %%D Apache.',
+        )
+        parser.add_argument(
+            '--limit', type=int, help='Повторить только первые строки.'
+        )
+        parser.add_argument('--output', help='Записать итог в файл JSON.')
+
+    def handle(self, *args, log, speed, concurrency, accounts,
+               log_time_unit, limit, output, **options):
+        if speed < 0:
+            raise CommandError('--speed не может быть отрицательным.')
+        try:
+            scale = benchdata.prepare_from_options(options, self.stdout)
+        except ValueError as error:
+            raise CommandError(f'{error}; запустите с --regenerate.')
+        from yatube.wsgi import application
+
+        # Сессии и выход из учётных записей пишут в базу: работаем с копией.
+        with benchdata.scratch_copy(options['database']):
+            dataset = loadtest.Dataset(accounts)
+            rewriter = replay.Rewriter(dataset, random.Random(options['seed']))
+            try:
+                plan = replay.Replay(rewriter, log_time_unit).load(
+                    replay.read_log(log), limit
+                )
+            except OSError as error:
+                raise CommandError(error)
+            if not plan.jobs:
+                raise CommandError('В журнале нет запросов для повтора.')
+            self.stdout.write(
+                f'Запросов к повтору: {len(plan.jobs)} '
+                f'за {plan.span:.1f} с журнала'
+            )
+            # Без DEBUG: иначе включается debug_toolbar и копятся запросы.
+            with override_settings(DEBUG=False):
+                result, lag, elapsed = plan.run(
+                    application, speed, concurrency
+                )
+        report = self.report(plan, result, lag, elapsed)
+        report['meta'] = {
+            'log': log,
+            'scale': scale,
+            'speed': speed,
+            'concurrency': concurrency,
+            'skipped': dict(plan.skipped),
+        }
+        if output:
+            with open(output, 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def report(self, plan, result, lag, elapsed):
+        total = result.total()
+        self.stdout.write(
+            f'Повторено {total.count} за {elapsed:.1f} с, '
+            f'{total.count / elapsed:.1f} запросов/с'
+        )
+        for reason, count in plan.skipped.most_common():
+            self.stdout.write(f'Пропущено ({reason}): {count}')
+        if lag.count:
+            self.stdout.write(
+                'Опоздание старта против журнала: '
+                f'p50 {lag.percentile(50) * 1000:.1f} мс, '
+                f'p99 {lag.percentile(99) * 1000:.1f} мс'
+            )
+        self.stdout.write(
+            f'{"адрес":<32}{"запросов":>9}{"ошибок":>9}'
+            + ''.join(f'{column:>9}' for column in COLUMNS)
+            + ' │ журнал' + ''.join(f'{column:>9}' for column in COLUMNS)
+            + '  (мс)'
+        )
+        routes = {}
+        for name, histogram in sorted(result.histograms.items()):
+            original = plan.original.get(name)
+            summary = histogram.summary()
+            before = original.summary() if original else {}
+            self.stdout.write(
+                f'{name:<32}{histogram.count:>9}{result.errors[name]:>9}'
+                + ''.join(
+                    f'{summary[column] * 1000:>9.1f}' for column in COLUMNS
+                )
+                + ' │       ' + ''.join(
+                    f'{before[column] * 1000:>9.1f}' if before else f'{"—":>9}'
+                    for column in COLUMNS
+                )
+            )
+            routes[name] = {
+                'requests': histogram.count,
+                'errors': result.errors[name],
+                'original_errors': plan.original_errors[name],
+                **{
+                    f'{key}_ms': round(value * 1000, 3)
+                    for key, value in summary.items()
+                },
+                'original': {
+                    f'{key}_ms': round(value * 1000, 3)
+                    for key, value in before.items()
+                },
+            }
+        if result.reasons:
+            self.stdout.write('Ошибки:')
+        for (name, reason), count in result.reasons.most_common():
+            self.stdout.write(f'  {name}: {reason} — {count}')
+        return {
+            'elapsed': round(elapsed, 3),
+            'log_span': round(plan.span, 3),
+            'throughput': round(total.count / elapsed, 3),
+            'lag_p99_ms': round(lag.percentile(99) * 1000, 3),
+            'routes': routes,
+        }
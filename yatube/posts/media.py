@@ -0,0 +1,48 @@
+"""Картинки постов в хранилище с именами по содержимому.
+
+Один файл может принадлежать нескольким постам, поэтому число ссылок
+на него — это число постов с таким image. Файл и его миниатюры
+удаляются, только когда ссылок не осталось.
+"""
+import logging
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+
+def delete_image(name):
+    """Удаляет файл картинки вместе с миниатюрами."""
+    default.kvstore.delete(ImageFile(name))
+    Post._meta.get_field('image').storage.delete(name)
+
+
+def release(name):
+    """Удаляет картинку после коммита, если на неё больше нет ссылок.
+
+    Проверка и удаление идут в пишущей транзакции. Параллельная загрузка
+    того же файла сохраняет пост тоже в пишущей транзакции, а на SQLite
+    они выполняются по очереди (BEGIN IMMEDIATE): либо здесь уже видна
+    её ссылка, либо она начнётся после удаления и запишет файл заново.
+    """
+    if not name:
+        return
+
+    def collect():
+        with transaction.atomic():
+            if Post.objects.filter(image=name).exists():
+                return
+            logger.info('Удаляется картинка без ссылок: %s', name)
+            try:
+                delete_image(name)
+            except (SuspiciousFileOperation, OSError):
+                # Имя записано в обход хранилища (например, путь вне MEDIA).
+                logger.warning('Не удалось удалить картинку %s', name,
+                               exc_info=True)
+
+    transaction.on_commit(collect)
@@ -0,0 +1,73 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:56
+
+from django.db import migrations
+
+from core.stemmer import tokenize
+
+BATCH_SIZE = 1000
+
+
+def stemmed_search_index(apps, schema_editor):
+    """Индекс из основ слов: текст поста и его комментарии отдельно."""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE posts_search USING fts5("
+        "text, comments, tokenize='unicode61 remove_diacritics 2')"
+    )
+    last_pk = 0
+    while True:
+        posts = list(
+            Post.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'text')[:BATCH_SIZE]
+        )
+        if not posts:
+            return
+        comments = {}
+        for post_id, text in Comment.objects.filter(
+            post_id__in=[pk for pk, _ in posts]
+        ).values_list('post_id', 'text'):
+            comments.setdefault(post_id, []).extend(tokenize(text))
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO posts_search (rowid, text, comments) '
+                'VALUES (%s, %s, %s)',
+                [
+                    (
+                        pk,
+                        ' '.join(tokenize(text)),
+                        ' '.join(comments.get(pk, ())),
+                    )
+                    for pk, text in posts
+                ],
+            )
+        last_pk = posts[-1][0]
+
+
+def plain_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE posts_search USING fts5("
+        "text, tokenize='unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        'INSERT INTO posts_search (rowid, text) '
+        'SELECT id, text FROM posts_post'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_auto_20261017_0453'),
+    ]
+
+    operations = [
+        migrations.RunPython(stemmed_search_index, plain_search_index),
+    ]
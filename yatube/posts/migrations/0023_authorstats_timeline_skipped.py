@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_celebrities(apps, schema_editor):
+    """У нынешних «знаменитостей» посты в ленты не разложены."""
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    AuthorStats.objects.filter(
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT
+    ).update(timeline_skipped=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_auto_20261017_0612'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstats',
+            name='timeline_skipped',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Ленты неполны'),
+        ),
+        migrations.RunPython(mark_celebrities, migrations.RunPython.noop),
+    ]
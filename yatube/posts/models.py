@@ -1,6 +1,9 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from core.models import AtomicSaveModel
+from core.storage import ContentHashStorage
+
 User = get_user_model()
 
 
@@ -13,7 +16,7 @@ class Group(models.Model):
         return self.title
 
 
-class Post(models.Model):
+class Post(AtomicSaveModel):
     text = models.TextField()
     pub_date = models.DateTimeField(
         auto_now_add=True,
@@ -34,11 +37,33 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        storage=ContentHashStorage(),
+        blank=True,
+        # По имени файла считаются ссылки на него (posts.media).
+        db_index=True,
+    )
+    comments_count = models.IntegerField(
+        'Комментариев',
+        default=0,
+        editable=False,
     )
 
+    counter_fields = ('comments_count',)
+
     class Meta:
-        ordering = ('-pub_date',)
+        # id разрешает совпадения pub_date: по этой паре идёт
+        # курсорная пагинация лент.
+        ordering = ('-pub_date', '-id')
+        indexes = (
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_feed_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_feed_idx',
+            ),
+        )
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -46,7 +71,7 @@ class Post(models.Model):
         return self.text[:15]
 
 
-class Comment(models.Model):
+class Comment(AtomicSaveModel):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -60,11 +85,20 @@ class Comment(models.Model):
     text = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = (
+            # Комментарии поста листаются курсором по (created, id).
+            models.Index(
+                fields=('post', 'created', 'id'),
+                name='comment_post_page_idx',
+            ),
+        )
+
     def __str__(self):
         return self.text
 
 
-class Follow(models.Model):
+class Follow(AtomicSaveModel):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -75,3 +109,99 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following',
     )
+
+
+class AuthorStats(models.Model):
+    """Счётчики пользователя: ведутся сигналами вместо COUNT(*)."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.IntegerField('Постов', default=0)
+    followers_count = models.IntegerField('Подписчиков', default=0)
+    following_count = models.IntegerField('Подписок', default=0)
+    # Посты автора-«знаменитости» не раскладывались по лентам
+    # (posts.timeline); снимается, когда ленты собраны заново.
+    timeline_skipped = models.BooleanField(
+        'Ленты неполны', default=False, editable=False
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики автора'
+        verbose_name_plural = 'Счётчики авторов'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.posts_count}'
+
+    @classmethod
+    def recount(cls, user_id):
+        """Пересчитывает счётчики одного пользователя по таблицам."""
+        stats, _ = cls.objects.update_or_create(
+            user_id=user_id,
+            defaults={
+                'posts_count': Post.objects.filter(author_id=user_id).count(),
+                'followers_count': Follow.objects.filter(
+                    author_id=user_id
+                ).count(),
+                'following_count': Follow.objects.filter(
+                    user_id=user_id
+                ).count(),
+            },
+        )
+        return stats
+
+    @classmethod
+    def for_user(cls, user):
+        """Счётчики пользователя; отсутствующая строка создаётся."""
+        try:
+            return user.stats
+        except cls.DoesNotExist:
+            return cls.recount(user.pk)
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя.
+
+    Дата поста скопирована сюда, чтобы лента читалась одним диапазоном
+    индекса (user, pub_date, post).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_entry',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_feed_idx',
+            ),
+            models.Index(
+                fields=('user', 'author'),
+                name='timeline_author_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
@@ -0,0 +1,250 @@
+"""Повтор журнала доступа веб-сервера на WSGI-приложении в процессе.
+
+Журнал в формате combined (nginx и Apache по умолчанию), в конце
+строки может стоять время ответа — ``$request_time`` nginx в секундах
+или ``%D`` Apache в микросекундах. Путь разбирается по адресам posts,
+users и about, а id постов, имена авторов и группы заменяются на
+существующие в данных замеров. Замена постоянна: один и тот же пост
+журнала всегда становится одним и тем же постом, поэтому всплески
+на одном посте и глубокое листание ``?page=N`` сохраняются.
+
+Повторяются только GET и HEAD: тела POST в журнале нет. Запросы идут
+по времени из журнала (с ускорением speed) в пуле потоков; задержка
+старта относительно расписания копится отдельно и показывает, успевает
+ли приложение за журналом.
+"""
+import gzip
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from urllib.parse import unquote
+
+from django.urls import Resolver404, resolve, reverse
+
+from core.histogram import Histogram
+from .loadtest import Result, WSGIClient, visit
+
+NAMESPACES = ('posts', 'users', 'about')
+METHODS = ('GET', 'HEAD')
+# Выход из учётной записи удалил бы сессию, общую для многих запросов.
+ANONYMOUS_ONLY = ('users:logout',)
+TIME_UNITS = {'s': 1, 'ms': 1_000, 'us': 1_000_000}
+MONTHS = {
+    name: number for number, name in enumerate((
+        'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+        'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec',
+    ), 1)
+}
+LINE = re.compile(
+    r'(?P<host>\S+) \S+ (?P<user>\S+) \[(?P<time>[^\]]+)\] '
+    r'"(?P<method>[A-Z]+) (?P<target>\S+)[^"]*" (?P<status>\d{3}) \S+'
+    r'(?: "[^"]*" "[^"]*")?(?: (?P<duration>\d+(?:\.\d+)?))?'
+)
+TIME = re.compile(
+    r'(\d{2})/(\w{3})/(\d{4}):(\d{2}):(\d{2}):(\d{2}) ([+-])(\d{2})(\d{2})'
+)
+
+Entry = namedtuple(
+    'Entry', 'time method target status user duration'
+)
+
+
+def parse_time(value):
+    """Время журнала ``10/Oct/2000:13:55:36 -0700`` в секундах эпохи.
+
+    Без strptime: %b зависит от локали, а журналы пишутся по-английски.
+    """
+    match = TIME.fullmatch(value)
+    if match is None or match.group(2) not in MONTHS:
+        raise ValueError(f'Неизвестный формат времени: {value}')
+    day, month, year, hour, minute, second, sign, zone_h, zone_m = (
+        match.groups()
+    )
+    offset = timedelta(hours=int(zone_h), minutes=int(zone_m))
+    moment = datetime(
+        int(year), MONTHS[month], int(day), int(hour), int(minute),
+        int(second),
+        tzinfo=timezone(-offset if sign == '-' else offset),
+    )
+    return moment.timestamp()
+
+
+def parse_line(line, time_unit='s'):
+    """Entry из строки журнала или None, если строка не разобрана."""
+    match = LINE.match(line)
+    if match is None:
+        return None
+    try:
+        moment = parse_time(match['time'])
+    except ValueError:
+        return None
+    duration = match['duration']
+    return Entry(
+        moment, match['method'], match['target'], int(match['status']),
+        None if match['user'] == '-' else match['user'],
+        None if duration is None else float(duration) / TIME_UNITS[time_unit],
+    )
+
+
+def read_log(path):
+    """Строки журнала из файла, .gz или стандартного ввода (``-``)."""
+    if path == '-':
+        yield from sys.stdin
+        return
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', errors='replace') as file:
+        yield from file
+
+
+class Rewriter:
+    """Переводит адреса журнала на данные замеров.
+
+    Возвращает имя адреса и новый путь. Каждое значение журнала
+    (пост, автор, группа, пользователь) один раз и навсегда получает
+    случайную пару из набора данных loadtest.Dataset.
+    """
+
+    def __init__(self, dataset, rng):
+        self.dataset = dataset
+        self.rng = rng
+        self.mapping = {}
+        self.choices = {
+            'username': dataset.authors,
+            'slug': dataset.groups,
+            'session': dataset.sessions,
+        }
+
+    def pick(self, kind, value):
+        key = (kind, value)
+        if key not in self.mapping:
+            if kind == 'post_id':
+                self.mapping[key] = self.rng.randint(
+                    self.dataset.first_post, self.dataset.last_post
+                )
+            else:
+                self.mapping[key] = self.rng.choice(self.choices[kind])
+        return self.mapping[key]
+
+    def route(self, target):
+        """(имя адреса, новый путь) или None, если адрес не наш."""
+        path, _, query = target.partition('?')
+        try:
+            match = resolve(unquote(path))
+        except Resolver404:
+            return None
+        if match.namespace not in NAMESPACES:
+            return None
+        kwargs = {
+            name: self.pick(name, value)
+            if name == 'post_id' or self.choices.get(name) else value
+            for name, value in match.kwargs.items()
+        }
+        target = reverse(match.view_name, kwargs=kwargs)
+        return match.view_name, target + ('?' + query if query else '')
+
+    def session(self, name, user):
+        """Сессия для пользователя журнала; None — запрос анонима."""
+        sessions = self.choices['session']
+        if user is None or name in ANONYMOUS_ONLY or not sessions:
+            return None
+        return self.pick('session', user)
+
+
+class Replay:
+    """Разбор журнала, расписание и итог повтора."""
+
+    def __init__(self, rewriter, time_unit='s'):
+        self.rewriter = rewriter
+        self.time_unit = time_unit
+        self.jobs = []
+        self.skipped = Counter()
+        self.original = defaultdict(Histogram)
+        self.original_errors = Counter()
+        self.first = self.last = None
+
+    def load(self, lines, limit=None):
+        """Разбирает строки; пропущенные считаются по причине."""
+        for line in lines:
+            if limit is not None and len(self.jobs) >= limit:
+                break
+            entry = parse_line(line, self.time_unit)
+            if entry is None:
+                self.skipped['строка не разобрана'] += 1
+                continue
+            if entry.method not in METHODS:
+                self.skipped[f'метод {entry.method}'] += 1
+                continue
+            route = self.rewriter.route(entry.target)
+            if route is None:
+                self.skipped['адрес вне posts, users и about'] += 1
+                continue
+            name, target = route
+            session = self.rewriter.session(name, entry.user)
+            self.jobs.append((entry.time, name, entry.method, target, session))
+            if entry.duration is not None:
+                self.original[name].record(entry.duration)
+            if entry.status >= 400:
+                self.original_errors[name] += 1
+            if self.first is None or entry.time < self.first:
+                self.first = entry.time
+            if self.last is None or entry.time > self.last:
+                self.last = entry.time
+        # Журналы пишутся по окончании ответа, порядок почти верный.
+        self.jobs.sort(key=lambda job: job[0])
+        return self
+
+    @property
+    def span(self):
+        """Длительность журнала в секундах."""
+        return self.last - self.first if self.jobs else 0.0
+
+    def run(self, application, speed=1.0, concurrency=8):
+        """Повторяет запросы; speed 0 — без пауз, так быстро, как можно.
+
+        Возвращает сумму результатов, гистограмму опозданий старта и
+        фактическую длительность.
+        """
+        local = threading.local()
+        results, lag = [], Histogram()
+        lock = threading.Lock()
+        # Очередь пула не растёт на весь журнал при speed 0.
+        slots = threading.BoundedSemaphore(concurrency * 2)
+        clients = {
+            session: WSGIClient(application, session)
+            for session in {job[4] for job in self.jobs}
+        }
+
+        def job(scheduled, name, method, target, session):
+            try:
+                if not hasattr(local, 'result'):
+                    local.result = Result()
+                    with lock:
+                        results.append(local.result)
+                if scheduled is not None:
+                    delay = time.perf_counter() - scheduled
+                    with lock:
+                        lag.record(delay)
+                visit(clients[session], local.result, name, target, method)
+            finally:
+                slots.release()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            for moment, name, method, target, session in self.jobs:
+                scheduled = None
+                if speed:
+                    scheduled = started + (moment - self.first) / speed
+                    pause = scheduled - time.perf_counter()
+                    if pause > 0:
+                        time.sleep(pause)
+                slots.acquire()
+                pool.submit(job, scheduled, name, method, target, session)
+        elapsed = time.perf_counter() - started
+        total = Result()
+        for result in results:
+            total.merge(result)
+        return total, lag, elapsed
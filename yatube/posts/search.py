@@ -0,0 +1,262 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Индекс — виртуальная таблица posts_search, rowid строки равен id поста.
+В колонке text лежат основы слов поста, в comments — его комментариев:
+и текст, и запрос проходят через один стеммер, поэтому «кошки» находит
+«кошку». Таблицу создаёт миграция только на SQLite; сигналы держат её
+в актуальном состоянии, rebuild_search_index собирает её заново. На
+других базах поиск работает через LIKE без ранжирования.
+
+Комментарии попадают в индекс после коммита: новый дописывается к
+колонке comments, а после правки или удаления пост переиндексируется
+один раз на транзакцию, сколько бы его комментариев ни менялось.
+"""
+import threading
+
+from django.db import connection, transaction
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from core.stemmer import WORD_RE, stem, tokenize
+from .models import Comment, Post
+
+TABLE = 'posts_search'
+# Вес совпадений в тексте поста и в комментариях для bm25.
+TEXT_WEIGHT = 1.0
+COMMENTS_WEIGHT = 0.3
+# Сколько слов вокруг совпадения показывать в выдаче.
+SNIPPET_WORDS = 30
+
+# Посты, ждущие переиндексации после коммита, — свои у каждого потока.
+_pending = threading.local()
+
+
+def available():
+    return connection.vendor == 'sqlite'
+
+
+def query_terms(query):
+    """Основы слов запроса без повторов."""
+    return list(dict.fromkeys(tokenize(query)))
+
+
+def match_expression(terms):
+    """Выражение MATCH: все основы как префиксы, в кавычках.
+
+    В кавычки попадают только буквы и цифры, поэтому синтаксис FTS5
+    из запроса пользователя не исполняется.
+    """
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def index_posts(posts, with_comments=True):
+    """Добавляет или обновляет посты в индексе.
+
+    Комментарии всех постов читаются одним запросом; у только что
+    созданного поста их нет, и запрос можно пропустить.
+    """
+    if not available():
+        return
+    posts = list(posts)
+    comments = {post.pk: [] for post in posts}
+    if with_comments and posts:
+        for post_id, text in Comment.objects.filter(
+            post_id__in=comments
+        ).values_list('post_id', 'text'):
+            comments[post_id].append(text)
+    rows = [
+        (
+            post.pk,
+            ' '.join(tokenize(post.text)),
+            ' '.join(' '.join(tokenize(text)) for text in comments[post.pk]),
+        )
+        for post in posts
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {TABLE} WHERE rowid = %s',
+            [(pk,) for pk, _, _ in rows],
+        )
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, text, comments) '
+            'VALUES (%s, %s, %s)',
+            rows,
+        )
+
+
+def _pending_posts():
+    if not hasattr(_pending, 'pks'):
+        _pending.pks = set()
+    return _pending.pks
+
+
+def add_comment_later(post_id, text):
+    """После коммита дописывает основы слов комментария к индексу поста.
+
+    Если пост и так ждёт переиндексации, комментарий попадёт туда.
+    Пост мог остаться в очереди от отменённой транзакции, без колбэка
+    после коммита, поэтому колбэк ставится заново.
+    """
+    if not available():
+        return
+    if post_id in _pending_posts():
+        transaction.on_commit(_reindex_pending)
+        return
+    words = ' '.join(tokenize(text))
+
+    def append():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {TABLE} SET comments = comments || ' ' || %s "
+                'WHERE rowid = %s',
+                [words, post_id],
+            )
+
+    transaction.on_commit(append)
+
+
+def reindex_later(post_id):
+    """Переиндексирует пост после коммита, один раз на транзакцию.
+
+    Id из отменённой транзакции остаётся в очереди и переиндексируется
+    вместе со следующими; add_comment_later учитывает это.
+    """
+    if not available():
+        return
+    _pending_posts().add(post_id)
+    transaction.on_commit(_reindex_pending)
+
+
+def _reindex_pending():
+    pks = _pending_posts()
+    if not pks:
+        return
+    _pending.pks = set()
+    index_posts(Post.objects.filter(pk__in=pks).only('pk', 'text'))
+
+
+def remove_posts(pks):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {TABLE} WHERE rowid = %s', [(pk,) for pk in pks]
+        )
+
+
+def clear():
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+
+
+def filter_matching(queryset, terms):
+    """Оставляет в queryset постов только подходящие под слова."""
+    return queryset.extra(
+        where=[
+            f'{Post._meta.db_table}.id IN '
+            f'(SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s)'
+        ],
+        params=[match_expression(terms)],
+    )
+
+
+def highlight(text, terms):
+    """Экранированный фрагмент текста с совпадениями в <mark>."""
+    words = list(WORD_RE.finditer(text))
+    hits = [
+        index for index, word in enumerate(words)
+        if any(stem(word.group()).startswith(term) for term in terms)
+    ]
+    start, end = 0, len(text)
+    if len(words) > SNIPPET_WORDS:
+        first = max(0, (hits[0] if hits else 0) - SNIPPET_WORDS // 3)
+        last = min(len(words), first + SNIPPET_WORDS) - 1
+        start = words[first].start() if first else 0
+        end = words[last].end() if last < len(words) - 1 else end
+    parts = ['…' if start else '']
+    position = start
+    for index in hits:
+        word = words[index]
+        if word.start() < start or word.end() > end:
+            continue
+        parts.append(escape(text[position:word.start()]))
+        parts.append(f'<mark>{escape(word.group())}</mark>')
+        position = word.end()
+    parts.append(escape(text[position:end]))
+    parts.append('…' if end < len(text) else '')
+    return mark_safe(''.join(parts))
+
+
+class SearchResults:
+    """Ранжированная выдача, которую можно отдать Paginator.
+
+    Paginator берёт count() и срез; срез читает из индекса только id
+    нужной страницы по bm25, а посты достаёт одним запросом.
+    """
+
+    def __init__(self, query):
+        self.terms = query_terms(query)
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self._count_matches() if self.terms else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError('SearchResults поддерживает только срезы')
+        if not self.terms:
+            return []
+        offset = key.start or 0
+        limit = key.stop - offset
+        ranked = self._ranked_ids(offset, limit)
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [pk for pk, _ in ranked]
+        )
+        results = []
+        for pk, rank in ranked:
+            post = posts.get(pk)
+            if post is None:
+                continue
+            post.rank = rank
+            post.highlighted = highlight(post.text, self.terms)
+            results.append(post)
+        return results
+
+    def _count_matches(self):
+        if not available():
+            return self._fallback().count()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {TABLE} WHERE {TABLE} MATCH %s',
+                [match_expression(self.terms)],
+            )
+            return cursor.fetchone()[0]
+
+    def _ranked_ids(self, offset, limit):
+        if not available():
+            return [
+                (pk, 0) for pk in self._fallback()
+                .values_list('pk', flat=True)[offset:offset + limit]
+            ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, bm25({TABLE}, %s, %s) AS rank FROM {TABLE} '
+                f'WHERE {TABLE} MATCH %s ORDER BY rank LIMIT %s OFFSET %s',
+                [
+                    TEXT_WEIGHT, COMMENTS_WEIGHT,
+                    match_expression(self.terms), limit, offset,
+                ],
+            )
+            return cursor.fetchall()
+
+    def _fallback(self):
+        posts = Post.objects.all()
+        for term in self.terms:
+            # Основа — начало словоформы, так что LIKE её тоже находит.
+            posts = posts.filter(text__icontains=term)
+        return posts
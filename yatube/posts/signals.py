@@ -0,0 +1,186 @@
+from django.db.models import F
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from core.cache import bump
+from . import media, search, timeline
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+
+def bump_stats(user_id, **deltas):
+    """Сдвигает счётчики пользователя в текущей транзакции.
+
+    Если строки счётчиков нет, её посчитает AuthorStats.for_user() при
+    первом чтении: создавать её здесь нельзя, пользователь может
+    удаляться в этой же транзакции.
+    """
+    AuthorStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+@receiver(post_save, sender=User)
+def create_author_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump_stats(instance.author_id, posts_count=1)
+        # Число постов автора видно на страницах всех его постов.
+        bump(f'author:{instance.author_id}')
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_stats(instance.author_id, posts_count=-1)
+    bump(f'author:{instance.author_id}')
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Post.objects.filter(pk=instance.post_id).update(
+            comments_count=F('comments_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id).update(
+        comments_count=F('comments_count') - 1
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump_stats(instance.author_id, followers_count=1)
+        bump_stats(instance.user_id, following_count=1)
+        timeline.backfill_follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    bump_stats(instance.author_id, followers_count=-1)
+    bump_stats(instance.user_id, following_count=-1)
+    timeline.prune_follow(instance.user_id, instance.author_id)
+    timeline.materialize_if_demoted(instance.author_id)
+
+
+def bump_post_pages(post, group_ids=()):
+    """Сбрасывает кеш страниц, на которых виден пост."""
+    group_ids = {post.group_id, *group_ids} - {None}
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True
+    )
+    username = User.objects.filter(pk=post.author_id).values_list(
+        'username', flat=True
+    ).first()
+    bump(
+        'posts',
+        f'post:{post.pk}',
+        f'profile:{username}',
+        *(f'group:{slug}' for slug in slugs),
+    )
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_state(sender, instance, raw=False, **kwargs):
+    instance._old_group_id = None
+    instance._old_image = None
+    if instance.pk and not raw:
+        instance._old_group_id, instance._old_image = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', 'image').first() or (None, None)
+
+
+@receiver(post_save, sender=Post)
+def post_saved_bump_cache(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_post_pages(instance, [getattr(instance, '_old_group_id', None)])
+
+
+@receiver(post_save, sender=Post)
+def post_image_replaced(sender, instance, raw=False, **kwargs):
+    old_image = getattr(instance, '_old_image', None)
+    if not raw and old_image and old_image != instance.image.name:
+        media.release(old_image)
+
+
+@receiver(post_delete, sender=Post)
+def post_image_released(sender, instance, **kwargs):
+    media.release(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def post_indexed(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        search.index_posts([instance], with_comments=not created)
+
+
+@receiver(post_delete, sender=Post)
+def post_unindexed(sender, instance, **kwargs):
+    search.remove_posts([instance.pk])
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved_reindex(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        search.add_comment_later(instance.post_id, instance.text)
+    else:
+        search.reindex_later(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted_reindex(sender, instance, **kwargs):
+    search.reindex_later(instance.post_id)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleted_bump_cache(sender, instance, **kwargs):
+    # До удаления: группа и автор ещё читаются из базы.
+    bump_post_pages(instance)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed_bump_cache(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump(f'post:{instance.post_id}')
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, raw=False, **kwargs):
+    instance._old_slug = None
+    if instance.pk and not raw:
+        instance._old_slug = Group.objects.filter(
+            pk=instance.pk
+        ).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed_bump_cache(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    slugs = {instance.slug, getattr(instance, '_old_slug', None)} - {None}
+    bump('posts', 'groups', *(f'group:{slug}' for slug in slugs))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed_bump_cache(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    usernames = User.objects.filter(
+        pk__in=(instance.user_id, instance.author_id)
+    ).values_list('username', flat=True)
+    bump(*(f'profile:{username}' for username in usernames))
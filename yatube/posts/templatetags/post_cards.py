@@ -0,0 +1,87 @@
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from core import metrics
+
+from ..thumbnails import find_thumbnail, find_thumbnails
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_list.html'
+# Меняется вместе с разметкой карточки, чтобы не отдавать старый HTML.
+CARD_VERSION = 2
+
+
+def card_key(post, own, thumbnail):
+    """Ключ карточки из id поста и всего, что в ней показано.
+
+    Правка поста, смена имени автора или слага группы дают новый ключ,
+    так что отдельно сбрасывать карточки не нужно. Готовность миниатюры
+    тоже входит в ключ: карточка с заглушкой заменится сама.
+    """
+    author = post.author
+    raw = '|'.join(str(part) for part in (
+        CARD_VERSION,
+        post.pk,
+        own,
+        post.pub_date.isoformat(),
+        post.image.name,
+        thumbnail.name if thumbnail else '',
+        author.username,
+        author.get_full_name(),
+        post.group.slug if post.group_id else '',
+        post.text,
+    ))
+    return f'post_card:{post.pk}:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _is_own(context, post):
+    user = context.get('user')
+    return getattr(user, 'pk', None) == post.author_id
+
+
+def _prefetch(context):
+    """Карточки и миниатюры всей страницы: по одному get_many на каждое."""
+    cards = context.render_context.get(CARD_TEMPLATE)
+    if cards is None:
+        posts = list(context.get('page_obj') or ())
+        thumbnails = find_thumbnails([post.image for post in posts], 'card')
+        keys = {}
+        for post in posts:
+            thumbnail = thumbnails.get(post.image.name)
+            keys[post.pk] = (
+                card_key(post, _is_own(context, post), thumbnail),
+                thumbnail,
+            )
+        with metrics.timer('cache'):
+            html = cache.get_many([key for key, _ in keys.values()])
+        metrics.add_timing('cache.hit', count=len(html))
+        metrics.add_timing('cache.miss', count=len(keys) - len(html))
+        cards = {'keys': keys, 'html': html}
+        context.render_context[CARD_TEMPLATE] = cards
+    return cards
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    """Карточка поста из кеша; рендерятся только промахи."""
+    cards = _prefetch(context)
+    if post.pk in cards['keys']:
+        key, thumbnail = cards['keys'][post.pk]
+    else:
+        thumbnail = find_thumbnail(post.image, 'card')
+        key = card_key(post, _is_own(context, post), thumbnail)
+    html = cards['html'].get(key)
+    if html is None:
+        html = get_template(CARD_TEMPLATE).render({
+            'post': post,
+            'user': context.get('user'),
+            'thumbnail': thumbnail,
+        })
+        cache.set(key, html, settings.CARD_CACHE_TIMEOUT)
+    return mark_safe(html)
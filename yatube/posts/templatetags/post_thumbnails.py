@@ -0,0 +1,11 @@
+from django import template
+
+from ..thumbnails import find_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def prebuilt_thumbnail(image, name):
+    """Готовая миниатюра картинки или None, если она ещё строится."""
+    return find_thumbnail(image, name)
@@ -0,0 +1,40 @@
+from io import StringIO
+
+from django.test import TestCase
+
+from .. import bench, benchdata
+from ..models import Follow, Post
+
+
+class BenchViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        benchdata.generate(
+            stdout=StringIO(),
+            users=6, groups=2, posts=40, comments=60, follows=10,
+        )
+
+    def test_every_view_measured(self):
+        """Сценарии есть для всех адресов posts и users, и ни один
+        не заканчивается ошибкой."""
+        self.assertEqual(Post.objects.count(), 40)
+        self.assertEqual(Follow.objects.count(), 10)
+        data = benchdata.sample()
+        scenarios = bench.scenarios(data)
+        self.assertEqual(bench.missing(scenarios), set())
+        for scenario in scenarios:
+            with self.subTest(scenario=scenario.label):
+                result = bench.measure(scenario, repeat=2, warmup=0)
+                self.assertTrue(
+                    all(status < 400 for status in result['status'])
+                )
+                self.assertGreaterEqual(result['sql_ms'], 0)
+
+    def test_compare_with_baseline(self):
+        """Регрессия — лишний запрос или рост времени сверх порога."""
+        before = {'posts:index': {'wall_ms': 10, 'sql_ms': 2, 'queries': 3}}
+        same = {'posts:index': {'wall_ms': 11, 'sql_ms': 2, 'queries': 3}}
+        self.assertEqual(bench.compare(same, before), [])
+        slower = {'posts:index': {'wall_ms': 20, 'sql_ms': 2, 'queries': 4}}
+        self.assertEqual(len(bench.compare(slower, before)), 2)
@@ -1,14 +1,18 @@
+import os
 import shutil
 import tempfile
 
 from http import HTTPStatus
+from io import BytesIO
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
+from PIL import Image
 from django.urls import reverse
 
 from ..models import Post, Group, User, Comment
+from .utils import InlineThumbnailsMixin
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -159,3 +163,122 @@ class PostCreateFormTests(TestCase):
                 author=form_data['author'],
             ).exists()
         )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(InlineThumbnailsMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    @staticmethod
+    def jpeg(size, exif=None):
+        image = Image.new('RGB', size, 'red')
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', exif=exif or b'')
+        return SimpleUploadedFile(
+            'photo.jpg', buffer.getvalue(), content_type='image/jpeg'
+        )
+
+    def create(self, image):
+        return self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Пост с фотографией', 'image': image},
+        )
+
+    @override_settings(IMAGE_MASTER_SIZE=100)
+    def test_master_downscaled_rotated_and_stripped(self):
+        """Мастер-копия уменьшена, повёрнута по EXIF и без метаданных."""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: поворот на 90°
+        exif[0x010F] = 'Camera'
+        self.create(self.jpeg((400, 200), exif.tobytes()))
+        post = Post.objects.get()
+        with Image.open(post.image.path) as master:
+            self.assertEqual(master.size, (50, 100))
+            self.assertEqual(len(master.getexif()), 0)
+
+    @override_settings(IMAGE_UPLOAD_MAX_BYTES=1024)
+    def test_too_many_bytes_rejected(self):
+        """Файл больше предела не сохраняется."""
+        noise = Image.frombytes('L', (200, 200), os.urandom(200 * 200))
+        buffer = BytesIO()
+        noise.save(buffer, 'PNG')
+        response = self.create(SimpleUploadedFile(
+            'noise.png', buffer.getvalue(), content_type='image/png'
+        ))
+        error = response.context['form'].errors['image'][0]
+        self.assertTrue(error.startswith('Файл пустой или больше'))
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_rejected(self):
+        """Картинка с большим числом пикселей отклоняется по заголовку."""
+        response = self.create(self.jpeg((20, 20)))
+        self.assertFormError(
+            response, 'form', 'image',
+            'Картинка слишком большая: 20×20 пикселей.',
+        )
+
+    def test_broken_image_rejected(self):
+        """Файл с обрезанными данными картинки отклоняется формой."""
+        data = self.jpeg((300, 300)).read()
+        response = self.create(SimpleUploadedFile(
+            'broken.jpg', data[:len(data) // 2], content_type='image/jpeg'
+        ))
+        self.assertFormError(
+            response, 'form', 'image', 'Не удалось прочитать картинку.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    def test_malformed_exif_rejected(self):
+        """Испорченный EXIF в целой картинке отклоняется формой."""
+        orientation = b'\x01\x12\x00\x03\x00\x00\x00\x01\x00\x06\x00\x00'
+        bodies = {
+            'SyntaxError': b'not a tiff header',
+            # Compression строкой вместо числа.
+            'struct.error': (
+                b'MM\x00*\x00\x00\x00\x08\x00\x02'
+                b'\x01\x03\x00\x02\x00\x00\x00\x02A\x00\x00\x00'
+                + orientation + b'\x00\x00\x00\x00'
+            ),
+            # Отрицательное смещение блока Exif IFD.
+            'ValueError': (
+                b'MM\x00*\x00\x00\x00\x08\x00\x02' + orientation
+                + b'\x87\x69\x00\x09\x00\x00\x00\x01\xff\xff\xff\x00'
+                + b'\x00\x00\x00\x00'
+            ),
+        }
+        for error, body in bodies.items():
+            with self.subTest(error=error):
+                buffer = BytesIO()
+                Image.new('RGB', (20, 20), 'red').save(
+                    buffer, 'PNG', exif=b'Exif\x00\x00' + body
+                )
+                response = self.create(SimpleUploadedFile(
+                    'exif.png', buffer.getvalue(), content_type='image/png'
+                ))
+                self.assertFormError(
+                    response, 'form', 'image',
+                    'Не удалось прочитать картинку.',
+                )
+                self.assertFalse(Post.objects.exists())
+
+    def test_cmyk_tiff_saved_as_png(self):
+        """Картинка в режиме, которого нет в PNG, сохраняется в RGB."""
+        buffer = BytesIO()
+        Image.new('CMYK', (20, 20), 'red').save(buffer, 'TIFF')
+        self.create(SimpleUploadedFile(
+            'print.tiff', buffer.getvalue(), content_type='image/tiff'
+        ))
+        with Image.open(Post.objects.get().image.path) as master:
+            self.assertEqual((master.format, master.mode), ('PNG', 'RGB'))
@@ -0,0 +1,107 @@
+import random
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from .. import benchdata, loadtest, replay
+from ..models import Post
+from .utils import InlineThumbnailsMixin
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class LoadTestTests(InlineThumbnailsMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        benchdata.generate(
+            stdout=StringIO(),
+            users=6, groups=2, posts=40, comments=60, follows=10,
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_behaviours_through_wsgi(self):
+        """Каждое поведение проходит через WSGI без ошибок, с CSRF и
+        сессией, а посты с картинками доходят до миниатюр."""
+        from yatube.wsgi import application
+
+        dataset = loadtest.Dataset(accounts=2)
+        result = loadtest.Result()
+        user = loadtest.VirtualUser(
+            application, dataset, loadtest.MIX, random.Random(0), result,
+            image_share=1,
+        )
+        posts = Post.objects.count()
+        for behaviour in loadtest.MIX:
+            getattr(user, behaviour)()
+        self.assertEqual(sum(result.errors.values()), 0, result.reasons)
+        self.assertIn('posts:follow_index', result.requests)
+        self.assertEqual(Post.objects.count(), posts + 1)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+
+    def test_parse_mix(self):
+        self.assertEqual(
+            loadtest.parse_mix('anonymous=3,poster=1'),
+            {'anonymous': 3, 'poster': 1},
+        )
+        with self.assertRaises(ValueError):
+            loadtest.parse_mix('robot=1')
+
+    def test_parse_log_line(self):
+        entry = replay.parse_line(
+            '10.0.0.1 - alice [17/Oct/2026:10:00:00 +0300] '
+            '"GET /?page=57 HTTP/1.1" 200 512 "-" "Googlebot/2.1" 0.210'
+        )
+        self.assertEqual(entry.target, '/?page=57')
+        self.assertEqual(entry.user, 'alice')
+        self.assertEqual(entry.duration, 0.21)
+        self.assertEqual(entry.time, replay.parse_time(
+            '17/Oct/2026:07:00:00 +0000'
+        ))
+        self.assertIsNone(replay.parse_line('не журнал'))
+
+    def test_replay_rewrites_ids_consistently(self):
+        """Один пост журнала — всегда один пост данных; чужие адреса и
+        POST пропускаются, остальное повторяется без ошибок."""
+        from yatube.wsgi import application
+
+        line = (
+            '10.0.0.1 - {user} [17/Oct/2026:10:00:0{second} +0300] '
+            '"{method} {path} HTTP/1.1" 200 512 "-" "Mozilla/5.0"'
+        )
+        requests = [
+            ('-', 'GET', '/posts/912/'),
+            ('-', 'GET', '/posts/912/'),
+            ('-', 'GET', '/profile/leo/?page=2'),
+            ('bob', 'GET', '/follow/'),
+            ('bob', 'POST', '/posts/912/comment/'),
+            ('-', 'GET', '/admin/'),
+        ]
+        plan = replay.Replay(replay.Rewriter(
+            loadtest.Dataset(accounts=2), random.Random(0)
+        )).load([
+            line.format(user=user, second=second, method=method, path=path)
+            for second, (user, method, path) in enumerate(requests)
+        ])
+        targets = [job[3] for job in plan.jobs]
+        self.assertEqual(len(targets), 4)
+        self.assertEqual(targets[0], targets[1])
+        self.assertTrue(targets[2].endswith('/?page=2'))
+        self.assertIsNotNone(plan.jobs[3][4])
+        self.assertEqual(sum(plan.skipped.values()), 2)
+        # Пул потоков не видит данных из транзакции теста: по очереди.
+        result = loadtest.Result()
+        for _, name, method, target, session in plan.jobs:
+            loadtest.visit(
+                loadtest.WSGIClient(application, session), result, name,
+                target, method,
+            )
+        self.assertEqual(sum(result.errors.values()), 0, result.reasons)
@@ -1,6 +1,21 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
 
-from ..models import Group, Post, User
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+
+from .. import media, thumbnails
+from ..models import AuthorStats, Comment, Follow, Group, Post, User
+from .utils import InlineThumbnailsMixin
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
 class PostModelTest(TestCase):
@@ -32,3 +47,217 @@ class PostModelTest(TestCase):
         for value, expected in field_verboses.items():
             with self.subTest(value=value):
                 self.assertEqual(value, expected)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении записей."""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        follow.delete()
+        post.comments.all().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_save_keeps_concurrent_counter_updates(self):
+        """Сохранение устаревшего объекта не затирает счётчик."""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        stale = Post.objects.get(pk=post.pk)
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        stale.text = 'Исправленный пост'
+        stale.save()
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Исправленный пост')
+        self.assertEqual(post.comments_count, 1)
+
+    def test_recount_stats_repairs_drift(self):
+        """Команда recount_stats исправляет разошедшиеся счётчики."""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        AuthorStats.objects.filter(user=self.author).update(posts_count=7)
+        AuthorStats.objects.filter(user=self.reader).delete()
+        Post.objects.update(comments_count=5)
+        out = StringIO()
+        call_command('recount_stats', stdout=out)
+        self.assertIn('счётчики авторов — 2, комментарии постов — 1', (
+            out.getvalue()
+        ))
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.reader).posts_count, 0)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+
+class ImportContentTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='cats', description='-'
+        )
+        cls.directory = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_import_rebuilds_derived_data(self):
+        """Импорт сохраняет даты и пересобирает счётчики, ленту и индекс."""
+        posts = self.write('posts.jsonl', '\n'.join((
+            '{"id": 10, "author": "writer", "group": "cats", '
+            '"text": "Кошки спят", "pub_date": "2015-01-02T03:04:05"}',
+            '{"id": 11, "author": "writer", "text": "Второй пост"}',
+            '{"id": 12, "author": "writer", "group": "dogs", "text": "-"}',
+        )))
+        comments = self.write('comments.csv', (
+            'post,author,text,created\n'
+            '10,reader,Первый,2015-01-03T00:00:00\n'
+            '10,reader,Второй,\n'
+            '99,reader,Потерянный,\n'
+        ))
+        follows = self.write('follows.csv', (
+            'user,author\nreader,writer\nreader,writer\nreader,ghost\n'
+        ))
+        out = StringIO()
+        call_command(
+            'import_content', posts=posts, comments=comments,
+            follows=follows, create_users=True, batch_size=2, stdout=out,
+        )
+        writer = User.objects.get(username='writer')
+        post = Post.objects.get(text='Кошки спят')
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.comments_count, 2)
+        self.assertEqual(
+            post.comments.order_by('created').first().created.year, 2015
+        )
+        self.assertEqual(AuthorStats.objects.get(user=writer).posts_count, 2)
+        self.assertEqual(
+            AuthorStats.objects.get(user=writer).followers_count, 1
+        )
+        self.assertEqual(self.reader.timeline.count(), 2)
+        response = self.client.get('/search/', {'q': 'кошка'})
+        self.assertEqual(list(response.context['page_obj']), [post])
+        self.assertIn('строк/с', out.getvalue())
+        self.assertIn('неизвестная группа — 1', out.getvalue())
+        self.assertIn('повторная подписка — 1', out.getvalue())
+        # Следующие записи получают id после загруженных.
+        Post.objects.create(author=writer, text='Новый пост')
+
+    def test_import_comments_for_existing_posts(self):
+        """Комментарии можно загрузить к постам, которые уже в базе."""
+        post = Post.objects.create(author=self.reader, text='Старый пост')
+        comments = self.write('comments.jsonl', (
+            f'{{"post": {post.pk}, "author": "reader", "text": "Попугаи", '
+            '"created": "2016-05-06T07:08:09"}\n'
+        ))
+        call_command('import_content', comments=comments, stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.comments.get().created.year, 2016)
+        response = self.client.get('/search/', {'q': 'попугай'})
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentHashStorageTest(InlineThumbnailsMixin, TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner')
+        self.storage = Post._meta.get_field('image').storage
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def upload(self, name, content=b'GIF89a same bytes'):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(name, content),
+        )
+
+    def test_concurrent_identical_save_keeps_hash_name(self):
+        """Файл, записанный параллельно, не получает имя с суффиксом."""
+        first = self.upload('first.gif')
+        # Проверка в save() не видит файл, его «пишут» одновременно.
+        with mock.patch.object(
+            type(self.storage), 'exists', side_effect=[False, True]
+        ):
+            second = self.upload('second.gif')
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(len(self.storage.listdir('posts')[1]), 1)
+
+    def test_release_checks_references_in_write_transaction(self):
+        """Ссылки проверяются в транзакции, как и запись поста."""
+        post = self.upload('first.gif')
+        name = post.image.name
+        with mock.patch.object(
+            media, 'delete_image',
+            side_effect=lambda name: self.assertTrue(
+                connection.in_atomic_block
+            ),
+        ) as delete_image:
+            post.delete()
+        delete_image.assert_called_once_with(name)
+
+    def test_identical_uploads_share_one_file(self):
+        """Одинаковые загрузки хранятся одним файлом, пока он нужен."""
+        first = self.upload('first.gif')
+        second = self.upload('second.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(len(self.storage.listdir('posts')[1]), 1)
+        first.delete()
+        self.assertTrue(self.storage.exists(second.image.name))
+        second.delete()
+        self.assertFalse(self.storage.exists(second.image.name))
+
+    def test_dedupe_media(self):
+        """dedupe_media сводит старые копии в один файл по хешу."""
+        os.makedirs(self.storage.path('posts'), exist_ok=True)
+        for name in ('posts/a.gif', 'posts/b.gif', 'posts/orphan.gif'):
+            Image.new('RGB', (4, 4), 'red').save(self.storage.path(name))
+            if name != 'posts/orphan.gif':
+                Post.objects.create(
+                    author=self.user, text='Старый пост', image=name
+                )
+        out = StringIO()
+        call_command('dedupe_media', stdout=out)
+        self.assertIn(
+            'Переименовано: 2, из них дубликатов: 1, файлов без ссылок: 1',
+            out.getvalue(),
+        )
+        names = set(Post.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        self.assertEqual(
+            sorted(self.storage.listdir('posts')[1]),
+            sorted([names.pop().split('/')[1], 'orphan.gif']),
+        )
+        # Миниатюры построены для нового имени картинки.
+        for post in Post.objects.all():
+            self.assertIsNotNone(thumbnails.find_thumbnail(post.image, 'card'))
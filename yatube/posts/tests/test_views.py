@@ -1,21 +1,45 @@
+import io
+import json
+import os
 import shutil
+import sqlite3
 import tempfile
+import zipfile
+from concurrent.futures import Future
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
 from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.template import Context, Template
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.db import (
+    DEFAULT_DB_ALIAS, connection, connections, router, transaction
+)
+from django.test.utils import CaptureQueriesContext
 
+from api import views as api_views
+from core import metrics, replicas
+from core.query_budget import assert_query_budget
+from .. import search, thumbnails
 from ..forms import PostForm
-from ..models import Post, Group, User, Follow, Comment
-from ..views import PAGE_COUNT
+from ..models import (
+    AuthorStats, Comment, Follow, Group, Post, TimelineEntry, User
+)
+from ..views import COMMENT_PAGE_COUNT, PAGE_COUNT
+from .utils import InlineThumbnailsMixin, run_on_commit
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
-class PostPagesTests(TestCase):
+class PostPagesTests(InlineThumbnailsMixin, TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -189,14 +213,46 @@ class PostPagesTests(TestCase):
                 self.assertEqual(var, name)
 
     def test_cache_index(self):
-        """Тестирование кеша"""
+        """Главная берётся из кеша, пока данные не менялись."""
         cache.clear()
-        post = Post.objects.get(pk=1)
-        response_1 = self.authorized_client.get(reverse('posts:index'))
-        post.delete()
-        response_2 = self.authorized_client.get(reverse('posts:index'))
+        response_1 = self.guest_client.get(reverse('posts:index'))
+        # update() не шлёт сигналов: версия кеша та же.
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
+        response_2 = self.guest_client.get(reverse('posts:index'))
         self.assertEqual(response_1.content, response_2.content)
 
+    def test_cache_invalidated_on_change(self):
+        """Кеш страниц сбрасывается при изменении поста и комментария."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in pages:
+            self.guest_client.get(url)
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Свежий пост'
+        )
+        for url in pages[:3]:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.context['page_obj'][0], post)
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Свежий коммент'
+        )
+        response = self.guest_client.get(pages[3])
+        self.assertContains(response, 'Свежий коммент')
+
+    def test_post_page_counts_new_posts_of_author(self):
+        """Новый пост автора обновляет счётчик на его других постах."""
+        cache.clear()
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        before = self.guest_client.get(url).context['count_posts']
+        Post.objects.create(author=self.user, text='Ещё пост')
+        response = self.guest_client.get(url)
+        self.assertEqual(response.context['count_posts'], before + 1)
+
     def test_auth_user_can_follow(self):
         """Авторизованный пользователь может подписываться на других."""
         self.unfollower_client.get(
@@ -299,3 +355,777 @@ class PaginatorViewsTest(TestCase):
         ) + '?page=2')
         second_page = Post.objects.count() % PAGE_COUNT
         self.assertEqual(len(response.context['page_obj']), second_page)
+
+    def test_index_cursor_pages(self):
+        """Курсоры ?after= и ?before= листают ленту без пропусков."""
+        first = self.client.get(reverse('posts:index')).context['page_obj']
+        self.assertIsNotNone(first.next_cursor)
+        second = self.client.get(
+            reverse('posts:index') + f'?after={first.next_cursor}'
+        ).context['page_obj']
+        self.assertEqual(
+            list(first) + list(second), list(Post.objects.all())
+        )
+        self.assertFalse(second.has_next())
+        back = self.client.get(
+            reverse('posts:index') + f'?before={second.previous_cursor}'
+        ).context['page_obj']
+        self.assertEqual(list(back), list(first))
+
+    def test_cursor_pages_with_equal_pub_date(self):
+        """Посты с одинаковой датой не теряются на границе страниц."""
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+        seen = []
+        url = reverse('posts:profile', kwargs={'username': 'auth'})
+        response = self.client.get(url)
+        while True:
+            page_obj = response.context['page_obj']
+            seen.extend(page_obj)
+            if not page_obj.has_next():
+                break
+            response = self.client.get(f'{url}?after={page_obj.next_cursor}')
+        self.assertEqual(seen, list(Post.objects.all()))
+
+    def test_cursor_page_does_not_count(self):
+        """Курсорная страница не выполняет COUNT(*)."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:index'))
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries)
+        )
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.client.get(reverse('posts:index') + '?after=abc')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+
+class QueryBudgetTests(TestCase):
+    """Число запросов не растёт с числом постов и комментариев."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for i in range(PAGE_COUNT):
+            author = User.objects.create_user(username=f'author{i}')
+            Follow.objects.create(user=cls.user, author=author)
+            cls.post = Post.objects.create(
+                author=author,
+                text=f'{i} Тестовый пост',
+                group=Group.objects.create(
+                    title=f'Группа {i}', slug=f'group-{i}', description='-'
+                ) if i % 2 else cls.group,
+            )
+            Comment.objects.create(
+                post=cls.post, author=author, text='Тестовый коммент'
+            )
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text='Тестовый коммент'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_views_fit_query_budget(self):
+        """Страницы укладываются в объявленный бюджет запросов."""
+        author = self.post.author
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': author.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_create'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = assert_query_budget(self.authorized_client, url)
+                self.assertEqual(response.status_code, 200)
+        self.authorized_client.force_login(author)
+        assert_query_budget(
+            self.authorized_client,
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+        )
+
+
+class FollowTimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.star = User.objects.create_user(username='star')
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def feed(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_timeline_follows_posts_and_unfollow(self):
+        """Лента пополняется при подписке и новом посте, чистится
+        при отписке."""
+        old = Post.objects.create(author=self.author, text='Старый пост')
+        Follow.objects.create(user=self.reader, author=self.author)
+        new = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(self.feed(), [new, old])
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        self.assertEqual(self.feed(), [])
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_celebrity_posts_merged_on_read(self):
+        """Посты авторов с большим числом подписчиков не раскладываются,
+        а подмешиваются при чтении ленты."""
+        Follow.objects.create(user=self.reader, author=self.star)
+        star_post = Post.objects.create(author=self.star, text='Пост звезды')
+        self.assertFalse(TimelineEntry.objects.filter(post=star_post))
+        with override_settings(TIMELINE_FANOUT_LIMIT=2):
+            Follow.objects.create(user=self.reader, author=self.author)
+            post = Post.objects.create(author=self.author, text='Пост')
+        self.assertEqual(self.feed(), [post, star_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_celebrity_posts_materialized_below_limit(self):
+        """Посты автора, опустившегося ниже предела, остаются в ленте."""
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=self.author, author=self.star)
+        star_post = Post.objects.create(author=self.star, text='Пост звезды')
+        self.assertFalse(TimelineEntry.objects.filter(post=star_post))
+        Follow.objects.filter(user=self.author).delete()
+        self.assertEqual(self.feed(), [star_post])
+
+    def test_follow_backfills_every_post(self):
+        """После подписки в ленте все посты автора, а не только свежие."""
+        # Раньше в ленту попадала лишь последняя тысяча.
+        posts = Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {number}')
+            for number in range(1100)
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), len(posts)
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_recount_materializes_drifted_celebrity(self):
+        """Автор, которого ниже предела опустил recount_stats, получает
+        разложенные ленты."""
+        Follow.objects.create(user=self.reader, author=self.star)
+        Follow.objects.create(user=self.author, author=self.star)
+        star_post = Post.objects.create(author=self.star, text='Пост звезды')
+        # Подписка пропала в обход сигналов: счётчик разошёлся.
+        Follow.objects.filter(user=self.author).update(author=self.author)
+        out = StringIO()
+        call_command('recount_stats', stdout=out)
+        self.assertIn('Разложены ленты авторов: 1', out.getvalue())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=star_post
+        ).exists())
+        self.assertFalse(
+            AuthorStats.objects.get(user=self.star).timeline_skipped
+        )
+
+    def test_rebuild_timeline(self):
+        """rebuild_timeline восстанавливает ленты по подпискам."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timeline', stdout=StringIO())
+        self.assertEqual(self.feed(), [post])
+        call_command('rebuild_timeline', user='reader', stdout=StringIO())
+        self.assertEqual(self.feed(), [post])
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='card_author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='card-group', description='Описание'
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, group=cls.group, text=f'Пост {i}')
+            for i in range(3)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def render_feed(self):
+        posts = Post.objects.select_related('author', 'group')
+        template = Template(
+            '{% load post_cards %}'
+            '{% for post in page_obj %}{% post_card post %}{% endfor %}'
+        )
+        return template.render(Context({'page_obj': posts, 'user': None}))
+
+    def test_page_cards_fetched_with_one_get_many(self):
+        """Карточки страницы читаются одним get_many, рендерятся промахи."""
+        first = self.render_feed()
+        with mock.patch('posts.templatetags.post_cards.get_template') as get:
+            self.assertEqual(self.render_feed(), first)
+        get.assert_not_called()
+
+    def test_card_invalidated_on_edit(self):
+        """Правка поста и смена имени автора дают новую карточку."""
+        self.render_feed()
+        post = Post.objects.first()
+        post.text = 'Исправленный текст'
+        post.save()
+        self.assertIn('Исправленный текст', self.render_feed())
+        self.user.first_name = 'Лев'
+        self.user.save()
+        self.assertIn('Лев', self.render_feed())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PrebuiltThumbnailTests(InlineThumbnailsMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+        cls.small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_create_enqueues_thumbnails(self):
+        """post_create ставит миниатюры в очередь, а не строит их."""
+        uploaded = SimpleUploadedFile(
+            'queued.gif', self.small_gif, content_type='image/gif'
+        )
+        with mock.patch('posts.views.thumbnails.enqueue') as enqueue:
+            self.client.post(
+                reverse('posts:post_create'),
+                {'text': 'С картинкой', 'image': uploaded},
+            )
+        post = Post.objects.get(text='С картинкой')
+        enqueue.assert_called_once_with(post)
+        self.assertIsNone(thumbnails.find_thumbnail(post.image, 'card'))
+
+    def test_placeholder_until_thumbnail_built(self):
+        """Пока миниатюры нет, в ленте заглушка; потом — миниатюра."""
+        post = Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                'later.gif', self.small_gif, content_type='image/gif'
+            ),
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'thumbnail-placeholder.svg')
+        done = Future()
+        done.set_result(thumbnails.build(post.image.name))
+        thumbnails._on_done(post.image.name, post, done)
+        thumbnail = thumbnails.find_thumbnail(post.image, 'card')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, 'thumbnail-placeholder.svg')
+
+    def test_page_thumbnails_looked_up_in_one_batch(self):
+        """Миниатюры страницы ищутся пачкой, счётчики — в заголовке."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост {i}', image=f'posts/{i}.gif')
+            for i in range(3)
+        )
+        response = assert_query_budget(self.client, reverse('posts:index'))
+        self.assertEqual(
+            response[metrics.HEADER],
+            'thumbnails.cache_hit=0, thumbnails.cache_miss=3',
+        )
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': self.user})
+        )
+        self.assertEqual(
+            response[metrics.HEADER],
+            'thumbnails.cache_hit=3, thumbnails.cache_miss=0',
+        )
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='writer')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass'
+        )
+        cls.best = Post.objects.create(
+            author=cls.user, text='Кошки кошки и ещё раз кошки'
+        )
+        cls.other = Post.objects.create(
+            author=cls.user, text='Собаки и одна кошка <b>жирная</b>'
+        )
+        Post.objects.create(author=cls.user, text='Про погоду')
+
+    def test_ranked_and_highlighted(self):
+        """Выдача ранжирована, совпадения выделены и экранированы."""
+        response = assert_query_budget(
+            self.client, reverse('posts:search') + '?q=кош'
+        )
+        page = response.context['page_obj']
+        self.assertEqual(list(page), [self.best, self.other])
+        self.assertEqual(page[1].highlighted, (
+            'Собаки и одна <mark>кошка</mark> '
+            '&lt;b&gt;жирная&lt;/b&gt;'
+        ))
+
+    def test_inflected_forms_and_comments_found(self):
+        """Находятся другие формы слова и слова из комментариев."""
+        Comment.objects.create(
+            post=self.other, author=self.user, text='Люблю попугаев'
+        )
+        run_on_commit()
+        for query, expected in (('кошкам', [self.best, self.other]),
+                                ('попугай', [self.other])):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    reverse('posts:search'), {'q': query}
+                )
+                self.assertEqual(list(response.context['page_obj']), expected)
+
+    def test_comment_changes_reindexed_once_after_commit(self):
+        """Правки комментариев попадают в индекс после коммита, и пост
+        переиндексируется один раз на транзакцию."""
+        url = reverse('posts:search') + '?q=попугай'
+        comments = [
+            Comment.objects.create(
+                post=self.other, author=self.user, text=text
+            )
+            for text in ('Люблю попугаев', 'И ещё раз попугаев')
+        ]
+        self.assertEqual(list(self.client.get(url).context['page_obj']), [])
+        run_on_commit()
+        self.assertEqual(
+            list(self.client.get(url).context['page_obj']), [self.other]
+        )
+        for comment in comments:
+            comment.delete()
+        with mock.patch(
+            'posts.search.index_posts', wraps=search.index_posts
+        ) as index_posts:
+            run_on_commit()
+        index_posts.assert_called_once()
+        self.assertEqual(list(self.client.get(url).context['page_obj']), [])
+
+    def test_comment_indexed_after_rolled_back_reindex(self):
+        """Отменённая переиндексация не мешает индексировать новые
+        комментарии поста."""
+        comment = Comment.objects.create(
+            post=self.other, author=self.user, text='Про хомяков'
+        )
+        run_on_commit()
+        try:
+            with transaction.atomic():
+                comment.text = 'Про морских свинок'
+                comment.save()
+                raise RuntimeError('откат')
+        except RuntimeError:
+            pass
+        Comment.objects.create(
+            post=self.other, author=self.user, text='Люблю попугаев'
+        )
+        run_on_commit()
+        response = self.client.get(reverse('posts:search'), {'q': 'попугай'})
+        self.assertEqual(list(response.context['page_obj']), [self.other])
+
+    def test_index_follows_edits_and_rebuild(self):
+        """Индекс следует за правками и собирается командой заново."""
+        post = Post.objects.get(pk=self.best.pk)
+        post.text = 'Теперь про попугаев'
+        post.save()
+        url = reverse('posts:search') + '?q=попугаев'
+        self.assertEqual(
+            list(self.client.get(url).context['page_obj']), [post]
+        )
+        Post.objects.get(pk=self.other.pk).delete()
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_search')
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(
+            list(self.client.get(url).context['page_obj']), [post]
+        )
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке находит посты через индекс."""
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist') + '?q=кошками'
+        )
+        self.assertEqual(
+            set(response.context['cl'].result_list), {self.best, self.other}
+        )
+
+
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def timing_names(self, response):
+        return [
+            part.split(';')[0]
+            for part in response[metrics.SERVER_TIMING].split(', ')
+        ]
+
+    def test_server_timing_header(self):
+        """База, шаблоны и кеш страниц замеряются в Server-Timing."""
+        response = self.client.get(reverse('posts:index'))
+        names = self.timing_names(response)
+        for name in ('db', 'tpl', 'cache', 'cache.miss', 'total'):
+            self.assertIn(name, names)
+        self.assertIn('db;dur=', response[metrics.SERVER_TIMING])
+        response = self.client.get(reverse('posts:index'))
+        names = self.timing_names(response)
+        self.assertIn('cache.hit', names)
+        self.assertNotIn('tpl', names)
+
+    def test_structured_log_line(self):
+        """На запрос пишется одна строка JSON с замерами."""
+        with self.assertLogs('core.metrics', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['db_count'], 0)
+        self.assertIn('tpl_ms', record)
+
+    def test_sampled_profile_dump(self):
+        """Выбранные запросы профилируются в файл."""
+        profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profile_dir)
+        with override_settings(PROFILE_DIR=profile_dir,
+                               PROFILE_SAMPLE_RATE=1):
+            self.client.get(reverse('posts:index'))
+        [name] = os.listdir(profile_dir)
+        self.assertIn('posts.index', name)
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(len(os.listdir(profile_dir)), 1)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='-'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='Тестовый пост', group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_not_modified_by_etag(self):
+        """Совпавший ETag даёт 304 без рендеринга и запросов к базе."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1), \
+                mock.patch('posts.views.render') as render:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        render.assert_not_called()
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Новый коммент'
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_group_not_modified_since(self):
+        """Гость получает 304 по Last-Modified, пока группа не менялась."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        response = self.client.get(url)
+        self.assertIn('no-cache', response['Cache-Control'])
+        last_modified = response['Last-Modified']
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 304)
+        # Last-Modified точен до секунды: сдвигаем дату нового поста.
+        post = Post.objects.create(
+            author=self.user, text='Ещё пост', group=self.group
+        )
+        Post.objects.filter(pk=post.pk).update(
+            pub_date=post.pub_date + timedelta(seconds=2)
+        )
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_authorized_page_private(self):
+        """Страница пользователя не получает Last-Modified."""
+        self.client.force_login(self.user)
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'token'
+        url = reverse('posts:profile', kwargs={'username': 'writer'})
+        response = self.client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertFalse(response.has_header('Last-Modified'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(INTERNAL_IPS=['127.0.0.1'])
+    def test_metrics_show_not_modified_ratio(self):
+        """Доля ответов 304 видна на странице метрик."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        before = metrics.totals()
+        etag = self.client.get(url)['ETag']
+        self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        after = metrics.totals()
+        for name, delta in (('conditional.pages', 2),
+                            ('conditional.revalidations', 1),
+                            ('conditional.not_modified', 1)):
+            with self.subTest(name=name):
+                self.assertEqual(after[name] - before.get(name, 0), delta)
+        response = self.client.get(reverse('metrics'))
+        self.assertIn('conditional.not_modified_ratio', response.content
+                      .decode())
+        response = self.client.get(
+            reverse('metrics'), REMOTE_ADDR='10.0.0.1'
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='owner')
+        cls.other = User.objects.create_user(username='other')
+        cls.post = Post.objects.create(author=cls.user, text='Мой пост')
+        Post.objects.create(author=cls.other, text='Чужой пост')
+        Comment.objects.create(post=cls.post, author=cls.user, text='Мой')
+        Comment.objects.create(post=cls.post, author=cls.other, text='Чужой')
+        Follow.objects.create(user=cls.user, author=cls.other)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def download(self, **params):
+        response = self.client.get(reverse('posts:export'), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_user_zip_export(self):
+        """Архив содержит только данные пользователя."""
+        response, content = self.download(format='csv')
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertEqual(
+                archive.namelist(),
+                ['posts.csv', 'comments.csv', 'follows.csv'],
+            )
+            posts = archive.read('posts.csv').decode().splitlines()
+            follows = archive.read('follows.csv').decode().splitlines()
+        self.assertEqual(len(posts), 2)
+        self.assertIn('Мой пост', posts[1])
+        self.assertEqual(follows, ['user,author', 'owner,other'])
+
+    def test_user_jsonl_export(self):
+        """Без архива строки JSONL помечены набором данных."""
+        _, content = self.download(zip='0')
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual(
+            [(row['type'], row.get('text')) for row in rows],
+            [('posts', 'Мой пост'), ('comments', 'Мой'), ('follows', None)],
+        )
+        response = self.client.get(
+            reverse('posts:export'), {'zip': '0', 'format': 'csv'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_site_export_command(self):
+        """Команда выгружает весь сайт пачками из базы."""
+        out = io.BytesIO()
+        with mock.patch('sys.stdout', mock.Mock(buffer=out)):
+            call_command(
+                'export_content', dataset=['posts'], chunk_size=1,
+                stderr=StringIO(),
+            )
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(
+            [row['text'] for row in rows], ['Мой пост', 'Чужой пост']
+        )
+
+
+class ReplicaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer')
+        cls.post = Post.objects.create(author=cls.user, text='Пост автора')
+
+    def setUp(self):
+        cache.clear()
+
+    def routes(self, request):
+        """Куда в этом запросе пошли бы чтения и записи."""
+        routes = {}
+
+        def view(request):
+            routes.update(
+                posts=router.db_for_read(Post),
+                users=router.db_for_read(User),
+                write=router.db_for_write(Post),
+            )
+            return HttpResponse()
+        # Транзакция теста иначе уводит все чтения в основную базу.
+        with mock.patch.object(
+            connections[DEFAULT_DB_ALIAS], 'in_atomic_block', False
+        ):
+            replicas.ReplicaMiddleware(view)(request)
+        return routes
+
+    @override_settings(REPLICA_DATABASES=['replica'])
+    def test_routing(self):
+        """GET читает posts с реплики, остальное и POST — из основной."""
+        request = RequestFactory().get('/')
+        self.assertEqual(self.routes(request), {
+            'posts': 'replica', 'users': 'default', 'write': 'default',
+        })
+        request = RequestFactory().post('/')
+        self.assertEqual(self.routes(request)['posts'], 'default')
+        self.assertIsNone(replicas.current())
+
+    @override_settings(REPLICA_DATABASES=['replica'])
+    def test_write_pins_session_to_primary(self):
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий'},
+        )
+        request = RequestFactory().get('/')
+        request.COOKIES = {
+            name: morsel.value for name, morsel in self.client.cookies.items()
+        }
+        request.session = self.client.session
+        self.assertEqual(self.routes(request)['posts'], 'default')
+
+    @override_settings(REPLICA_DATABASES=['replica'])
+    def test_streamed_response_reads_from_replica(self):
+        """Тело потокового ответа API тоже читается с реплики."""
+        seen = []
+
+        def record(execute, sql, params, many, context):
+            # Тестовая база одна: запоминаем, куда пошло бы чтение.
+            seen.append(replicas.current())
+            return execute(sql, params, many, context)
+
+        request = RequestFactory().get(reverse('api:index'))
+        request.user = AnonymousUser()
+        response = replicas.ReplicaMiddleware(api_views.index)(request)
+        with connection.execute_wrapper(record):
+            body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(body['results'][0]['text'], 'Пост автора')
+        self.assertTrue(seen)
+        self.assertEqual(set(seen), {'replica'})
+        self.assertIsNone(replicas.current())
+
+    def test_stale_replica_page_is_not_cached(self):
+        """Страница по реплике старше версий кеша отдаётся без кеша."""
+        url = reverse('posts:profile', kwargs={'username': 'writer'})
+        with mock.patch.object(replicas, 'fresh_since', return_value=False):
+            response = self.client.get(url)
+            self.assertNotIn('ETag', response)
+            response = self.client.get(url)
+            # Страница снова рендерится, а не берётся из кеша.
+            self.assertIn('tpl;', response['Server-Timing'])
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertIn('ETag', response)
+        self.assertNotIn('tpl;', response['Server-Timing'])
+
+    def test_sync(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source = os.path.join(directory, 'source.sqlite3')
+        target = os.path.join(directory, 'target.sqlite3')
+        with sqlite3.connect(source) as database:
+            database.execute('CREATE TABLE item (name TEXT)')
+            database.execute("INSERT INTO item VALUES ('пост')")
+        database.close()
+        started = replicas.sync(source, target)
+        database = sqlite3.connect(target)
+        self.addCleanup(database.close)
+        self.assertEqual(
+            database.execute('SELECT name FROM item').fetchall(), [('пост',)]
+        )
+        self.assertEqual(
+            database.execute('PRAGMA user_version').fetchone()[0], started
+        )
+
+
+class CommentPagesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='commenter')
+        cls.post = Post.objects.create(author=cls.user, text='Обсуждаемый')
+        # Одинаковое время создания: порядок держится на id.
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(45)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_comments_paginated_by_cursor(self):
+        """Пост показывает первую страницу, остальные — фрагменты."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        page = response.context['comments']
+        texts = [comment.text for comment in page]
+        self.assertEqual(len(texts), COMMENT_PAGE_COUNT)
+        self.assertEqual(texts[0], 'Комментарий 0')
+        url = reverse('posts:comments', kwargs={'post_id': self.post.pk})
+        self.assertContains(response, f'{url}?after={page.next_cursor}')
+        while page.has_next():
+            response = self.client.get(url, {'after': page.next_cursor})
+            self.assertNotContains(response, '<html')
+            page = response.context['comments']
+            texts += [comment.text for comment in page]
+        self.assertEqual(texts, [f'Комментарий {i}' for i in range(45)])
+        self.assertNotContains(response, 'data-more-comments')
+
+    def test_missing_post_and_broken_cursor(self):
+        """Фрагмент несуществующего поста — 404, испорченный курсор — 400."""
+        missing = reverse('posts:comments', kwargs={'post_id': 10 ** 6})
+        self.assertEqual(self.client.get(missing).status_code, 404)
+        url = reverse('posts:comments', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url, {'after': 'испорчен'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,48 @@
+from concurrent.futures import Future
+from unittest import mock
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def run_on_commit(using=DEFAULT_DB_ALIAS):
+    """Выполняет отложенные transaction.on_commit.
+
+    TestCase не коммитит транзакцию теста, и сами они не выполнятся.
+    """
+    connection = connections[using]
+    callbacks, connection.run_on_commit = connection.run_on_commit, []
+    for _, callback in callbacks:
+        callback()
+
+
+class InlineExecutor:
+    """Пул миниатюр, который выполняет задачу сразу в своём процессе."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+
+class InlineThumbnailsMixin:
+    """Миниатюры строятся в процессе теста, а не в пуле.
+
+    Рабочий процесс пула видит настройки на момент fork и писал бы во
+    MEDIA_ROOT проекта, а не во временный каталог теста.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls._executor_patcher = mock.patch(
+            'posts.thumbnails._get_executor', return_value=InlineExecutor()
+        )
+        cls._executor_patcher.start()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._executor_patcher.stop()
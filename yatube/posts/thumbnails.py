@@ -0,0 +1,245 @@
+"""Миниатюры картинок постов строятся заранее, в отдельном процессе.
+
+После post_create/post_edit картинка ставится в очередь, и рабочий
+процесс строит файлы миниатюр всех размеров из THUMBNAIL_GEOMETRIES;
+в kvstore их записывает веб-процесс, у которого свой кеш. Шаблоны
+только ищут готовую миниатюру в kvstore sorl-thumbnail и никогда не
+строят её в запросе: пока её нет, показывается заглушка.
+"""
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import metrics
+
+from .signals import bump_post_pages
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_geometry(name):
+    """Геометрия и опции миниатюры по имени из THUMBNAIL_GEOMETRIES."""
+    geometry, options = settings.THUMBNAIL_GEOMETRIES[name]
+    return geometry, dict(options)
+
+
+def _prepare(source, name):
+    """Геометрия и полные опции миниатюры, как в get_thumbnail sorl.
+
+    Иначе имя файла не совпадёт с тем, что строит сам sorl-thumbnail.
+    """
+    backend = default.backend
+    geometry, options = get_geometry(name)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return geometry, options
+
+
+def thumbnail_file(image, name):
+    """Файл миниатюры ``name``; сам файл может ещё не существовать.
+
+    Источник всегда берётся по имени из хранилища по умолчанию, чтобы
+    ключ не зависел от хранилища поля и совпадал с построенным в build().
+    """
+    source = ImageFile(getattr(image, 'name', image))
+    geometry, options = _prepare(source, name)
+    return ImageFile(
+        default.backend._get_thumbnail_filename(source, geometry, options),
+        default.storage,
+    )
+
+
+def find_thumbnail(image, name):
+    """Готовая миниатюра или None; сама миниатюра не строится."""
+    if not image:
+        return None
+    return find_thumbnails([image], name)[image.name]
+
+
+@metrics.timer('thumb')
+def find_thumbnails(images, name):
+    """Готовые миниатюры набора картинок: {имя картинки: миниатюра}.
+
+    Вместо обращения к kvstore на каждую картинку делается один
+    get_many к кешу, а промахи дочитываются из базы одним запросом.
+    Попадания и промахи кеша идут в счётчики запроса.
+    """
+    keys = {
+        add_prefix(thumbnail_file(image, name).key): image.name
+        for image in images if image
+    }
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        # Другие kvstore не умеют читать пачкой.
+        return {
+            image_name: kvstore.get(thumbnail_file(image_name, name))
+            for image_name in keys.values()
+        }
+    found = kvstore.cache.get_many(list(keys)) if keys else {}
+    missing = [key for key in keys if key not in found]
+    metrics.incr('thumbnails.cache_hit', len(found))
+    metrics.incr('thumbnails.cache_miss', len(missing))
+    if missing:
+        stored = dict(
+            KVStoreModel.objects.filter(key__in=missing)
+            .values_list('key', 'value')
+        )
+        # Как и kvstore sorl, запоминаем в кеше и отсутствие записи.
+        empty = cached_db_kvstore.EMPTY_VALUE
+        loaded = {key: stored.get(key, empty) for key in missing}
+        kvstore.cache.set_many(
+            loaded, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        found.update(loaded)
+    return {
+        image_name: (
+            None if found[key] == cached_db_kvstore.EMPTY_VALUE
+            else deserialize_image_file(found[key])
+        )
+        for key, image_name in keys.items()
+    }
+
+
+def build(image_name):
+    """Строит файлы всех миниатюр картинки и возвращает их имена.
+
+    Выполняется в рабочем процессе и не обращается к базе: записи в
+    kvstore делает родительский процесс в register().
+    """
+    backend = default.backend
+    source = ImageFile(image_name)
+    source_image = None
+    built = []
+    try:
+        for name in settings.THUMBNAIL_GEOMETRIES:
+            geometry, options = _prepare(source, name)
+            thumbnail = ImageFile(
+                backend._get_thumbnail_filename(source, geometry, options),
+                default.storage,
+            )
+            if not thumbnail.exists():
+                if source_image is None:
+                    source_image = default.engine.get_image(source)
+                    source.set_size(
+                        default.engine.get_image_size(source_image)
+                    )
+                options['image_info'] = default.engine.get_image_info(
+                    source_image
+                )
+                backend._create_thumbnail(
+                    source_image, geometry, options, thumbnail
+                )
+                backend._create_alternative_resolutions(
+                    source_image, geometry, options, thumbnail.name
+                )
+            built.append(thumbnail.name)
+    finally:
+        if source_image is not None:
+            default.engine.cleanup(source_image)
+    return built
+
+
+def register(image_name, thumbnail_names):
+    """Записывает построенные миниатюры в kvstore."""
+    source = ImageFile(image_name)
+    default.kvstore.get_or_set(source)
+    for name in thumbnail_names:
+        default.kvstore.set(ImageFile(name, default.storage), source)
+
+
+@metrics.timer('thumb.build')
+def generate(image_name):
+    """Строит и регистрирует миниатюры прямо в текущем процессе."""
+    register(image_name, build(image_name))
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # fork: рабочему процессу достаются уже настроенные Django и
+        # sorl-thumbnail, а к базе он не обращается.
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            mp_context=multiprocessing.get_context('fork'),
+        )
+    return _executor
+
+
+def shutdown():
+    """Дожидается начатых построений и закрывает пул.
+
+    Следующая задача создаст пул заново.
+    """
+    global _executor
+    if _executor is not None:
+        executor, _executor = _executor, None
+        executor.shutdown(wait=True)
+
+
+def _on_done(image_name, post, future):
+    """Миниатюры готовы: регистрируем их и сбрасываем кеш страниц.
+
+    Колбэки выполняет один служебный поток пула, и его соединение с
+    базой переиспользуется.
+    """
+    global _executor
+    try:
+        names = future.result()
+    except BrokenProcessPool:
+        logger.exception('Пул миниатюр сломан и будет создан заново')
+        _executor = None
+        return
+    except Exception:
+        logger.exception('Не удалось построить миниатюры поста %s', post.pk)
+        return
+    if not default.storage.exists(image_name):
+        # Картинку успели заменить или удалить, пока строились миниатюры.
+        logger.info('Картинка %s уже удалена', image_name)
+        return
+    register(image_name, names)
+    bump_post_pages(post)
+
+
+def enqueue(post):
+    """Ставит построение миниатюр поста в очередь после коммита."""
+    if not post.image:
+        return
+    image_name = post.image.name
+    # Для сброса кешей в колбэке хватает id, автора и группы.
+    snapshot = type(post)(
+        pk=post.pk, author_id=post.author_id, group_id=post.group_id
+    )
+
+    def submit():
+        global _executor
+        try:
+            future = _get_executor().submit(build, image_name)
+        except BrokenProcessPool:
+            # Пост уже сохранён: без миниатюры останется заглушка.
+            logger.exception('Пул миниатюр сломан и будет создан заново')
+            _executor = None
+            return
+        future.add_done_callback(
+            lambda done: _on_done(image_name, snapshot, done)
+        )
+
+    transaction.on_commit(submit)
@@ -0,0 +1,197 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост раскладывается в TimelineEntry всех подписчиков автора.
+Для авторов, у которых подписчиков не меньше TIMELINE_FANOUT_LIMIT,
+раскладка не делается: их посты подмешиваются при чтении ленты, а
+AuthorStats.timeline_skipped помнит, что ленты автора неполны. Когда
+подписчиков становится меньше предела, посты раскладываются заново.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+
+from core.paginator import CursorPaginator
+from .models import AuthorStats, Follow, Post, TimelineEntry
+
+BATCH_SIZE = 500
+
+
+def is_celebrity(author_id):
+    """Слишком много подписчиков для раскладки при записи."""
+    return AuthorStats.objects.filter(
+        user_id=author_id,
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def fan_out_post(post):
+    """Кладёт новый пост в ленты подписчиков автора."""
+    if is_celebrity(post.author_id):
+        skip_fan_out(post.author_id)
+        return
+    followers = (
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+        .distinct()
+    )
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post.pk,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in followers.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def skip_fan_out(author_id):
+    """Раскладка для автора пропущена: запоминаем, что ленты неполны."""
+    AuthorStats.objects.filter(
+        user_id=author_id, timeline_skipped=False
+    ).update(timeline_skipped=True)
+
+
+def backfill_follow(user_id, author_id):
+    """Добавляет в ленту все посты автора после подписки."""
+    if is_celebrity(author_id):
+        skip_fan_out(author_id)
+        return
+    _insert_entries(
+        author_id,
+        Follow.objects.filter(user_id=user_id, author_id=author_id),
+    )
+
+
+def backfill_all_followers(author_id):
+    """Кладёт все посты автора в ленты всех его подписчиков.
+
+    После этого ленты автора полны, и timeline_skipped снимается.
+    """
+    if is_celebrity(author_id):
+        skip_fan_out(author_id)
+        return
+    _insert_entries(author_id, Follow.objects.filter(author_id=author_id))
+    AuthorStats.objects.filter(
+        user_id=author_id, timeline_skipped=True
+    ).update(timeline_skipped=False)
+
+
+def _insert_entries(author_id, follows):
+    """Посты автора в ленты подписчиков из follows одним INSERT ... SELECT.
+
+    Без объектов моделей: при пересборке всех лент строк миллионы, и
+    объекты обходятся дороже самой записи. Записи, которые уже есть,
+    пропускаются.
+    """
+    followers = follows.order_by().values_list('user_id').distinct()
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .order_by().values_list('pk', 'pub_date')
+    )
+    followers_sql, followers_params = followers.query.sql_with_params()
+    posts_sql, posts_params = posts.query.sql_with_params()
+    ops = connection.ops
+    meta = TimelineEntry._meta
+    columns = ', '.join(
+        ops.quote_name(meta.get_field(name).column)
+        for name in ('user', 'post', 'author', 'pub_date')
+    )
+    sql = (
+        f'{ops.insert_statement(ignore_conflicts=True)} '
+        f'{ops.quote_name(meta.db_table)} ({columns}) '
+        f'SELECT f.user_id, p.id, %s, p.pub_date '
+        f'FROM ({followers_sql}) f, ({posts_sql}) p '
+        f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql, (author_id, *followers_params, *posts_params)
+        )
+
+
+def materialize_if_demoted(author_id):
+    """Раскладывает посты автора, который перестал быть «знаменитым».
+
+    Пока подписчиков было не меньше TIMELINE_FANOUT_LIMIT, его посты
+    не раскладывались, а подмешивались при чтении. Ниже предела лента
+    читается только из TimelineEntry, и без раскладки они бы пропали.
+    Переход ловится по флагу timeline_skipped, а не по точному значению
+    счётчика: так его не пропустит и счётчик, исправленный recount_stats.
+    """
+    demoted = AuthorStats.objects.filter(
+        user_id=author_id,
+        followers_count__lt=settings.TIMELINE_FANOUT_LIMIT,
+        timeline_skipped=True,
+    ).exists()
+    if demoted:
+        backfill_all_followers(author_id)
+
+
+def materialize_demoted():
+    """Раскладывает посты всех авторов ниже предела с неполными лентами.
+
+    Возвращает число таких авторов.
+    """
+    authors = list(
+        AuthorStats.objects.filter(
+            followers_count__lt=settings.TIMELINE_FANOUT_LIMIT,
+            timeline_skipped=True,
+        ).values_list('user_id', flat=True)
+    )
+    for author_id in authors:
+        backfill_all_followers(author_id)
+    return len(authors)
+
+
+def prune_follow(user_id, author_id):
+    """Убирает посты автора из ленты после отписки."""
+    if Follow.objects.filter(user_id=user_id, author_id=author_id).exists():
+        # Подписка задублирована: лента остаётся.
+        return
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def followed_celebrities(user):
+    """id авторов, чьи посты подмешиваются в ленту при чтении."""
+    return list(
+        Follow.objects.filter(
+            user=user,
+            author__stats__followers_count__gte=(
+                settings.TIMELINE_FANOUT_LIMIT
+            ),
+        ).values_list('author_id', flat=True)
+    )
+
+
+def get_paginator(user, per_page):
+    """Курсорный пагинатор ленты подписок пользователя.
+
+    Обычно это один диапазон индекса timeline_feed_idx; посты
+    «знаменитых» авторов читаются отдельно и сливаются по ключу.
+    """
+    sources = [
+        TimelineEntry.objects.filter(user=user)
+        .select_related('post__author', 'post__group')
+    ]
+    celebrities = followed_celebrities(user)
+    if celebrities:
+        sources.append(
+            Post.objects.filter(author_id__in=celebrities)
+            .select_related('author', 'group')
+            .annotate(post_id=F('pk'))
+        )
+    return CursorPaginator(sources, per_page, key_field='post_id')
+
+
+def as_posts(page):
+    """Заменяет записи ленты на сами посты в объекте страницы."""
+    page.object_list = [
+        row.post if isinstance(row, TimelineEntry) else row
+        for row in page.object_list
+    ]
+    return page
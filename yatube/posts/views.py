@@ -1,20 +1,94 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.db.models import Max
 from django.shortcuts import redirect, render, get_object_or_404
+from django.utils.http import urlencode
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from .models import Post, Group, User, Follow
+from core import replicas
+from core.cache import cache_page_versioned
+from core.paginator import CursorPaginator, decode_cursor
+from core.query_budget import query_budget
+from . import export as post_export, search as post_search, thumbnails
+from . import timeline
+from .models import AuthorStats, Comment, Post, Group, User, Follow
 from .forms import PostForm, CommentForm
-from django.views.decorators.cache import cache_page
 
 PAGE_COUNT = 10
 FOLLOW_PAGE_COUNT = 10
+COMMENT_PAGE_COUNT = 20
+
+
+def get_page_obj(request, post_list, per_page=PAGE_COUNT):
+    """Страница ленты по курсору ?after=/?before= или старому ?page=."""
+    return paginate(request, CursorPaginator(post_list, per_page))
+
+
+def paginate(request, paginator):
+    return paginator.get_cursor_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        number=request.GET.get('page'),
+    )
+
+
+def get_comments_page(post_id, after=None):
+    """Страница комментариев поста от старых к новым, после курсора."""
+    paginator = CursorPaginator(
+        Comment.objects.filter(post_id=post_id)
+        .select_related('author').order_by('created', 'pk'),
+        COMMENT_PAGE_COUNT, date_field='created', descending=False,
+    )
+    return paginator.get_cursor_page(after=after)
 
 
-@cache_page(20, key_prefix='index_page')
+def group_last_modified(request, slug):
+    """Дата последнего поста группы одним агрегатом."""
+    return Post.objects.filter(group__slug=slug).aggregate(
+        last=Max('pub_date')
+    )['last']
+
+
+def profile_last_modified(request, username):
+    return Post.objects.filter(author__username=username).aggregate(
+        last=Max('pub_date')
+    )['last']
+
+
+def post_last_modified(request, post_id):
+    """Позднейшая из дат поста и его последнего комментария."""
+    dates = Post.objects.filter(pk=post_id).annotate(
+        last_comment=Max('comments__created')
+    ).values_list('pub_date', 'last_comment').first()
+    if dates is None:
+        return None
+    return max(date for date in dates if date is not None)
+
+
+def post_scopes(request, post_id):
+    """Области страницы поста: сам пост, счётчик постов автора, группы.
+
+    Автор поста не меняется, поэтому его id запоминается в кеше и
+    проверка версий обходится без запроса к базе.
+    """
+    key = f'post-author:{post_id}'
+    author_id = cache.get(key)
+    if author_id is None:
+        author_id = Post.objects.filter(pk=post_id).values_list(
+            'author_id', flat=True
+        ).first()
+        if author_id is not None:
+            cache.set(key, author_id, settings.PAGE_CACHE_TIMEOUT)
+    return [f'post:{post_id}', f'author:{author_id}', 'groups']
+
+
+@query_budget(4)
+@cache_page_versioned(lambda request: ['posts', 'groups'])
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, PAGE_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = get_page_obj(
+        request, Post.objects.select_related('author', 'group')
+    )
     template = 'posts/index.html'
     context = {
         'page_obj': page_obj,
@@ -22,11 +96,14 @@ def index(request):
     return render(request, template, context)
 
 
+@query_budget(5)
+@cache_page_versioned(
+    lambda request, slug: [f'group:{slug}'],
+    last_modified=group_last_modified,
+)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    paginator = Paginator(group.posts.all(), PAGE_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = get_page_obj(request, group.posts.select_related('author'))
     template = 'posts/group_list.html'
     context = {
         'page_obj': page_obj,
@@ -35,39 +112,85 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@query_budget(6)
+@cache_page_versioned(
+    lambda request, username: [f'profile:{username}', 'groups'],
+    last_modified=profile_last_modified,
+)
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    count_posts = user.posts.all().count()
-    paginator = Paginator(user.posts.all(), PAGE_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    user = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    stats = AuthorStats.for_user(user)
+    page_obj = get_page_obj(request, user.posts.select_related('group'))
     following = False
     if request.user.is_authenticated:
-        following = Follow.objects.filter(user=request.user, author=user)
+        following = Follow.objects.filter(
+            user=request.user, author=user
+        ).exists()
     context = {
         'author': user,
         'page_obj': page_obj,
-        'count_posts': count_posts,
+        'count_posts': stats.posts_count,
+        'stats': stats,
         'following': following,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@query_budget(5)
+@cache_page_versioned(post_scopes, last_modified=post_last_modified)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
-    author = post.author
-    count_posts = Post.objects.filter(author=author).count()
+    count_posts = AuthorStats.for_user(post.author).posts_count
     context = {
         'post': post,
         'count_posts': count_posts,
-        'comments': comments,
+        'comments': get_comments_page(post.pk),
         'form': form,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(2)
+@cache_page_versioned(lambda request, post_id: [f'post:{post_id}'])
+def comments(request, post_id):
+    """Следующая страница комментариев фрагментом HTML для post_detail.
+
+    Испорченный курсор даёт 400, а не первую страницу: иначе скрипт
+    допишет под уже показанные комментарии их повтор.
+    """
+    after = request.GET.get('after')
+    if after and decode_cursor(after) is None:
+        return HttpResponseBadRequest('Испорченный курсор.')
+    page = get_comments_page(post_id, after)
+    if not page.object_list:
+        # Непустая страница и так доказывает, что пост есть.
+        get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'post_id': post_id,
+        'comments': page,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@query_budget(5)
+def search(request):
+    """Поиск по тексту постов, самые подходящие — первыми."""
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(post_search.SearchResults(query), PAGE_COUNT)
+    context = {
+        'query': query,
+        'page_obj': paginator.get_page(request.GET.get('page')),
+        'extra_query': urlencode({'q': query}),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@query_budget(3)
 @login_required
 def post_create(request):
     form = PostForm(
@@ -78,15 +201,18 @@ def post_create(request):
         form = form.save(commit=False)
         form.author = request.user
         form.save()
+        replicas.pin(request)
+        thumbnails.enqueue(form)
         return redirect('posts:profile', username=request.user)
     return render(request, 'posts/create.html', {'form': form})
 
 
+@query_budget(4)
 @login_required
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     template = 'posts/create.html'
-    if request.user != post.author:
+    if request.user.pk != post.author_id:
         return redirect('posts:post_detail', post_id=post_id)
     form = PostForm(
         request.POST or None,
@@ -95,6 +221,9 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         post.save()
+        replicas.pin(request)
+        if 'image' in form.changed_data:
+            thumbnails.enqueue(post)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -113,15 +242,16 @@ def add_comment(request, post_id):
         comment.author = request.user
         comment.post = post
         comment.save()
+        replicas.pin(request)
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(5)
 @login_required
 def follow_index(request):
-    post = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post, FOLLOW_PAGE_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = timeline.as_posts(paginate(
+        request, timeline.get_paginator(request.user, FOLLOW_PAGE_COUNT)
+    ))
     context = {
         'page_obj': page_obj,
     }
@@ -138,6 +268,7 @@ def profile_follow(request, username):
             user=request.user,
             author=author
         )
+        replicas.pin(request)
     return redirect('posts:profile', username=username)
 
 
@@ -146,4 +277,30 @@ def profile_unfollow(request, username):
     """Отписка от автора."""
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
+    replicas.pin(request)
     return redirect('posts:profile', username=username)
+
+
+@login_required
+def export(request):
+    """Выгрузка своих постов, комментариев и подписок файлом.
+
+    ``?format=jsonl|csv``, ``?zip=0`` — без архива (только JSONL).
+    """
+    file_format = request.GET.get('format', 'jsonl')
+    compress = request.GET.get('zip', '1') != '0'
+    try:
+        chunks = post_export.stream(
+            list(post_export.DATASETS), file_format, compress, request.user
+        )
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    extension = 'zip' if compress else file_format
+    response = StreamingHttpResponse(
+        chunks,
+        content_type='application/zip' if compress else 'application/x-ndjson',
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="yatube-{request.user.pk}.{extension}"'
+    )
+    return response
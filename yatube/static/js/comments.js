@@ -0,0 +1,23 @@
+// «Показать ещё»: следующая страница комментариев встаёт на место
+// кнопки. Без JavaScript ссылка открывает тот же фрагмент.
+document.addEventListener('click', function (event) {
+  var link = event.target.closest('[data-more-comments]');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  link.classList.add('disabled');
+  fetch(link.href, {credentials: 'same-origin'})
+    .then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.status);
+      }
+      return response.text();
+    })
+    .then(function (html) {
+      link.outerHTML = html;
+    })
+    .catch(function () {
+      window.location.href = link.href;
+    });
+});
@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',  # Добавленная запись
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -49,10 +50,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.metrics.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.replicas.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -66,7 +69,8 @@ ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Тот же DjangoTemplates, но с замером рендеринга.
+        'BACKEND': 'core.template_backends.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -87,12 +91,30 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# core.backends.sqlite3 — SQLite в режиме WAL с настройками PRAGMA для
+# одновременных чтений и записей; соединения переживают запрос.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    },
+    # Локальная копия для чтения, её обновляет manage.py sync_replica.
+    'replica': {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db-replica.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    },
 }
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Реплики, с которых GET-запросы читают posts, например ['replica'];
+# пустой список — всё читается из основной базы. После записи сессия
+# REPLICA_PIN_SECONDS читает из основной базы, чтобы видеть свои данные.
+REPLICA_DATABASES = []
+REPLICA_PIN_SECONDS = 10
 
 
 # Password validation
@@ -138,6 +160,11 @@ STATIC_URL = '/static/'
 
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# Имена с хешем содержимого, манифест и сжатые копии (.gz, .br).
+STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
@@ -148,8 +175,65 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Версии кеша страниц должны быть общими для всех процессов сервера:
+# иначе изменение сбросит страницы только в процессе, где оно случилось.
+# Файловый кеш общий в пределах машины; на нескольких машинах нужен
+# memcached или redis.
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'versions'),
+        # Вытесненная версия лишь сбрасывает страницы, но лучше реже.
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
+    },
+}
+
+# Лента подписок: авторам с таким числом подписчиков посты не
+# раскладываются по лентам при записи, а подмешиваются при чтении.
+TIMELINE_FANOUT_LIMIT = 5000
+
+# Страницы кешируются с версиями и сбрасываются сигналами при изменении
+# данных, поэтому могут жить долго.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+# Псевдоним из CACHES для версий кеша страниц.
+PAGE_VERSION_CACHE = 'versions'
+# Карточки постов кешируются по содержимому и сами не устаревают.
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Миниатюры строятся заранее в рабочем процессе; шаблоны берут их
+# по имени и без готовой миниатюры показывают заглушку.
+THUMBNAIL_GEOMETRIES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
 }
+THUMBNAIL_WORKERS = 1
+
+# Загрузки пишутся на диск и обрезаются на пределе; картинки
+# проверяются по заголовку и хранятся уменьшенными, без метаданных.
+FILE_UPLOAD_HANDLERS = ['core.uploads.LimitedUploadHandler']
+IMAGE_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_MAX_PIXELS = 50_000_000
+IMAGE_MASTER_SIZE = 1920
+
+# Страница лент JSON API по умолчанию и наибольшая по ?limit=.
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 1000
+
+# Медиа отдаёт core.views.media_file. За nginx файл отдаёт сам сервер:
+# MEDIA_SENDFILE_HEADER = 'X-Accel-Redirect' и internal-location с
+# префиксом MEDIA_ACCEL_PREFIX; за Apache с mod_xsendfile — 'X-Sendfile'.
+# Без заголовка файл отдаёт Django, по Range и через wsgi.file_wrapper.
+MEDIA_SENDFILE_HEADER = None
+MEDIA_ACCEL_PREFIX = '/internal-media/'
+# Имена картинок и миниатюр зависят от содержимого, файлы не меняются.
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+
+# Замеры запроса (база, шаблоны, кеш, миниатюры) в заголовке
+# Server-Timing; строку JSON на запрос пишет логгер core.metrics (INFO).
+SERVER_TIMING = True
+# Доля запросов, которые целиком профилируются cProfile; файлы .prof
+# пишутся в PROFILE_DIR и открываются, например, в snakeviz.
+PROFILE_SAMPLE_RATE = 0.0
+PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')